@@ -1,26 +1,67 @@
-import re
-from config import KEYWORDS
+import json
+import metrics
+from collections import Counter
+from config import KEYWORDS, BOOTSTRAP_SAMPLES, BOOTSTRAP_LEVEL, BOOTSTRAP_SEED
+from matcher import build_matcher, count_keywords, count_keywords_by_piece
 from urllib.parse import urlparse
 
-# Count political keywords in text by category
-def analyze_keywords(text):
+# The matcher is built once from the keyword dictionary instead of once per call
+MATCHER = build_matcher(KEYWORDS)
+
+# Resamples for the calculated bias confidence intervals, 0 leaves them out
+_bootstrap_samples = BOOTSTRAP_SAMPLES
+
+# Change how many resamples the confidence intervals use, 0 turns them off
+def configure(bootstrap_samples=None):
+    global _bootstrap_samples
+    if bootstrap_samples is not None:
+        _bootstrap_samples = bootstrap_samples
+
+def bootstrap_samples():
+    return _bootstrap_samples
+
+# Turn per keyword counts into category scores and found keywords
+def scores_from_counts(counts):
     scores = {"left": 0, "center": 0, "right": 0}
     found_keywords = {"left": [], "center": [], "right": []}
     for category, keywords in KEYWORDS.items():
         for keyword in keywords:
-            """
-            This is a regex pattern that is meant to match the keyword as the entire word
-            The \b is a word boundary so the word cant be matched inside other words
-            re.escape(keyword) escapes special regex characters in the keyword
-            """
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            count = len(re.findall(pattern, text))
+            count = counts.get(keyword, 0)
 
             if count > 0:
                 scores[category] += count
                 found_keywords[category].append(keyword)
     return scores, found_keywords
 
+# (left, center, right) hits of one article's keyword counts, what the bootstrap resamples
+def article_scores(counts):
+    scores, _ = scores_from_counts(counts)
+    return (scores["left"], scores["center"], scores["right"])
+
+# Count political keywords in text by category
+def analyze_keywords(text):
+    """
+    All keywords are found in one scan of the text by the matcher, it uses the
+    same \b word boundaries as matching every keyword with its own regex
+    """
+    with metrics.stage("analyze"):
+        counts = count_keywords(MATCHER, text)
+    return scores_from_counts(counts)
+
+"""
+analyze_keywords for a site's joined article text, starts are where each
+article begins in it. Same scores and keywords, plus every article's
+article_scores for the bootstrap, from the same single scan.
+"""
+def analyze_articles(text, starts):
+    with metrics.stage("analyze"):
+        pieces = count_keywords_by_piece(MATCHER, text, starts)
+        counts = Counter()
+        for piece in pieces:
+            counts.update(piece)
+    scores, keywords = scores_from_counts(counts)
+    return scores, keywords, [article_scores(piece) for piece in pieces]
+
 # Calculate political bias scores from keyword count
 def bias_score_calc(scores):
     total = sum(scores.values())
@@ -31,49 +72,151 @@ def bias_score_calc(scores):
     bias = (scores["right"] - scores["left"]) / total * 5
     return bias
 
-# Analyzes every scraped site
+"""
+Bootstrap confidence intervals for calculated bias, one (low, high) per site
+article_scores has one entry per site, the (left, center, right) hits of each
+of its articles. Every resample picks the site's articles again with
+replacement and then redraws its keyword hits from a Poisson with the picked
+articles' hits as its mean. The interval is the middle BOOTSTRAP_LEVEL of the
+bias of every resample.
+
+Picking n articles with replacement is the same as giving every article a
+weight, how many times it got picked, and the Poisson hits of the picked
+articles added up are one Poisson of their summed hits. So a resample is one
+row of weights, one matrix product and three Poisson draws instead of a draw
+per article. The sums, biases and percentiles of a whole batch of sites are
+worked out at once.
+Every site draws from its own generator seeded the same way, so the same counts
+get the same interval every run whichever sites are next to it.
+"""
+def bootstrap_bias_ci(article_scores, samples=None, level=BOOTSTRAP_LEVEL, seed=BOOTSTRAP_SEED):
+    # Imported here so runs with the intervals turned off don't load NumPy
+    import numpy as np
+
+    samples = samples or _bootstrap_samples
+    percentiles = [(1 - level) / 2 * 100, (1 + level) / 2 * 100]
+    intervals = []
+    # Small batches keep the arrays around a MB however many sites there are, bigger ones are no faster
+    batch = max(1, 50_000 // samples)
+    for first in range(0, len(article_scores), batch):
+        group = article_scores[first:first + batch]
+        hits = np.zeros((len(group), samples, 3), dtype=np.int64)
+        for s, scores in enumerate(group):
+            scores = np.asarray(scores, dtype=np.int64).reshape(-1, 3)
+            if not len(scores):
+                continue
+            articles = len(scores)
+            rng = np.random.default_rng(seed)
+            # How many times every resample picked every article
+            picks = rng.integers(0, articles, size=(samples, articles)) + np.arange(samples)[:, None] * articles
+            weights = np.bincount(picks.ravel(), minlength=samples * articles).reshape(samples, articles)
+            hits[s] = rng.poisson(weights @ scores)
+
+        total = hits.sum(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bias = np.where(total > 0, (hits[..., 2] - hits[..., 0]) / total * 5, 0.0)
+        low, high = np.percentile(bias, percentiles, axis=1)
+        intervals.extend(zip(low.tolist(), high.tolist()))
+    return intervals
+
+"""
+Analyzes one scraped site, returns its result and its article_scores
+A site either has its "text" or, in pipeline mode, "articles" records that
+already hold per article keyword counts, those just get added up. Sites scraped
+with --fold already have the site's "counts". The article_scores are only
+worked out when the confidence intervals are on, None otherwise.
+"""
+def _analyze_site(url, data):
+    bias_info = data["bias_info"]
+    per_article = None
+
+    if "articles" in data:
+        counts = Counter()
+        for article in data["articles"]:
+            counts.update(article["counts"])
+        scores, keywords = scores_from_counts(counts)
+        if _bootstrap_samples:
+            per_article = [article_scores(article["counts"]) for article in data["articles"]]
+    elif "counts" in data:
+        scores, keywords = scores_from_counts(data["counts"])
+        per_article = data.get("article_scores")
+    elif _bootstrap_samples and "article_starts" in data:
+        scores, keywords, per_article = analyze_articles(data["text"], data["article_starts"])
+    else:
+        scores, keywords = analyze_keywords(data["text"])
+    calculated_bias_score = bias_score_calc(scores)
+    if _bootstrap_samples and not per_article:
+        # Nothing per article, the whole site counts as one and only its hits get resampled
+        per_article = [(scores["left"], scores["center"], scores["right"])]
+
+    # Extract the domain
+    parsed = urlparse(url)
+    domain = parsed.netloc.replace("www.", "")
+
+    return {
+        "url": url,
+        "name": domain,
+        "known_bias": bias_info["bias"],
+        "bias_rating": bias_info["rating"],
+        "calculated_bias": calculated_bias_score,
+        "bias_ci": None,
+        "reliability": bias_info["credibility"],
+        "scores": scores,
+        "keywords": keywords,
+        "total_keywords": sum(scores.values()),
+        "source": bias_info["source"]
+    }, per_article
+
+# Analyzes one scraped site, returns its result
+def analyze_site(url, data):
+    result, per_article = _analyze_site(url, data)
+    if _bootstrap_samples:
+        with metrics.stage("bootstrap"):
+            result["bias_ci"] = list(bootstrap_bias_ci([per_article])[0])
+    return result
+
+# Analyzes every scraped site, the confidence intervals are worked out for all of them at once
 def analyze_all_sites(sdata):
-    results = []
-
-    for url, data in sdata.items():
-        text = data["text"]
-        bias_info = data["bias_info"]
-
-        scores, keywords = analyze_keywords(text)
-        calculated_bias_score = bias_score_calc(scores)
-
-        # Extract the domain
-        parsed = urlparse(url)
-        domain = parsed.netloc.replace("www.", "")
-
-        results.append({
-            "url": url,
-            "name": domain,
-            "known_bias": bias_info["bias"],
-            "bias_rating": bias_info["rating"],
-            "calculated_bias": calculated_bias_score,
-            "reliability": bias_info["credibility"],
-            "scores": scores,
-            "keywords": keywords,
-            "total_keywords": sum(scores.values()),
-            "source": bias_info["source"]
-        })
+    analyzed = [_analyze_site(url, data) for url, data in sdata.items()]
+    results = [result for result, _ in analyzed]
+    if _bootstrap_samples and analyzed:
+        with metrics.stage("bootstrap"):
+            intervals = bootstrap_bias_ci([per_article for _, per_article in analyzed])
+        for result, interval in zip(results, intervals):
+            result["bias_ci"] = list(interval)
     return results
 
-# Print everything to console
-def print_results(results):
+# Print the heading that goes above the results
+def print_results_header():
     print("-"*50)
     print("Analysis Results")
     print("-"*50)
+
+# Print one site's result
+def print_result(result):
+    bias_diff = result["calculated_bias"] - result["known_bias"]
+    agreement = "Close" if abs(bias_diff) < 1.0 else "Different"
+
+    print(f"\n{result['name']}")
+    print(f"Known Bias: {result['known_bias']} ({result['bias_rating']} - via {result['source']}")
+    print(f"Calculated Bias: {result['calculated_bias']}")
+    if result.get("bias_ci") is not None:
+        low, high = result["bias_ci"]
+        print(f"{BOOTSTRAP_LEVEL:.0%} CI: {low:.2f} to {high:.2f}")
+    print(f"Difference: {agreement}")
+    print(f"Credibility: {result['reliability']}/10")
+    print(f"Keyword counts - Left: {result['scores']['left']}",
+          f"Center: {result['scores']['center']}",
+          f"Right: {result['scores']['right']}")
+
+# Print everything to console
+def print_results(results):
+    print_results_header()
     for result in results:
-        bias_diff = result["calculated_bias"] - result["known_bias"]
-        agreement = "Close" if abs(bias_diff) < 1.0 else "Different"
-
-        print(f"\\n{result['name']}")
-        print(f"Known Bias: {result["known_bias"]} ({result["bias_rating"]} - via {result["source"]}")
-        print(f"Calculated Bias: {result['calculated_bias']}")
-        print(f"Difference: {agreement}")
-        print(f"Credibility: {result['reliability']}/10")
-        print(f"Keyword counts - Left: {result["scores"]["left"]}",
-              f"Center: {result['scores']['center']}",
-              f"Right: {result['scores']['right']}")
\ No newline at end of file
+        print_result(result)
+
+# Save the results list as JSON, for runs where nobody looks at the chart
+def save_results(results, filename="results.json"):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved at {filename}")
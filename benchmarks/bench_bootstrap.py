@@ -0,0 +1,106 @@
+"""
+Bias confidence interval benchmark (python main.py --bootstrap N)
+
+Makes up sites of 3 to 12 articles whose keyword hits are Poisson draws around
+a true left/center/right mix, and works out their intervals with
+analyzer.bootstrap_bias_ci. Shows:
+- how long the intervals of one site, 19 sites and 1000 sites take
+- the same resampling as a plain Python loop for the 19 sites
+and checks that the intervals cover the true bias about as often as they
+should, that the same counts always get the same interval and that a site's
+interval doesn't depend on the sites it's worked out with.
+
+Run from the repo root:
+    python -m benchmarks.bench_bootstrap
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from analyzer import bootstrap_bias_ci
+from config import BOOTSTRAP_LEVEL
+
+def make_site(rng):
+    # Mean hits per article of every category, the true bias is worked out from them
+    means = [rng.uniform(5, 40) for _ in range(3)]
+    articles = rng.randint(3, 12)
+    scale = np.random.default_rng(rng.randrange(2 ** 32))
+    # Articles differ in length, so their hits vary more than a single Poisson would
+    lengths = scale.gamma(4, 0.25, size=articles)
+    scores = scale.poisson(np.outer(lengths, means)).tolist()
+    true_bias = (means[2] - means[0]) / sum(means) * 5
+    return scores, true_bias
+
+# The same resampling one draw at a time
+def python_bootstrap(scores, samples, level, rng):
+    biases = []
+    for _ in range(samples):
+        left = center = right = 0
+        for _ in scores:
+            l, c, r = scores[rng.randrange(len(scores))]
+            left += np.random.poisson(l) if l else 0
+            center += np.random.poisson(c) if c else 0
+            right += np.random.poisson(r) if r else 0
+        total = left + center + right
+        biases.append((right - left) / total * 5 if total else 0.0)
+    biases.sort()
+    return biases[int((1 - level) / 2 * samples)], biases[int((1 + level) / 2 * samples) - 1]
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description="Bias confidence interval benchmark")
+    parser.add_argument("--samples", type=int, default=2000, help="resamples per site (default 2000)")
+    parser.add_argument("--coverage-sites", type=int, default=500, help="sites for the coverage check (default 500)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sites = [make_site(rng) for _ in range(1000)]
+    scores = [site for site, _ in sites]
+    checks = []
+
+    # First call pays for importing NumPy's random module
+    bootstrap_bias_ci(scores[:1], args.samples)
+    timings = {}
+    for count in (1, 19, 1000):
+        intervals, timings[count] = timed(lambda: bootstrap_bias_ci(scores[:count], args.samples))
+    _, python_time = timed(lambda: [python_bootstrap(site, args.samples, BOOTSTRAP_LEVEL, random.Random(0))
+                                    for site in scores[:19]], repeat=1)
+
+    covered = sum(low <= true_bias <= high for (low, high), (_, true_bias)
+                  in zip(bootstrap_bias_ci(scores[:args.coverage_sites], args.samples),
+                         sites[:args.coverage_sites]))
+    coverage = covered / args.coverage_sites
+    checks.append((f"{BOOTSTRAP_LEVEL:.0%} intervals cover the true bias", coverage >= BOOTSTRAP_LEVEL - 0.05,
+                   f"{covered}/{args.coverage_sites} sites ({coverage:.1%})"))
+
+    again = bootstrap_bias_ci(scores[:19], args.samples)
+    checks.append(("same counts get the same interval", again == intervals[:19], "19 sites worked out twice"))
+    alone = [bootstrap_bias_ci([site], args.samples)[0] for site in scores[:19]]
+    checks.append(("a site's interval doesn't depend on the batch", alone == intervals[:19],
+                   "19 sites one at a time vs together"))
+    checks.append(("19 sites take milliseconds", timings[19] < 0.1, f"{timings[19] * 1000:.1f} ms"))
+
+    print(f"{args.samples} resamples per site, sites of 3 to 12 articles")
+    print(f"{'sites':<8} {'NumPy (ms)':>11} {'per site (ms)':>14}")
+    for count, elapsed in timings.items():
+        print(f"{count:<8} {elapsed * 1000:>11.1f} {elapsed / count * 1000:>14.3f}")
+    print(f"Python loop, 19 sites: {python_time * 1000:.0f} ms ({python_time / timings[19]:.0f}x slower)")
+    print()
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'}  {name:<46} {detail}")
+    if not all(passed for _, passed, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
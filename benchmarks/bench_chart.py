@@ -0,0 +1,68 @@
+"""
+Benchmark for building the bias chart with a lot of sites
+
+Makes up results for 20, 1,000 and 10,000 sites and times create_bias_chart
+and write_html for each, with site labels as annotations and with labels only on
+hover. The HTML size is the page without plotly.js (include_plotlyjs="cdn"),
+that part is the same ~3.5MB for every chart.
+
+Run from the repo root:
+    python -m benchmarks.bench_chart
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from visualizer import create_bias_chart
+
+SIZES = [20, 1000, 10000]
+
+# Results shaped like analyze_all_sites output, bias and credibility bunch up like real ratings do
+def make_results(rng, n):
+    results = []
+    for i in range(n):
+        known_bias = rng.choice([-4, -2, -1, 0, 1, 2, 4]) + round(rng.uniform(-0.5, 0.5), 2)
+        scores = {"left": rng.randint(0, 300), "center": rng.randint(0, 300), "right": rng.randint(0, 300)}
+        results.append({
+            "url": f"https://site{i}.example.com",
+            "name": f"site{i}.example.com",
+            "known_bias": known_bias,
+            "bias_rating": "Center",
+            "calculated_bias": rng.uniform(-5, 5),
+            "reliability": rng.randint(2, 10),
+            "scores": scores,
+            "keywords": {"left": [], "center": [], "right": []},
+            "total_keywords": sum(scores.values()),
+            "source": "AllSides and MBFC",
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Chart build benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help=f"numbers of sites to chart (default {SIZES})")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'sites':>6} {'labels':>11} {'traces':>7} {'build (s)':>10} {'write (s)':>10} {'HTML (KB)':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            results = make_results(rng, size)
+            for hover_labels in (False, True):
+                start = time.perf_counter()
+                fig = create_bias_chart(results, hover_labels=hover_labels)
+                build_time = time.perf_counter() - start
+
+                path = os.path.join(tmp, f"chart-{size}.html")
+                start = time.perf_counter()
+                fig.write_html(path, include_plotlyjs="cdn")
+                write_time = time.perf_counter() - start
+
+                labels = "hover" if hover_labels else "annotations"
+                kb = os.path.getsize(path) / 1024
+                print(f"{size:>6} {labels:>11} {len(fig.data):>7} {build_time:>10.3f} {write_time:>10.3f} {kb:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+End to end benchmark against the local stand-in news server
+
+Serves the corpus (benchmarks/corpus.py) from benchmarks/news_server.py with the
+latency and bandwidth you ask for, then times every stage on its own:
+scrape_mutiple (serial and concurrent), scrape_article, analyze_keywords,
+analyze_all_sites and create_bias_chart. Results are written as JSON so runs
+from different versions can be compared.
+
+Run from the repo root:
+    python -m benchmarks.bench_e2e --latency 0.05 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import http_cache
+import http_pool
+import robots_cache
+from analyzer import analyze_all_sites, analyze_keywords
+from benchmarks import corpus
+from benchmarks.news_server import proxied, start_server
+from config import WEBSITES
+from scraper import scrape_article, scrape_mutiple
+from visualizer import create_bias_chart
+
+# Times func over a few runs, the scraper prints a lot so that's swallowed
+def measure(func, repeat=1, calls=1):
+    runs = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            runs.append(time.perf_counter() - start)
+    return {
+        'runs': runs,
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'calls': calls,
+        'per_call': min(runs) / calls,
+    }, result
+
+# Fresh caches and connections so every run does the same work
+def reset_state(tmp):
+    http_pool.close_all()
+    robots_cache.configure(path=os.path.join(tmp, f"robots-{time.perf_counter_ns()}.json"))
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="End to end benchmark")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds before every response")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/sec per response, 0 for no limit")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of the quick stages")
+    parser.add_argument("--corpus", default=corpus.CORPUS_DIR, help="corpus directory")
+    parser.add_argument("--skip-serial", action="store_true", help="skip the slow serial scrape")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    pages = corpus.load(args.corpus)
+    websites = [corpus.local_url(website).rstrip("/") for website in WEBSITES]
+    article_urls = [url for url in pages
+                    if urlparse(url).path not in ("/", "/robots.txt")]
+
+    server = start_server(pages, latency=args.latency, bandwidth=args.bandwidth)
+    http_cache.configure(enabled=False)
+    stages = {}
+
+    with tempfile.TemporaryDirectory() as tmp, proxied(server):
+        if not args.skip_serial:
+            reset_state(tmp)
+            stages['scrape_mutiple_serial'], scraped_data = measure(
+                lambda: scrape_mutiple(websites), calls=len(websites))
+
+        reset_state(tmp)
+        stages['scrape_mutiple_concurrent'], scraped_data = measure(
+            lambda: scrape_mutiple(websites, concurrent=True), calls=len(websites))
+
+        reset_state(tmp)
+        stages['scrape_article'], _ = measure(
+            lambda: [scrape_article(url) for url in article_urls], calls=len(article_urls))
+
+    texts = [data['text'] for data in scraped_data.values()]
+    stages['analyze_keywords'], _ = measure(
+        lambda: [analyze_keywords(text) for text in texts], repeat=args.repeat, calls=len(texts))
+    stages['analyze_all_sites'], results = measure(
+        lambda: analyze_all_sites(scraped_data), repeat=args.repeat, calls=len(scraped_data))
+    stages['create_bias_chart'], _ = measure(
+        lambda: create_bias_chart(results), repeat=args.repeat)
+
+    report = {
+        'benchmark': 'e2e',
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'latency': args.latency,
+            'bandwidth': args.bandwidth,
+            'repeat': args.repeat,
+            'sites': len(websites),
+            'corpus_pages': len(pages),
+            'corpus_bytes': sum(len(body) for body, _ in pages.values()),
+        },
+        'sites_scraped': len(scraped_data),
+        'server': server.stats,
+        'stages': stages,
+    }
+    server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        for name, stage in stages.items():
+            print(f"{name:>28} {stage['min']:>9.3f}s ({stage['per_call'] * 1000:.2f} ms per call)",
+                  file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
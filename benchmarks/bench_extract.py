@@ -0,0 +1,95 @@
+"""
+Parity check and benchmark for the article extractors in extractor.py
+
+First every saved page in benchmarks/fixtures/html is run through both engines
+and the text has to match exactly, then each engine is timed on its own
+process so the peak memory numbers don't mix.
+
+Run from the repo root:
+    python -m benchmarks.bench_extract
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+
+from extractor import ENGINES, extract_article_text
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+def load_fixtures():
+    pages = {}
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+                pages[name] = f.read()
+    return pages
+
+# Real article pages are a lot bigger than the fixtures, repeat the body to get close
+def inflate(page, times):
+    match = re.search(rb"<body[^>]*>(.*)</body>", page, re.S)
+    if not match:
+        return page
+    body = match.group(1)
+    return page[:match.start(1)] + body * times + page[match.end(1):]
+
+# Makes sure both engines pull the same text out of every fixture
+def check_parity(pages):
+    failures = 0
+    for name, page in pages.items():
+        results = {engine: extract_article_text(page, engine) for engine in ENGINES}
+        if len(set(results.values())) != 1:
+            failures += 1
+            print(f"MISMATCH {name}")
+            for engine, text in results.items():
+                print(f"  {engine}: {text[:200]!r}")
+        else:
+            print(f"ok       {name}")
+    return failures
+
+# Runs in its own process so ru_maxrss only covers this engine
+def run_engine(engine, pages, rounds, queue):
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            extract_article_text(page, engine)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, peak_kb, peak_kb - baseline_kb))
+
+def main():
+    parser = argparse.ArgumentParser(description="Article extractor parity check and benchmark")
+    parser.add_argument("--rounds", type=int, default=20, help="times to go over the pages")
+    parser.add_argument("--inflate", type=int, default=30,
+                        help="repeat each page body this many times for the timing run")
+    parser.add_argument("--check-only", action="store_true", help="only run the parity check")
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    failures = check_parity(pages)
+    if failures:
+        sys.exit(f"{failures} fixture(s) differ between engines")
+    if args.check_only:
+        return
+
+    big_pages = [inflate(page, args.inflate) for page in pages.values()]
+    avg_kb = sum(len(page) for page in big_pages) / len(big_pages) / 1024
+    print(f"\n{len(big_pages)} pages, {avg_kb:.0f} KB on average, {args.rounds} rounds")
+    print(f"{'engine':>8} {'pages/sec':>10} {'peak RSS (MB)':>14} {'growth (MB)':>12}")
+
+    context = multiprocessing.get_context("spawn")
+    for engine in ENGINES:
+        queue = context.Queue()
+        process = context.Process(target=run_engine, args=(engine, big_pages, args.rounds, queue))
+        process.start()
+        elapsed, peak_kb, growth_kb = queue.get()
+        process.join()
+        pages_per_sec = len(big_pages) * args.rounds / elapsed
+        print(f"{engine:>8} {pages_per_sec:>10.1f} {peak_kb / 1024:>14.1f} {growth_kb / 1024:>12.1f}")
+
+if __name__ == "__main__":
+    main()
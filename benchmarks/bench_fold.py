@@ -0,0 +1,120 @@
+"""
+Memory benchmark for the per article fold (python main.py --fold)
+
+Crawls a made up farm of N sites from the local news server, every site is a
+copy of one of the homepage-only corpus sites under its own host name, in a
+fresh process per run so each one reports its own peak RSS:
+text: scrape_mutiple keeps every site's text, then analyze_all_sites
+fold: scrape_mutiple(fold=True) keeps only keyword counts, then analyze_all_sites
+fold + stream: iter_scrape_sites(fold=True), each site is analyzed and dropped,
+               what main.py --fold --no-chart does
+With text the memory grows with every site's text, with the fold only each
+site's keyword counts and small per-host state (robots.txt rules) add up.
+
+Run from the repo root:
+    python -m benchmarks.bench_fold
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from benchmarks import corpus
+from benchmarks.news_server import proxied, start_server
+from config import WEBSITES
+
+SIZES = [25, 100, 400]
+MODES = ["text", "fold", "fold + stream"]
+FARM_HOST = re.compile(r"site(\d+)\.example$")
+
+# Homepage-only corpus sites, their pages link with relative paths so they work under any host
+def templates():
+    return [urlparse(website).netloc for n, website in enumerate(WEBSITES) if n % 3 == 2]
+
+def farm_sites(count):
+    return [f"http://site{i}.example" for i in range(count)]
+
+# Corpus pages plus every farm host, looked up on demand so N sites cost no extra memory
+class SiteFarm:
+    def __init__(self, pages):
+        self.pages = pages
+        self.templates = templates()
+
+    def get(self, url):
+        parsed = urlparse(url)
+        match = FARM_HOST.match(parsed.netloc)
+        if match is None:
+            return self.pages.get(url)
+        template = self.templates[int(match.group(1)) % len(self.templates)]
+        return self.pages.get(f"http://{template}{parsed.path}")
+
+# Runs in the child process, crawls the farm and prints its timing and peak RSS as JSON
+def child(mode, count):
+    import http_cache
+    import metrics
+    import robots_cache
+    from analyzer import analyze_all_sites, analyze_site
+    from config import RATINGS
+    from scraper import iter_scrape_sites, scrape_mutiple
+
+    sites = farm_sites(count)
+    # Give every farm site a rating so the scraper doesn't skip it
+    for i, site in enumerate(sites):
+        RATINGS[urlparse(site).netloc] = {'bias': (i % 5) - 2, 'rating': 'Center'}
+    http_cache.configure(enabled=False)
+    robots_cache.configure(path=os.path.join(tempfile.mkdtemp(), "robots.json"))
+    start_rss = metrics.peak_rss_bytes()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "text":
+            results = analyze_all_sites(scrape_mutiple(sites, concurrent=True))
+        elif mode == "fold":
+            results = analyze_all_sites(scrape_mutiple(sites, concurrent=True, fold=True))
+        else:
+            results = [analyze_site(url, data)
+                       for url, data in iter_scrape_sites(sites, concurrent=True, window=32, fold=True)]
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'seconds': elapsed,
+        'sites': len(results),
+        'start_rss': start_rss,
+        'peak_rss': metrics.peak_rss_bytes(),
+    }))
+
+def run_child(mode, count):
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_fold", "--child", mode, str(count)],
+                            capture_output=True, text=True, check=True, cwd=os.getcwd())
+    return json.loads(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold memory benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help=f"numbers of sites to crawl (default {SIZES})")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "SITES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    server = start_server(SiteFarm(corpus.load()))
+    print(f"{'mode':<14} {'sites':>6} {'time (s)':>9} {'start (MB)':>11} {'peak (MB)':>10} {'growth (MB)':>12}")
+    # The proxy settings go to the children through the environment
+    with proxied(server):
+        for size in args.sizes:
+            for mode in MODES:
+                run = run_child(mode, size)
+                start, peak = run['start_rss'] / 2 ** 20, run['peak_rss'] / 2 ** 20
+                print(f"{mode:<14} {run['sites']:>6} {run['seconds']:>9.1f} {start:>11.1f} {peak:>10.1f} "
+                      f"{peak - start:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Result history benchmark (python main.py --history, python -m history trend)
+
+Fills a history database with a year of made up hourly runs of the 19 sites
+(every site drifts a little from its known bias), through the same
+start_run/add_results calls main.py uses. Then reads the daily and weekly
+trends of every site for the whole year from the rollups and the same numbers
+straight from the raw results, checks they agree and shows how long each took
+and how long the trend chart takes to build.
+
+Run from the repo root:
+    python -m benchmarks.bench_history
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import history
+from config import WEBSITES, RATINGS
+
+HOUR = 60 * 60
+
+def fake_result(domain, known_bias, at, rng):
+    drift = known_bias + math.sin(at / (90 * 24 * HOUR)) + rng.gauss(0, 0.3)
+    left = rng.randint(100, 300)
+    right = max(0, round(left + drift * 40 + rng.gauss(0, 10)))
+    center = rng.randint(80, 200)
+    total = left + center + right
+    return {'name': domain, 'known_bias': known_bias, 'calculated_bias': (right - left) / total * 5,
+            'scores': {'left': left, 'center': center, 'right': right}, 'total_keywords': total}
+
+# The same points as history.trend, computed from every raw result in range
+def raw_trend(conn, domain, period, since, until):
+    size = history.PERIODS[period]
+    offset = 4 * 24 * HOUR if period == "week" else 0
+    rows = conn.execute(
+        "SELECT CAST((at - ?) / ? AS INTEGER) * ? + ? AS bucket, AVG(calculated_bias), COUNT(*) FROM results "
+        "WHERE domain = ? AND at >= ? AND at <= ? GROUP BY bucket ORDER BY bucket",
+        (offset, size, size, offset, domain, history.bucket_start(since, period), until)).fetchall()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Result history benchmark")
+    parser.add_argument("--runs", type=int, default=365 * 24, help="hourly runs to record (default a year)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    domains = [urlparse(website).netloc.replace("www.", "") for website in WEBSITES]
+    sites = [(domain, RATINGS[domain]['bias']) for domain in domains]
+    checks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "history.db")
+        history.configure(enabled=True, path=db)
+        until = 1767225600 + args.runs * HOUR   # Hourly runs from the start of 2026
+        since = until - args.runs * HOUR
+
+        start = time.perf_counter()
+        for run in range(args.runs):
+            at = since + run * HOUR + rng.uniform(0, 300)
+            run_id = history.start_run(at)
+            history.add_results(run_id, [fake_result(domain, bias, at, rng) for domain, bias in sites])
+        insert_time = time.perf_counter() - start
+
+        timings = {}
+        for period in ("day", "week"):
+            start = time.perf_counter()
+            series = history.trends(period=period, since=since, until=until)
+            rollup_time = time.perf_counter() - start
+
+            conn = sqlite3.connect(db)
+            start = time.perf_counter()
+            raw = {domain: raw_trend(conn, domain, period, since, until) for domain in series}
+            raw_time = time.perf_counter() - start
+            conn.close()
+            timings[period] = (rollup_time, raw_time, sum(len(points) for points in series.values()))
+
+            same = all(
+                len(points) == len(raw[domain]) and all(
+                    point['start'] == bucket and point['runs'] == runs
+                    and abs(point['calculated_bias'] - mean) < 1e-9
+                    for point, (bucket, mean, runs) in zip(points, raw[domain]))
+                for domain, points in series.items())
+            checks.append((f"{period} rollups match the raw results", same,
+                           f"{timings[period][2]} points for {len(series)} sites"))
+
+        # Imported here like main.py does, plotly is slow to import
+        from visualizer import create_trend_chart
+        start = time.perf_counter()
+        create_trend_chart(history.trends(period="day", since=since, until=until), "day")
+        chart_time = time.perf_counter() - start
+        db_size = os.path.getsize(db)
+
+    results = args.runs * len(sites)
+    print(f"{args.runs} runs x {len(sites)} sites = {results} results, recorded in {insert_time:.1f}s "
+          f"({insert_time / args.runs * 1000:.2f} ms per run), database {db_size / 1024 / 1024:.1f} MB")
+    print(f"{'trend':<8} {'points':>7} {'rollups (ms)':>13} {'raw (ms)':>9}")
+    for period, (rollup_time, raw_time, points) in timings.items():
+        print(f"{period:<8} {points:>7} {rollup_time * 1000:>13.1f} {raw_time * 1000:>9.1f}")
+    print(f"Daily trend chart built in {chart_time * 1000:.0f} ms")
+    print()
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'}  {name:<36} {detail}")
+    if not all(passed for _, passed, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
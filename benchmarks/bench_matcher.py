@@ -0,0 +1,97 @@
+"""
+Benchmark for the single pass keyword matcher
+
+Compares the old way of counting (one re.findall per keyword) against the
+matcher in matcher.py as the dictionary grows from the real KEYWORDS up to
+10,000 phrases. Every run also checks both ways return the same counts.
+
+Run from the repo root:
+    python -m benchmarks.bench_matcher
+"""
+import argparse
+import random
+import re
+import time
+from collections import Counter
+
+from config import KEYWORDS, MAX_CHARS
+from matcher import build_matcher, count_keywords
+
+SIZES = [150, 1000, 5000, 10000]
+
+# Old per keyword counting, kept here so we have something to compare to
+def legacy_count(keyword_dict, text):
+    counts = Counter()
+    for keywords in keyword_dict.values():
+        for keyword in keywords:
+            pattern = r'\b' + re.escape(keyword) + r'\b'
+            count = len(re.findall(pattern, text))
+            if count > 0:
+                counts[keyword] += count
+    return counts
+
+# Makes up fake words so the dictionary can be any size
+def make_vocab(rng, n):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocab = set()
+    while len(vocab) < n:
+        vocab.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(vocab)
+
+# Grows the real dictionary with fake one to three word phrases
+def make_dictionary(rng, vocab, size):
+    keyword_dict = {category: list(words) for category, words in KEYWORDS.items()}
+    existing = {kw for words in keyword_dict.values() for kw in words}
+    categories = list(keyword_dict)
+    while len(existing) < size:
+        phrase = " ".join(rng.choice(vocab) for _ in range(rng.randint(1, 3)))
+        if phrase in existing:
+            continue
+        existing.add(phrase)
+        keyword_dict[rng.choice(categories)].append(phrase)
+    return keyword_dict
+
+# Text made of filler words with some keywords mixed in
+def make_text(rng, vocab, keyword_dict, chars):
+    keywords = [kw for words in keyword_dict.values() for kw in words]
+    parts = []
+    length = 0
+    while length < chars:
+        word = rng.choice(keywords) if rng.random() < 0.05 else rng.choice(vocab)
+        parts.append(word)
+        length += len(word) + 1
+    return " ".join(parts)[:chars]
+
+def time_it(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword matcher benchmark")
+    # The legacy counter takes minutes on a full MAX_CHARS * 10 site text at 10k phrases
+    parser.add_argument("--chars", type=int, default=MAX_CHARS,
+                        help="size of the text to scan (default MAX_CHARS)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocab = make_vocab(rng, 5000)
+
+    print(f"Text size: {args.chars} characters")
+    print(f"{'phrases':>8} {'legacy (s)':>11} {'build (s)':>10} {'matcher (s)':>12} {'speedup':>8}")
+    for size in SIZES:
+        keyword_dict = make_dictionary(rng, vocab, size)
+        text = make_text(rng, vocab, keyword_dict, args.chars)
+
+        legacy_time, legacy_counts = time_it(legacy_count, keyword_dict, text)
+        build_time, matcher = time_it(build_matcher, keyword_dict)
+        match_time, match_counts = time_it(count_keywords, matcher, text)
+
+        if legacy_counts != match_counts:
+            raise SystemExit(f"Counts differ for {size} phrases")
+
+        speedup = legacy_time / match_time if match_time else float("inf")
+        print(f"{size:>8} {legacy_time:>11.3f} {build_time:>10.3f} {match_time:>12.3f} {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark for the document-term matrix analysis
+
+Makes up scraped_data with article records (the same shape pipeline mode and
+the article store produce) for every site in WEBSITES, then compares
+analyzer.analyze_all_sites against term_matrix.analyze_all_sites_matrix as the
+number of articles grows. Every run also checks both return the same results.
+
+Run from the repo root:
+    python -m benchmarks.bench_matrix
+"""
+import argparse
+import random
+import time
+
+import analyzer
+from analyzer import analyze_all_sites
+from config import KEYWORDS, WEBSITES
+from scraper import get_bias_cred
+from term_matrix import analyze_all_sites_matrix
+
+SIZES = [1000, 10000, 50000]
+
+# Article records with a handful of random keyword counts each, spread over the sites
+def make_scraped_data(rng, articles):
+    keywords = [kw for words in KEYWORDS.values() for kw in words]
+    sites = [website for website in WEBSITES if get_bias_cred(website)]
+    scraped_data = {website: {'articles': [], 'bias_info': get_bias_cred(website)} for website in sites}
+    for i in range(articles):
+        counts = {kw: rng.randint(1, 5) for kw in rng.sample(keywords, rng.randint(0, 20))}
+        scraped_data[sites[i % len(sites)]]['articles'].append({'url': f"article-{i}", 'counts': counts})
+    return scraped_data
+
+def time_it(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Document-term matrix benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help=f"numbers of articles to analyze (default {SIZES})")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    # The confidence intervals have their own benchmark (bench_bootstrap), only the analysis is timed here
+    analyzer.configure(bootstrap_samples=0)
+    print(f"{'articles':>9} {'loop (s)':>9} {'matrix (s)':>11} {'speedup':>8}")
+    for size in args.sizes:
+        scraped_data = make_scraped_data(rng, size)
+
+        loop_time, loop_results = time_it(analyze_all_sites, scraped_data)
+        matrix_time, matrix_results = time_it(analyze_all_sites_matrix, scraped_data)
+
+        if loop_results != matrix_results:
+            raise SystemExit(f"Results differ for {size} articles")
+
+        speedup = loop_time / matrix_time if matrix_time else float("inf")
+        print(f"{size:>9} {loop_time:>9.3f} {matrix_time:>11.3f} {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Scaling benchmark for the parse + analyze workers in pipeline.py
+
+Runs a fixed corpus built from the saved pages in benchmarks/fixtures/html
+through pipeline.process_article with 1, 2, 4 and 8 worker processes and
+reports pages/sec. Pool start up isn't counted, every worker is warmed up first.
+
+Run from the repo root:
+    python -m benchmarks.bench_parallel
+"""
+import argparse
+import os
+import time
+
+import pipeline
+from benchmarks.bench_extract import load_fixtures, inflate
+from config import HTML_ENGINE, MAX_CHARS
+
+WORKER_COUNTS = [1, 2, 4, 8]
+
+# Builds the corpus as the page dicts scraper.fetch_article would return
+def make_corpus(pages, size, times):
+    bodies = [inflate(page, times) for page in pages.values()]
+    corpus = []
+    for i in range(size):
+        page = {'content': bodies[i % len(bodies)], 'text': None,
+                'etag': None, 'last_modified': None, 'downloaded': 0}
+        corpus.append((f"https://example.com/news/{i}", page))
+    return corpus
+
+def run(workers, corpus, engine):
+    with pipeline.start_parse_pool(workers, engine, use_cache=False) as pool:
+        # Warm up so process start up and imports aren't part of the timing
+        list(pool.map(pipeline.process_article, *zip(*corpus[:workers * 2]),
+                      [MAX_CHARS * 10] * (workers * 2)))
+
+        start = time.perf_counter()
+        futures = [pool.submit(pipeline.process_article, url, page, MAX_CHARS * 10)
+                   for url, page in corpus]
+        records = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+    keyword_hits = sum(sum(record['counts'].values()) for record in records)
+    return elapsed, keyword_hits
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse worker scaling benchmark")
+    parser.add_argument("--pages", type=int, default=400, help="pages in the corpus")
+    parser.add_argument("--inflate", type=int, default=30,
+                        help="repeat each page body this many times")
+    parser.add_argument("--engine", default=HTML_ENGINE, help="HTML engine the workers use")
+    args = parser.parse_args()
+
+    corpus = make_corpus(load_fixtures(), args.pages, args.inflate)
+    print(f"{args.pages} pages, {args.engine} engine, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'time (s)':>9} {'pages/sec':>10} {'speedup':>8}")
+
+    baseline = None
+    expected_hits = None
+    for workers in WORKER_COUNTS:
+        elapsed, keyword_hits = run(workers, corpus, args.engine)
+        # Every worker count has to find exactly the same keywords
+        if expected_hits is None:
+            expected_hits = keyword_hits
+        elif keyword_hits != expected_hits:
+            raise SystemExit(f"{workers} workers found {keyword_hits} keywords, expected {expected_hits}")
+
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.3f} {args.pages / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Politeness check against a local server with scripted failures
+
+Crawls a few corpus sites concurrently three times: once clean, once with the
+server answering some requests with 429s (with and without Retry-After), 500s,
+503s, stalls that run into the request timeout and article bodies that stop
+halfway (stalling past the timeout or cut off), and once more with the same
+failures and retries turned off. Then checks that:
+- the retried crawl got the same text for every site as the clean one
+- a retried request waited at least the Retry-After the server asked for
+- requests to the site with a robots.txt Crawl-delay were spaced that far apart
+- the other sites were done before the slow site, so it didn't hold them up
+- every scripted failure was counted as one retry
+and shows what the same failures cost without retries.
+
+Run from the repo root:
+    python -m benchmarks.bench_politeness
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import http_cache
+import http_pool
+import politeness
+import robots_cache
+from benchmarks import corpus
+from benchmarks.news_server import proxied, start_server
+from config import WEBSITES
+from scraper import scrape_mutiple
+
+CRAWL_DELAY = 1
+TIMEOUT = 1.0
+# Small slack for timer and scheduling jitter
+SLACK = 0.05
+
+def crawl(pages, websites, faults, tmp):
+    http_pool.close_all()
+    politeness.reset()
+    robots_cache.configure(path=os.path.join(tmp, f"robots-{time.perf_counter_ns()}.json"))
+    server = start_server(pages, faults=faults)
+    before = politeness.politeness_stats()
+    with proxied(server), contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        data = scrape_mutiple(websites, concurrent=True, max_workers=8, max_per_host=2)
+        elapsed = time.perf_counter() - start
+    after = politeness.politeness_stats()
+    server.shutdown()
+    texts = {urlparse(site).netloc: site_data['text'] for site, site_data in data.items()}
+    return texts, server.log, elapsed, after['retries'] - before['retries']
+
+# Article urls the clean crawl fetched, by host, in the order they were requested
+def fetched_articles(log):
+    articles = defaultdict(list)
+    for _, url, status in log:
+        parsed = urlparse(url)
+        if status == 200 and "/2026/" in parsed.path:
+            articles[parsed.netloc].append(url)
+    return articles
+
+"""
+Scripted failures for the second crawl
+slow: robots.txt asks for a Crawl-delay
+rate limited: 429 with Retry-After on two articles, one of them twice, and a 429 without it
+flaky: an article that stalls past the timeout, a 503, a 500, and two whose
+       bodies stop halfway, one stalls past the timeout and one gets cut off
+"""
+def script_faults(pages, articles, slow, limited, flaky):
+    faults = {
+        articles[limited][0]: [("status", 429, 1), ("status", 429, 1)],
+        articles[limited][1]: [("status", 429, 2)],
+        articles[limited][2]: [("status", 429, None)],
+        articles[flaky][0]: [("stall", TIMEOUT * 2)],
+        articles[flaky][1]: [("status", 503, None)],
+        articles[flaky][2]: [("status", 500, None)],
+        articles[flaky][3]: [("body_stall", TIMEOUT * 2)],
+        articles[flaky][4]: [("body_stall", 0)],
+    }
+    robots_url = f"http://{slow}/robots.txt"
+    body, content_type = pages[robots_url]
+    pages = dict(pages)
+    pages[robots_url] = (body.replace(b"User-agent: *\n", f"User-agent: *\nCrawl-delay: {CRAWL_DELAY}\n".encode()),
+                         content_type)
+    return pages, faults
+
+# Waits between a scripted Retry-After answer and the next request for the same url
+def retry_after_waits(log, faults):
+    waits = []
+    for url, scripted in faults.items():
+        times = [(at, status) for at, logged_url, status in log if logged_url == url]
+        for (at, status), (next_at, _) in zip(times, times[1:]):
+            retry_after = next((fault[2] for fault in scripted if fault[1] == status), None)
+            if retry_after:
+                waits.append((next_at - at, retry_after))
+    return waits
+
+def main():
+    parser = argparse.ArgumentParser(description="Politeness and retry check")
+    parser.add_argument("--sites", type=int, default=6, help="corpus sites to crawl (default 6)")
+    args = parser.parse_args()
+
+    pages = corpus.load()
+    websites = [corpus.local_url(website).rstrip("/") for website in WEBSITES[:args.sites]]
+    hosts = [urlparse(website).netloc for website in websites]
+    slow, limited, flaky = hosts[0], hosts[1], hosts[2]
+
+    http_cache.configure(enabled=False)
+    http_pool.configure(timeout=TIMEOUT)
+    checks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        clean_texts, clean_log, clean_time, _ = crawl(pages, websites, {}, tmp)
+        faulty_pages, faults = script_faults(pages, fetched_articles(clean_log), slow, limited, flaky)
+        expected_retries = sum(len(scripted) for scripted in faults.values())
+
+        texts, log, elapsed, retries = crawl(faulty_pages, websites, faults, tmp)
+        politeness.configure(max_retries=0)
+        lost_texts, _, lost_time, _ = crawl(faulty_pages, websites, faults, tmp)
+    politeness.configure(max_retries=politeness.MAX_RETRIES)
+
+    checks.append(("same text as the clean crawl", texts == clean_texts,
+                   f"{sum(texts.get(host) == clean_texts.get(host) for host in hosts)}/{len(hosts)} sites"))
+
+    waits = retry_after_waits(log, faults)
+    checks.append(("Retry-After respected", all(wait >= asked - SLACK for wait, asked in waits),
+                   ", ".join(f"{wait:.2f}s (asked {asked}s)" for wait, asked in waits)))
+
+    slow_times = [at for at, url, _ in log if urlparse(url).netloc == slow]
+    gaps = [b - a for a, b in zip(slow_times, slow_times[1:])]
+    checks.append((f"Crawl-delay {CRAWL_DELAY}s kept", bool(gaps) and min(gaps) >= CRAWL_DELAY - SLACK,
+                   f"{len(slow_times)} requests, smallest gap {min(gaps):.2f}s"))
+
+    others_done = max(at for at, url, _ in log if urlparse(url).netloc not in (slow, limited))
+    checks.append(("other sites not held up", others_done < max(slow_times),
+                   f"others done {others_done - log[0][0]:.1f}s in, slow site {max(slow_times) - log[0][0]:.1f}s"))
+
+    checks.append(("every failure retried once", retries == expected_retries,
+                   f"{retries} retries for {expected_retries} scripted failures"))
+
+    print(f"{len(websites)} sites, clean crawl {clean_time:.1f}s, with failures {elapsed:.1f}s")
+    lost = sum(clean_texts.get(host) != lost_texts.get(host) for host in hosts)
+    print(f"Without retries the same failures took {lost_time:.1f}s and changed the text of {lost} sites")
+    print()
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'}  {name:<32} {detail}")
+    if not all(passed for _, passed, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark for the pooled keep-alive sessions in http_pool.py
+
+Starts a few local HTTP/1.1 servers that stand in for news sites and counts how
+many connections (handshakes) they accept. Each site is scraped the old way
+(robots.txt through RobotFileParser.read() and a bare requests.get for every
+page) and then through scraper.py, which uses the pooled sessions, first
+straight to the sites and then through an HTTP proxy (the first site, it takes
+absolute URLs too). Checks the connections http_pool.pool_stats counts are the
+handshakes the servers saw.
+
+Run from the repo root:
+    python -m benchmarks.bench_pool
+"""
+import argparse
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+import http_pool
+import scraper
+from benchmarks.news_server import proxied
+from config import USER_AGENT, REQUEST_TIMEOUT
+
+ARTICLES = 7
+
+# Local news site, keeps connections open like a real server would
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Without this the headers and body go out as two small packets and keep-alive
+    # requests stall on delayed ACKs, real servers don't do that
+    disable_nagle_algorithm = True
+    connections = 0
+    requests = 0
+    lock = threading.Lock()
+    latency = 0.0
+
+    # Called once for every new connection, so this counts handshakes
+    def setup(self):
+        with SiteHandler.lock:
+            SiteHandler.connections += 1
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with SiteHandler.lock:
+            SiteHandler.requests += 1
+        time.sleep(SiteHandler.latency)
+        # Proxied requests ask for the absolute URL
+        path = urlparse(self.path).path or "/"
+        if path == "/robots.txt":
+            body = b"User-agent: *\nDisallow: /private/\n"
+            content_type = "text/plain"
+        elif path == "/":
+            links = "".join(f'<a href="/news/story-{i}">Story {i}</a>' for i in range(ARTICLES))
+            body = f"<html><body>{links}</body></html>".encode()
+            content_type = "text/html"
+        else:
+            body = (f"<html><body><article><p>Story {path} about climate change "
+                    f"and tax cuts.</p></article></body></html>").encode()
+            content_type = "text/html"
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_sites(count):
+    sites = []
+    for _ in range(count):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        sites.append((server, f"http://127.0.0.1:{server.server_address[1]}"))
+    return sites
+
+# How scraper.py fetched pages before the pooled sessions
+def scrape_unpooled(site):
+    robots_parser = RobotFileParser()
+    robots_parser.set_url(site + "/robots.txt")
+    robots_parser.read()
+    robots_parser.can_fetch("*", site)
+
+    headers = {'User-Agent': USER_AGENT}
+    requests.get(site, headers=headers, timeout=REQUEST_TIMEOUT)
+    for i in range(ARTICLES):
+        requests.get(f"{site}/news/story-{i}", headers=headers, timeout=REQUEST_TIMEOUT)
+
+# Same pages through scraper.py
+def scrape_pooled(site):
+    scraper.can_scrape(site)
+    scraper.scrape_multi_article(site, num_articles=ARTICLES)
+
+# Requests are what http_pool counted, the unpooled baseline doesn't go through it so the sites count those
+def run(name, scrape, sites, pooled=True):
+    SiteHandler.connections = 0
+    SiteHandler.requests = 0
+    start = time.perf_counter()
+    for _, site in sites:
+        scrape(site)
+    elapsed = time.perf_counter() - start
+    requests_made = http_pool.pool_stats()['requests'] if pooled else SiteHandler.requests
+    print(f"{name:>10} {requests_made:>9} {SiteHandler.connections:>12} {elapsed:>9.3f}")
+    return SiteHandler.connections
+
+def main():
+    parser = argparse.ArgumentParser(description="Connection pool benchmark")
+    parser.add_argument("--sites", type=int, default=5, help="number of local sites")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds each response is delayed by")
+    args = parser.parse_args()
+
+    SiteHandler.latency = args.latency
+    sites = start_sites(args.sites)
+
+    checks = []
+    print(f"{'mode':>10} {'requests':>9} {'handshakes':>12} {'time (s)':>9}")
+    run("unpooled", scrape_unpooled, sites, pooled=False)
+    for name in ("pooled", "proxied"):
+        http_pool.close_all()
+        if name == "proxied":
+            with proxied(sites[0][0]):
+                handshakes = run(name, scrape_pooled, sites)
+        else:
+            handshakes = run(name, scrape_pooled, sites)
+        stats = http_pool.pool_stats()
+        checks.append((f"{name} connections counted", stats['connections'] == handshakes,
+                       f"{stats['connections']} counted, {handshakes} handshakes, {stats['reused']} reused"))
+        checks.append((f"{name} requests counted", stats['requests'] == SiteHandler.requests,
+                       f"{stats['requests']} counted, {SiteHandler.requests} served"))
+
+    for server, _ in sites:
+        server.shutdown()
+    print()
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'}  {name:<28} {detail}")
+    if not all(passed for _, passed, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
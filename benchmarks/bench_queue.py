@@ -0,0 +1,113 @@
+"""
+Check and benchmark for the shared work queue in work_queue.py
+
+Starts local stand-in news sites, queues them, then runs N worker processes
+against the queue. One extra worker leases a job and dies without finishing it,
+so its lease has to run out and another worker has to pick the job up.
+At the end every job has to be done exactly once with one result, and the merged
+results have to hold every article the sites link to.
+
+Run from the repo root:
+    python -m benchmarks.bench_queue --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import http_cache
+import robots_cache
+import work_queue
+from benchmarks.bench_pool import ARTICLES, SiteHandler, start_sites
+
+BIAS_INFO = {'bias': 0, 'rating': 'Center', 'credibility': 5, 'source': "benchmark"}
+
+# Worker process, the caches go in the temp dir so the check doesn't touch the real ones
+def worker(path, cache_dir, lease_seconds):
+    robots_cache.configure(path=os.path.join(cache_dir, "robots.json"))
+    http_cache.configure(enabled=False)
+    work_queue.run_worker(path, poll=0.2, lease_seconds=lease_seconds)
+
+# Leases one job and exits without finishing it, like a worker that crashed
+def crashing_worker(path, lease_seconds):
+    conn = work_queue.open_queue(path)
+    job = work_queue.lease(conn, "crasher", lease_seconds=lease_seconds)
+    print(f"[crasher] leased {job['url']} and died")
+    conn.close()
+
+def check(path, sites):
+    conn = work_queue.open_queue(path)
+    rows = conn.execute("SELECT kind, site, url, status, attempts, result FROM jobs").fetchall()
+    conn.close()
+
+    problems = []
+    expected = {(site, site) for site in sites}
+    expected |= {(site, f"{site}/news/story-{i}") for site in sites for i in range(ARTICLES)}
+    seen = [(site, url) for _, site, url, _, _, _ in rows]
+
+    if len(seen) != len(set(seen)):
+        problems.append("a job was queued twice")
+    missing = expected - set(seen)
+    if missing:
+        problems.append(f"{len(missing)} jobs were never queued")
+    for kind, site, url, status, attempts, result in rows:
+        if status != 'done' or result is None:
+            problems.append(f"{kind} job {url} ended as {status}")
+
+    retried = [url for _, _, url, _, attempts, _ in rows if attempts > 1]
+    if not retried:
+        problems.append("the crashed workers job was never retried")
+
+    scraped_data = work_queue.collect_results(path)
+    articles = sum(len(data['articles']) for data in scraped_data.values())
+    if articles != len(sites) * ARTICLES:
+        problems.append(f"merged {articles} articles, expected {len(sites) * ARTICLES}")
+
+    return rows, retried, problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Work queue check and benchmark")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--sites", type=int, default=10, help="local sites to crawl")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per response")
+    parser.add_argument("--lease", type=float, default=3.0, help="lease length in seconds")
+    args = parser.parse_args()
+
+    SiteHandler.latency = args.latency
+    sites = [site for _, site in start_sites(args.sites)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "queue.db")
+        conn = work_queue.open_queue(path)
+        for site in sites:
+            work_queue.enqueue_site(conn, site, BIAS_INFO)
+        conn.close()
+
+        context = multiprocessing.get_context("spawn")
+        crasher = context.Process(target=crashing_worker, args=(path, args.lease))
+        crasher.start()
+        crasher.join()
+
+        start = time.perf_counter()
+        workers = [context.Process(target=worker, args=(path, tmp, args.lease))
+                   for _ in range(args.workers)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        rows, retried, problems = check(path, sites)
+
+    print(f"\n{args.workers} workers, {len(rows)} jobs in {elapsed:.2f}s "
+          f"({len(rows) / elapsed:.1f} jobs/sec), retried: {', '.join(retried)}")
+    if problems:
+        for problem in problems:
+            print(f"FAIL {problem}")
+        sys.exit(1)
+    print("ok: no job lost or duplicated")
+
+if __name__ == "__main__":
+    main()
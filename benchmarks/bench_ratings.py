@@ -0,0 +1,151 @@
+"""
+Ratings registry benchmark (python -m ratings build)
+
+Makes a CSV export of N made up domains, compiles it with ratings.build and
+looks up random hosts a few labels below them (news.politics.siteN.example).
+Shows:
+- how long the build takes and how big the index is
+- how long opening the index takes vs json.load of the same ratings
+- lookups per second through the index
+and checks that every lookup gets the same answer as walking a plain dict,
+that an index cut off anywhere is ignored with a warning instead of raising
+and that an unrated site is dropped before its robots.txt is requested.
+
+Run from the repo root:
+    python -m benchmarks.bench_ratings
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import ratings
+import robots_cache
+from benchmarks import corpus
+from benchmarks.news_server import proxied, start_server
+from config import WEBSITES
+from scraper import scrape_mutiple
+
+LOOKUPS = 100000
+LABELS = ["Left", "Lean Left", "Center", "Lean Right", "Right"]
+
+def write_export(path, count, rng):
+    expected = {}
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["News Source", "Rating", "URL", "Credibility"])
+        for i in range(count):
+            label = rng.choice(LABELS)
+            credibility = rng.randint(0, 10)
+            writer.writerow([f"Site {i}", label, f"https://www.site{i}.example/", credibility])
+            expected[f"site{i}.example"] = (ratings.BIAS_SCORES[label.lower()], credibility)
+    return expected
+
+# The same answer the slow way, every suffix against a dict
+def reference(host, expected):
+    labels = host.split(".")
+    for i in range(len(labels)):
+        domain = ".".join(labels[i:])
+        if domain in expected:
+            return domain, expected[domain]
+    return None
+
+# Robots.txt requests when one of the sites isn't rated
+def robots_requests(tmp):
+    pages = corpus.load()
+    websites = [corpus.local_url(website).rstrip("/") for website in WEBSITES[:3]]
+    websites.append("http://unrated.example")
+    robots_cache.configure(path=os.path.join(tmp, "robots.json"))
+    server = start_server(pages)
+    with proxied(server), contextlib.redirect_stdout(io.StringIO()):
+        scrape_mutiple(websites, concurrent=True)
+    server.shutdown()
+    return [url for _, url, _ in server.log if url.endswith("/robots.txt")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Ratings registry benchmark")
+    parser.add_argument("--domains", type=int, default=50000, help="domains in the export (default 50000)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    checks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "allsides.csv")
+        index = os.path.join(tmp, "ratings.idx")
+        expected = write_export(export, args.domains, rng)
+        with open(os.path.join(tmp, "ratings.json"), "w", encoding="utf-8") as f:
+            json.dump(expected, f)
+
+        start = time.perf_counter()
+        count, _ = ratings.build([export], index)
+        build_time = time.perf_counter() - start
+        index_size = os.path.getsize(index)
+
+        start = time.perf_counter()
+        ratings.configure(path=index)
+        ratings.index_size()
+        open_time = time.perf_counter() - start
+        start = time.perf_counter()
+        with open(os.path.join(tmp, "ratings.json"), encoding="utf-8") as f:
+            json.load(f)
+        json_time = time.perf_counter() - start
+
+        # Mostly subdomains of rated sites, some hosts that aren't rated at all
+        hosts = []
+        for _ in range(LOOKUPS):
+            site = rng.randrange(args.domains * 11 // 10)
+            hosts.append(".".join(["news", "politics", f"site{site}", "example"][rng.randrange(3):]))
+        start = time.perf_counter()
+        found = [ratings.resolve(host) for host in hosts]
+        lookup_time = time.perf_counter() - start
+
+        wrong = 0
+        for host, match in zip(hosts, found):
+            want = reference(host, expected)
+            got = None if match is None else (match[0], (match[1]['bias'], match[1]['credibility']))
+            wrong += got != want
+        checks.append(("same answers as a dict walk", wrong == 0, f"{LOOKUPS - wrong}/{LOOKUPS} lookups"))
+
+        # Cut off in the header, the slots and the names, only config.py's ratings should be left
+        with open(index, "rb") as f:
+            data = f.read()
+        cut_ok = 0
+        cuts = [4, ratings.HEADER.size + 100, len(data) - 1]
+        for size in cuts:
+            cut = os.path.join(tmp, f"cut-{size}.idx")
+            with open(cut, "wb") as f:
+                f.write(data[:size])
+            ratings.configure(path=cut)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    found = [ratings.resolve(host) for host in hosts[:1000]]
+                cut_ok += all(match is None for match in found) and ratings.resolve("www.npr.org") is not None
+            except Exception:
+                pass
+        checks.append(("cut off index falls back to config", cut_ok == len(cuts),
+                       f"{cut_ok}/{len(cuts)} cut off files"))
+
+        ratings.configure(path=os.path.join(tmp, "missing.idx"))
+        requested = robots_requests(tmp)
+        checks.append(("unrated site skipped before robots.txt",
+                       not any("unrated.example" in url for url in requested),
+                       f"{len(requested)} robots.txt requests for 3 rated sites"))
+
+    print(f"{count} domains, built in {build_time:.2f}s, index {index_size / 1024 / 1024:.1f} MB")
+    print(f"{'open index':<12} {open_time * 1000:>8.2f} ms")
+    print(f"{'json.load':<12} {json_time * 1000:>8.2f} ms")
+    print(f"{LOOKUPS} lookups in {lookup_time:.2f}s ({LOOKUPS / lookup_time:,.0f} per second)")
+    print()
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'}  {name:<40} {detail}")
+    if not all(passed for _, passed, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
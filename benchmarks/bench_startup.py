@@ -0,0 +1,61 @@
+"""
+Startup benchmark for the headless mode
+
+main.py only imports plotly (visualizer), bs4 and numpy once they're used, so a
+--no-chart run starts without them. This times a fresh interpreter importing
+main.py against one that also imports those modules up front, the way main.py
+used to, and reports the memory each ends up with.
+
+Run from the repo root:
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["plotly", "bs4", "numpy"]
+
+SCENARIOS = {
+    'headless (import main)': "import main",
+    'eager (main + visualizer, bs4, numpy)': "import main, visualizer, bs4, term_matrix",
+}
+
+# Runs in the child, imports the code and reports its own timing and peak RSS
+# (metrics is imported after the timing, main.py has loaded it by then anyway)
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+import metrics
+print(json.dumps({{
+    'seconds': elapsed,
+    'peak_rss': metrics.peak_rss_bytes(),
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+def run_child(code):
+    source = CHILD.format(code=code, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", source], capture_output=True, text=True,
+                            check=True, cwd=os.getcwd())
+    return json.loads(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per scenario")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<40} {'median (s)':>11} {'min (s)':>8} {'RSS (MB)':>9}  loaded")
+    for name, code in SCENARIOS.items():
+        runs = [run_child(code) for _ in range(args.runs)]
+        seconds = [run['seconds'] for run in runs]
+        rss = max(run['peak_rss'] for run in runs) / 2 ** 20
+        loaded = ", ".join(runs[-1]['loaded']) or "-"
+        print(f"{name:<40} {statistics.median(seconds):>11.3f} {min(seconds):>8.3f} {rss:>9.1f}  {loaded}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+WARC archive and replay benchmark (python main.py --warc DIR / --replay FILE)
+
+Crawls the corpus from the local news server with --warc, then replays the
+archive with the proxy pointed at a closed port so any request that tries the
+network fails. Checks that the replayed results are the same as the live ones
+and shows:
+- how long the live crawl and the replay took
+- how big the archive is compressed and uncompressed
+- reading single records through the index and mmap vs decompressing the
+  whole archive to find them
+
+Run from the repo root:
+    python -m benchmarks.bench_warc
+"""
+import argparse
+import contextlib
+import glob
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import http_cache
+import http_pool
+import main as poliscraper
+import robots_cache
+import warc
+from benchmarks import corpus
+from benchmarks.news_server import proxied, start_server
+from config import WEBSITES
+
+READS = 50
+
+def run(argv):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        poliscraper.main(argv)
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return sorted(json.load(f), key=lambda result: result['url'])
+
+def main():
+    parser = argparse.ArgumentParser(description="WARC archive and replay benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency in seconds (default 0.05)")
+    args = parser.parse_args()
+
+    pages = corpus.load()
+    poliscraper.WEBSITES = [corpus.local_url(website).rstrip("/") for website in WEBSITES]
+    http_cache.configure(enabled=False)
+    checks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        robots_cache.configure(path=os.path.join(tmp, "robots.json"))
+        server = start_server(pages, latency=args.latency)
+        with proxied(server):
+            live_time = run(["--concurrent", "--no-chart", "--no-cache", "--warc", tmp,
+                             "--output", os.path.join(tmp, "live.json")])
+        server.shutdown()
+        archive = glob.glob(os.path.join(tmp, "*.warc.gz"))[0]
+
+        # Nothing listens on port 9, a request that gets past replay fails
+        http_pool.close_all()
+        offline = {"http_proxy": "http://127.0.0.1:9", "HTTP_PROXY": "http://127.0.0.1:9"}
+        saved = {name: os.environ.get(name) for name in offline}
+        os.environ.update(offline)
+        try:
+            replay_time = run(["--no-chart", "--replay", archive, "--output", os.path.join(tmp, "replay.json")])
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        stats = warc.warc_stats()
+        requests_made = http_pool.pool_stats()['requests']
+
+        live, replayed = load_results(os.path.join(tmp, "live.json")), load_results(os.path.join(tmp, "replay.json"))
+        checks.append(("same results as the live crawl", live == replayed, f"{len(replayed)}/{len(live)} sites"))
+        checks.append(("no request went to the network", requests_made == 0,
+                       f"{stats['replayed']} responses replayed, {requests_made} requests made"))
+
+        # Random records, through the index vs decompressing the whole archive every time
+        with open(archive + ".idx", encoding="utf-8") as f:
+            urls = [line.rstrip("\n").split("\t")[4] for line in f if "\tresponse\t" in line]
+        picked = random.Random(0).choices(urls, k=READS)
+        warc.start_replay(archive)
+        start = time.perf_counter()
+        for url in picked:
+            warc.replay_response(url).content
+        indexed_time = time.perf_counter() - start
+        warc.stop_replay()
+        start = time.perf_counter()
+        for url in picked:
+            with open(archive, "rb") as f:
+                data = gzip.decompress(f.read())
+            data.find(f"WARC-Target-URI: {url}\r\n".encode("utf-8"))
+        full_time = time.perf_counter() - start
+        checks.append(("indexed reads faster than decompressing", indexed_time < full_time,
+                       f"{indexed_time / READS * 1000:.2f} ms vs {full_time / READS * 1000:.2f} ms per record"))
+
+        archive_size = os.path.getsize(archive)
+        raw_size = len(data)
+        records = len(urls)
+
+    print(f"{len(live)} sites, live crawl {live_time:.1f}s ({args.latency}s latency), replay {replay_time:.1f}s")
+    print(f"Archive: {records} responses, {archive_size / 1024:.0f} KB compressed, {raw_size / 1024:.0f} KB of records")
+    print(f"{'indexed + mmap':<16} {indexed_time / READS * 1000:>8.2f} ms per record")
+    print(f"{'whole archive':<16} {full_time / READS * 1000:>8.2f} ms per record")
+    print()
+    for name, passed, detail in checks:
+        print(f"{'PASS' if passed else 'FAIL'}  {name:<40} {detail}")
+    if not all(passed for _, passed, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Corpus of homepages, articles, feeds, sitemaps and robots.txt files for the sites in config.WEBSITES
+
+The benchmarks serve this corpus from benchmarks/news_server.py instead of hitting
+the live sites, so runs are reproducible. It can come from two places:
+
+record: downloads the real pages once (needs network), https links are
+        rewritten to http:// since the local server doesn't do TLS
+generate: builds a made up but realistically sized corpus, deterministic for a
+          given seed so every machine benchmarks the same bytes
+
+Either way it's saved as benchmarks/corpus/manifest.json plus one file per page.
+Recorded pages belong to their publishers, keep them out of git.
+
+Run from the repo root:
+    python -m benchmarks.corpus generate
+    python -m benchmarks.corpus record
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from urllib.parse import urljoin, urlparse
+
+from config import KEYWORDS, RATINGS, WEBSITES, USER_AGENT
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+ARTICLES_PER_SITE = 10
+# Every this many articles one is a wire story that other sites run too
+WIRE_EVERY = 3
+
+FILLER = ("the a of to and in that is for on with as was by at from officials said "
+          "report week government state city people year new plan vote bill house senate "
+          "court president campaign policy public local national economy support group told "
+          "would could after before while during under over about more most some many").split()
+
+# Homepage url for a site, the benchmarks always talk plain http to the local server
+def local_url(website):
+    parsed = urlparse(website)
+    return f"http://{parsed.netloc}/"
+
+# Saves one page into the corpus and adds it to the manifest
+def _save(manifest, corpus_dir, url, body, content_type):
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    with open(os.path.join(corpus_dir, name), "wb") as f:
+        f.write(body)
+    manifest[url] = {'file': name, 'type': content_type}
+
+def _write_manifest(manifest, corpus_dir):
+    with open(os.path.join(corpus_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+# Sentence of filler words with keywords mixed in, leaning the way the site leans
+def _sentence(rng, lean):
+    words = []
+    for _ in range(rng.randint(12, 28)):
+        if rng.random() < 0.06:
+            weights = {"left": 1.0 - 0.3 * lean, "center": 0.6, "right": 1.0 + 0.3 * lean}
+            category = rng.choices(list(weights), weights=list(weights.values()))[0]
+            words.append(rng.choice(KEYWORDS[category]))
+        else:
+            words.append(rng.choice(FILLER))
+    return " ".join(words).capitalize() + "."
+
+def _paragraphs(rng, lean):
+    return [[_sentence(rng, lean) for _ in range(rng.randint(3, 6))] for _ in range(rng.randint(12, 30))]
+
+"""
+A wire story, every site that runs it gets the same text. Odd numbered sites
+edit it a little (a sentence of their own) so there are near copies as well
+as exact ones for the dedup to find.
+"""
+def _wire_story(seed, k, rng, n):
+    paragraphs = _paragraphs(random.Random(f"{seed}:wire:{k}"), 0)
+    if n % 2:
+        paragraphs[-1] = paragraphs[-1][:-1] + [_sentence(rng, 0)]
+    return paragraphs
+
+def _article_html(rng, site_name, title, lean, paragraphs=None):
+    if paragraphs is None:
+        paragraphs = _paragraphs(rng, lean)
+    paragraphs = "\n".join(f"<p>{' '.join(sentences)}</p>" for sentences in paragraphs)
+    # Real pages are mostly scripts, styles and navigation, this pads them out the same way
+    script = "var analytics = {" + ",".join(f'"k{i}": {i}' for i in range(rng.randint(800, 2500))) + "};"
+    style = " ".join(f".c{i} {{ margin: {i % 17}px; color: #{i:06x}; }}" for i in range(rng.randint(300, 900)))
+    nav = " ".join(f'<a href="/section/{i}">Section {i}</a>' for i in range(40))
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title} | {site_name}</title>
+<style>{style}</style><script>{script}</script></head>
+<body>
+<header><a href="/">{site_name}</a><nav>{nav}</nav></header>
+<main><article class="story-body">
+<h1>{title}</h1>
+<p class="byline">By Staff Reporter</p>
+{paragraphs}
+<aside class="related"><a href="/news/related">Related coverage</a></aside>
+</article></main>
+<footer><p>&copy; {site_name}</p><nav>{nav}</nav></footer>
+<script>{script}</script>
+</body></html>""".encode("utf-8")
+
+def _homepage_html(site_name, article_paths, rng):
+    links = [f'<a href="{path}">{path.rsplit("/", 1)[-1].replace("-", " ").title()}</a>'
+             for path in article_paths]
+    # Things extract_article_links has to skip
+    links += [f'<a href="/section/{i}">Section {i}</a>' for i in range(30)]
+    links += ['<a href="https://twitter.com/example">Twitter</a>', '<a href="#top">Top</a>',
+              '<a href="javascript:void(0)">Menu</a>']
+    rng.shuffle(links)
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{site_name}</title></head>"
+            f"<body><header><h1>{site_name}</h1></header><main>{' '.join(links)}</main>"
+            f"<footer>&copy; {site_name}</footer></body></html>").encode("utf-8")
+
+# Articles come out a day apart, newest is the last one
+def _published(i):
+    return datetime(2026, 9, 1, 8, 0, tzinfo=timezone.utc) + timedelta(days=i, hours=i % 5)
+
+# Google news sitemap, with a few section pages mixed in like real sitemaps have
+def _news_sitemap(base, article_paths):
+    urls = [f"<url><loc>{urljoin(base, path)}</loc><news:news><news:publication_date>"
+            f"{_published(i).isoformat()}</news:publication_date></news:news></url>"
+            for i, path in enumerate(article_paths)]
+    urls += [f"<url><loc>{urljoin(base, section)}</loc></url>" for section in ("/", "/politics")]
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+            'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">'
+            + "".join(urls) + "</urlset>").encode("utf-8")
+
+def _rss_feed(base, site_name, article_paths):
+    items = [f"<item><title>{path.rsplit('/', 1)[-1]}</title><link>{urljoin(base, path)}</link>"
+             f"<pubDate>{format_datetime(_published(i))}</pubDate></item>"
+             for i, path in enumerate(article_paths)]
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>'
+            f"<title>{site_name}</title><link>{base}</link>" + "".join(items)
+            + "</channel></rss>").encode("utf-8")
+
+"""
+Builds the made up corpus
+Sites take turns at how their articles can be found, like the real ones do:
+a news sitemap listed in robots.txt, an RSS feed at /feed, or only the homepage.
+Every WIRE_EVERY articles is a wire story shared between the sites.
+"""
+def generate(corpus_dir=CORPUS_DIR, seed=1, websites=WEBSITES):
+    os.makedirs(corpus_dir, exist_ok=True)
+    manifest = {}
+    sections = ["news", "politics", "world", "us", "opinion", "analysis"]
+
+    for n, website in enumerate(websites):
+        host = urlparse(website).netloc
+        domain = host.replace("www.", "")
+        rng = random.Random(f"{seed}:{domain}")
+        lean = RATINGS.get(domain, {'bias': 0})['bias']
+        site_name = domain.split(".")[0].title()
+        base = local_url(website)
+
+        discovery = ("sitemap", "feed", "homepage")[n % 3]
+        robots = "User-agent: *\nDisallow: /private/\nDisallow: /search\n"
+        if discovery == "sitemap":
+            robots += f"\nSitemap: {urljoin(base, '/news-sitemap.xml')}\n"
+        _save(manifest, corpus_dir, urljoin(base, "/robots.txt"), robots.encode("utf-8"), "text/plain")
+
+        article_paths = []
+        for i in range(ARTICLES_PER_SITE):
+            section = rng.choice(sections)
+            title = " ".join(rng.choice(FILLER) for _ in range(6)).title()
+            path = f"/{section}/2026/{i:02d}/{title.lower().replace(' ', '-')}"
+            article_paths.append(path)
+            wire = _wire_story(seed, i // WIRE_EVERY, rng, n) if i % WIRE_EVERY == 0 else None
+            _save(manifest, corpus_dir, urljoin(base, path),
+                  _article_html(rng, site_name, title, lean, wire), "text/html; charset=utf-8")
+
+        _save(manifest, corpus_dir, base, _homepage_html(site_name, article_paths, rng),
+              "text/html; charset=utf-8")
+        if discovery == "sitemap":
+            _save(manifest, corpus_dir, urljoin(base, "/news-sitemap.xml"),
+                  _news_sitemap(base, article_paths), "application/xml")
+        elif discovery == "feed":
+            _save(manifest, corpus_dir, urljoin(base, "/feed"),
+                  _rss_feed(base, site_name, article_paths), "application/rss+xml")
+
+    _write_manifest(manifest, corpus_dir)
+    return manifest
+
+# Downloads the real pages, the same ones scraper.py would fetch
+def record(corpus_dir=CORPUS_DIR, websites=WEBSITES, articles=ARTICLES_PER_SITE):
+    import requests
+    from bs4 import BeautifulSoup
+    from scraper import extract_article_links
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    manifest = {}
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+
+    def get(url):
+        response = session.get(url, timeout=15)
+        response.raise_for_status()
+        return response
+
+    # The local server doesn't do TLS, so every https link has to become http
+    def localize(body):
+        return body.replace(b"https://", b"http://")
+
+    for website in websites:
+        print(f"Recording {website}")
+        try:
+            robots = get(urljoin(website, "/robots.txt"))
+            # Sitemap: lines have to point at the local server too
+            _save(manifest, corpus_dir, local_url(website) + "robots.txt", localize(robots.content),
+                  robots.headers.get('Content-Type', 'text/plain'))
+        except requests.RequestException as e:
+            print(f"  No robots.txt: {e}")
+
+        try:
+            homepage = get(website)
+        except requests.RequestException as e:
+            print(f"  Skipping, homepage failed: {e}")
+            continue
+        _save(manifest, corpus_dir, local_url(website), localize(homepage.content),
+              homepage.headers.get('Content-Type', 'text/html'))
+
+        soup = BeautifulSoup(homepage.content, 'html.parser')
+        # extract_article_links checks robots.txt for every link, do that against the live site
+        for article_url in extract_article_links(website, soup, max_articles=articles):
+            try:
+                article = get(article_url)
+            except requests.RequestException as e:
+                print(f"  Skipping {article_url}: {e}")
+                continue
+            local_article = "http://" + article_url.split("://", 1)[1]
+            _save(manifest, corpus_dir, local_article, localize(article.content),
+                  article.headers.get('Content-Type', 'text/html'))
+
+    _write_manifest(manifest, corpus_dir)
+    return manifest
+
+# Loads the corpus, generating it first if there isn't one yet
+def load(corpus_dir=CORPUS_DIR):
+    manifest_path = os.path.join(corpus_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        generate(corpus_dir)
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    pages = {}
+    for url, entry in manifest.items():
+        with open(os.path.join(corpus_dir, entry['file']), "rb") as f:
+            pages[url] = (f.read(), entry['type'])
+    return pages
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the benchmark corpus")
+    parser.add_argument("action", choices=["generate", "record"])
+    parser.add_argument("--dir", default=CORPUS_DIR, help="where to write the corpus")
+    parser.add_argument("--seed", type=int, default=1, help="seed for generate")
+    args = parser.parse_args()
+
+    if args.action == "generate":
+        manifest = generate(args.dir, seed=args.seed)
+    else:
+        manifest = record(args.dir)
+    print(f"{len(manifest)} pages in {args.dir}")
+
+if __name__ == "__main__":
+    main()
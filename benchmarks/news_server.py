@@ -0,0 +1,144 @@
+"""
+Local stand-in for the news sites, serves the corpus from benchmarks/corpus.py
+
+It runs as an HTTP proxy: the benchmark points HTTP_PROXY at it and scrapes
+http://www.npr.org/ etc. as usual, requests send the full url to the proxy and
+it answers from the corpus, so getDomain, the ratings and robots.txt all work
+like they do against the real sites. Anything not in the corpus is a 404.
+
+latency: seconds to wait before every response (time to first byte)
+bandwidth: bytes per second each response is sent at, 0 for no limit
+faults: url -> list of scripted failures, each request for the url uses up the
+        next one until the list is empty and the page is served normally:
+        ("status", code, retry_after): answers with code, Retry-After if not None
+        ("stall", seconds): sends nothing for seconds and drops the connection
+        ("body_stall", seconds): sends the headers and half the body, then waits
+        seconds and drops the connection, so a short wait cuts the body off
+        and a long one runs into the read timeout
+Every request is logged in server.log as (time.monotonic(), url, status or "stall" / "body_stall").
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+CHUNK_SIZE = 16 * 1024
+
+class NewsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out together instead of stalling on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    # Proxied requests have the full url as the path, direct ones only have the Host header
+    def _page_url(self):
+        if self.path.startswith("http://"):
+            parsed = urlparse(self.path)
+            return f"http://{parsed.netloc}{parsed.path or '/'}"
+        return f"http://{self.headers.get('Host', '')}{urlparse(self.path).path or '/'}"
+
+    def do_GET(self):
+        server = self.server
+        url = self._page_url()
+        with server.stats_lock:
+            server.stats['requests'] += 1
+            scripted = server.faults.get(url)
+            fault = scripted.pop(0) if scripted else None
+
+        time.sleep(server.latency)
+        if fault is not None and fault[0] == "stall":
+            server.log.append((time.monotonic(), url, "stall"))
+            time.sleep(fault[1])
+            self.close_connection = True
+            return
+        if fault is not None and fault[0] == "status":
+            _, status, retry_after = fault
+            server.log.append((time.monotonic(), url, status))
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header("Retry-After", str(retry_after))
+            self.send_header("Content-Length", "4")
+            self.end_headers()
+            self.wfile.write(b"busy")
+            return
+
+        page = server.pages.get(url)
+        if page is None:
+            body, content_type, status = b"Not found", "text/plain", 404
+        else:
+            (body, content_type), status = page, 200
+
+        if fault is not None and fault[0] == "body_stall":
+            server.log.append((time.monotonic(), url, "body_stall"))
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            time.sleep(fault[1])
+            self.close_connection = True
+            return
+        server.log.append((time.monotonic(), url, status))
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if server.bandwidth:
+            # Send in chunks and sleep between them to hold the bandwidth
+            for start in range(0, len(body), CHUNK_SIZE):
+                chunk = body[start:start + CHUNK_SIZE]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / server.bandwidth)
+        else:
+            self.wfile.write(body)
+
+        with server.stats_lock:
+            server.stats['bytes_sent'] += len(body)
+
+    # Each new connection is a handshake a real site would have to do
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.stats['connections'] += 1
+
+# Starts the server on a free port in a background thread
+def start_server(pages, latency=0.0, bandwidth=0, faults=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NewsHandler)
+    server.daemon_threads = True
+    server.pages = pages
+    server.latency = latency
+    server.bandwidth = bandwidth
+    server.faults = {url: list(scripted) for url, scripted in (faults or {}).items()}
+    server.log = []
+    server.stats = {'requests': 0, 'connections': 0, 'bytes_sent': 0}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+"""
+Points every request at the server for the duration of the with block
+http_pool sessions read HTTP_PROXY when a request is made, so this also covers
+sessions that already exist
+"""
+@contextmanager
+def proxied(server):
+    proxy = f"http://127.0.0.1:{server.server_address[1]}"
+    saved = {key: os.environ.get(key) for key in ("HTTP_PROXY", "http_proxy", "NO_PROXY", "no_proxy")}
+    os.environ["HTTP_PROXY"] = os.environ["http_proxy"] = proxy
+    os.environ.pop("NO_PROXY", None)
+    os.environ.pop("no_proxy", None)
+    try:
+        yield proxy
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
@@ -159,4 +159,47 @@ MBFC_CREDIBILITY = {
 # Some scraping settings for our program
 MAX_CHARS = 100000
 REQUEST_TIMEOUT = 10
-USER_AGENT = 'PoliScraper/1.0 (+https://github.com/CollinF777/PoliScraper)'
\ No newline at end of file
+MAX_RESPONSE_BYTES = 2 * 1024 * 1024   # Stop reading any one page after this many bytes
+USER_AGENT = 'PoliScraper/1.0 (+https://github.com/CollinF777/PoliScraper)'
+
+# Limits for concurrent scraping (python main.py --concurrent)
+MAX_WORKERS = 16     # Requests in flight across every site
+MAX_PER_HOST = 2     # Requests in flight to any one host
+
+# Politeness and retries (see politeness.py)
+DEFAULT_CRAWL_DELAY = 0   # Seconds between requests to a host whose robots.txt has no Crawl-delay
+MAX_CRAWL_DELAY = 30      # Longer Crawl-delays get capped to this
+MAX_RETRIES = 3           # Retries for timeouts, connection errors, 429s and 5xx responses
+RETRY_BACKOFF = 0.5       # Seconds, the most the first retry waits, doubles every retry
+MAX_RETRY_AFTER = 120     # A Retry-After longer than this gives up on the request instead
+
+# Keep-alive connection pools, one per host (see http_pool.py)
+POOL_CONNECTIONS = 4   # Hosts each session keeps pools for, redirects can add hosts
+POOL_MAXSIZE = 4       # Open connections kept per host, keep this >= MAX_PER_HOST
+
+# Where caches are kept between runs
+CACHE_DIR = '.poliscraper_cache'
+ROBOTS_CACHE_TTL = 24 * 60 * 60   # Seconds before robots.txt is fetched again
+ROBOTS_RETRY_DELAY = 60           # Seconds before a robots.txt that failed (5xx or no response) is tried again,
+ROBOTS_RETRY_MAX = 30 * 60        # doubled after every failure in a row up to this
+STORE_PATH = CACHE_DIR + '/articles.db'  # Per article keyword counts (python main.py --store)
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024   # Size limit for cached articles, oldest get removed first
+HISTORY_PATH = CACHE_DIR + '/history.db'   # Results of every run (python main.py --history)
+RATINGS_INDEX = CACHE_DIR + '/ratings.idx'  # Ratings compiled from exports (python -m ratings build)
+
+# HTML parser used to pull article text out of pages, "lxml" (fast) or "soup" (BeautifulSoup)
+HTML_ENGINE = 'lxml'
+
+# Shared work queue for multi-worker crawls (python main.py --queue crawl.db)
+QUEUE_LEASE_SECONDS = 120   # A job goes back in the queue if its worker doesn't finish in time
+QUEUE_MAX_ATTEMPTS = 3      # Tries before a job is marked failed
+
+# Near duplicate detection (python main.py --dedup)
+DEDUP_SHINGLE_WORDS = 5       # Words per shingle, articles shorter than this aren't checked
+DEDUP_THRESHOLD = 0.8         # Share of shingles two articles need in common to count as the same
+DEDUP_MAX_AGE = 7 * 24 * 60 * 60   # Seconds a saved fingerprint is kept (--dedup-index)
+
+# Confidence intervals for calculated bias (see analyzer.bootstrap_bias_ci)
+BOOTSTRAP_SAMPLES = 2000   # Resamples per site, 0 leaves the intervals out
+BOOTSTRAP_LEVEL = 0.95     # Share of resamples the interval covers
+BOOTSTRAP_SEED = 0         # Fixed so the same counts get the same interval every run
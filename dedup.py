@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import metrics
+from config import DEDUP_SHINGLE_WORDS, DEDUP_THRESHOLD, DEDUP_MAX_AGE
+
+"""
+Duplicate article detection (python main.py --dedup)
+
+Wire stories get republished word for word, or with a new headline and a line
+changed, on a lot of sites, and every copy adds the same keywords again. Every
+article's text gets two fingerprints:
+exact: a hash of the text, same hash means the same text
+minhash: a MinHash signature of the text's word shingles (DEDUP_SHINGLE_WORDS
+         words each). The share of signature values two articles have in common
+         estimates the share of shingles they have in common, DEDUP_THRESHOLD or
+         more makes them near duplicates
+
+The first copy of an article is kept, later copies (on any site) are flagged and
+left out of the analysis. To find near duplicates without comparing against
+every article, signatures are cut into BANDS bands and only articles that match
+one band exactly get compared, articles that share most of their shingles
+almost always match at least one.
+
+The index is kept in memory, with a path (--dedup-index) it's loaded at the
+start and saved at the end so copies of articles from earlier runs are caught too.
+"""
+_enabled = False
+_path = None
+_threshold = DEDUP_THRESHOLD
+_lock = threading.Lock()
+_loaded = False
+_entries = {}   # url -> [site, exact, signature, last_seen, url it's a copy of or None]
+_exact = {}     # exact hash -> url
+_bands = {}     # (band, signature bytes in that band) -> urls
+_stats = {}     # domain -> {'articles', 'exact', 'near'}
+
+# Hash functions in a signature, each value is 4 bytes
+PERMUTATIONS = 64
+BANDS = 16
+_BAND_BYTES = PERMUTATIONS // BANDS * 4
+
+"""
+Multipliers and offsets for the hash functions, made from a fixed seed so
+signatures from different runs (and processes) can be compared. Each one is
+(shingle hash * a + b) mod 2**64, the top 32 bits are the value.
+"""
+def _hash_params():
+    seed = hashlib.sha256(b"poliscraper minhash").digest()
+    stream = b"".join(hashlib.sha256(seed + bytes([i])).digest() for i in range(PERMUTATIONS * 16 // 32))
+    a = [int.from_bytes(stream[i * 16:i * 16 + 8], "little") | 1 for i in range(PERMUTATIONS)]
+    b = [int.from_bytes(stream[i * 16 + 8:i * 16 + 16], "little") for i in range(PERMUTATIONS)]
+    return a, b
+
+_A, _B = _hash_params()
+
+# Turn detection on or off, path is where the index is saved, None keeps it in memory only
+def configure(enabled=None, path=None, threshold=None):
+    global _enabled, _path, _threshold, _loaded
+    with _lock:
+        if enabled is not None:
+            _enabled = enabled
+        if path is not None and path != _path:
+            _path = path
+            _loaded = False
+            _entries.clear()
+            _exact.clear()
+            _bands.clear()
+        if threshold is not None:
+            _threshold = threshold
+
+def is_enabled():
+    return _enabled
+
+"""
+Fingerprints of an article's text, (exact, signature) or None if the text is too
+short to say anything. signature is PERMUTATIONS 4 byte values as bytes, every
+shingle goes through every hash function at once with NumPy.
+"""
+def fingerprint(text):
+    words = text.split()
+    if len(words) < DEDUP_SHINGLE_WORDS:
+        return None
+    # Imported here so runs without --dedup don't load NumPy
+    import numpy as np
+
+    exact = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+    shingles = {" ".join(words[i:i + DEDUP_SHINGLE_WORDS])
+                for i in range(len(words) - DEDUP_SHINGLE_WORDS + 1)}
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+                       for shingle in shingles)
+    hashes = np.frombuffer(digests, dtype="<u8")
+    # uint64 math wraps around, that's the mod 2**64
+    values = (hashes[:, None] * np.array(_A, dtype=np.uint64) + np.array(_B, dtype=np.uint64)) >> np.uint64(32)
+    signature = values.min(axis=0).astype("<u4").tobytes()
+    return exact, signature
+
+# (band, bytes) keys of a signature
+def _band_keys(signature):
+    return [(band, signature[band * _BAND_BYTES:(band + 1) * _BAND_BYTES]) for band in range(BANDS)]
+
+# Estimated share of shingles two articles have in common
+def similarity(a, b):
+    same = sum(a[i:i + 4] == b[i:i + 4] for i in range(0, len(a), 4))
+    return same / PERMUTATIONS
+
+"""
+Adds an article to the index, replacing what was there for the url, must hold _lock
+Copies are kept too so their fingerprints are there for fingerprint_for, but
+only originals go in the lookup tables, otherwise an original could turn out
+to be a copy of its own copy on the next run.
+"""
+def _add(url, site, exact, signature, last_seen, duplicate_of=None):
+    if url in _entries:
+        _remove(url)
+    _entries[url] = [site, exact, signature, last_seen, duplicate_of]
+    if duplicate_of is not None:
+        return
+    _exact.setdefault(exact, url)
+    for key in _band_keys(signature):
+        _bands.setdefault(key, set()).add(url)
+
+# Must hold _lock
+def _remove(url):
+    _, exact, signature, _, duplicate_of = _entries.pop(url)
+    if duplicate_of is not None:
+        return
+    if _exact.get(exact) == url:
+        del _exact[exact]
+    for key in _band_keys(signature):
+        urls = _bands.get(key)
+        if urls is not None:
+            urls.discard(url)
+            if not urls:
+                del _bands[key]
+
+# Reads the saved index the first time it's needed, old fingerprints are dropped, must hold _lock
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if _path is None:
+        return
+    try:
+        with open(_path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        # No index yet or it's unreadable, either way start empty
+        return
+    cutoff = time.time() - DEDUP_MAX_AGE
+    for url, (site, exact, signature, last_seen, duplicate_of) in saved.items():
+        if last_seen >= cutoff:
+            _add(url, site, exact, bytes.fromhex(signature), last_seen, duplicate_of)
+
+# Earlier article that this one is a copy of, (kind, url) or None, must hold _lock
+def _find(url, exact, signature):
+    original = _exact.get(exact)
+    if original is not None and original != url:
+        return "exact", original
+
+    candidates = set()
+    for key in _band_keys(signature):
+        candidates.update(_bands.get(key, ()))
+    candidates.discard(url)
+
+    best = None
+    for candidate in candidates:
+        score = similarity(signature, _entries[candidate][2])
+        if score >= _threshold and (best is None or score > best[0]):
+            best = (score, candidate)
+    if best is not None:
+        return "near", best[1]
+    return None
+
+"""
+Checks an article against every article seen so far and adds it to the index
+fingerprint is what fingerprint() returned for its text, site is the site it was found on.
+Returns None for a new article, or {'kind': 'exact' or 'near', 'duplicate_of': url}.
+The same url coming back (a re-run, or two sites linking one article) isn't a duplicate.
+"""
+def check(url, site, fingerprint):
+    if not _enabled or fingerprint is None:
+        return None
+    exact, signature = fingerprint
+    domain = urlparse(site).netloc.replace("www.", "")
+
+    with _lock:
+        _load()
+        stats = _stats.setdefault(domain, {'articles': 0, 'exact': 0, 'near': 0})
+        stats['articles'] += 1
+        match = _find(url, exact, signature)
+        if match is None:
+            _add(url, site, exact, signature, time.time())
+            return None
+        kind, original = match
+        stats[kind] += 1
+        _add(url, site, exact, signature, time.time(), original)
+        # Bump the original so it doesn't age out while copies keep showing up
+        _entries[original][3] = time.time()
+
+    metrics.inc("duplicates_total", domain=domain, kind=kind)
+    return {'kind': kind, 'duplicate_of': original}
+
+# Fingerprint saved for a url, for articles whose text we don't have (article store hits)
+def fingerprint_for(url):
+    with _lock:
+        _load()
+        entry = _entries.get(url)
+    if entry is None:
+        return None
+    return entry[1], entry[2]
+
+# Writes the index to its path, nothing happens when it's only kept in memory
+def save():
+    with _lock:
+        if _path is None or not _loaded:
+            return
+        saved = {url: [site, exact, signature.hex(), last_seen, duplicate_of]
+                 for url, (site, exact, signature, last_seen, duplicate_of) in _entries.items()}
+        os.makedirs(os.path.dirname(_path) or ".", exist_ok=True)
+        # Write to a temp file first so a crash can't leave half an index behind
+        tmp_path = _path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, _path)
+
+# Articles checked and duplicates found per domain since the program started
+def duplicate_stats():
+    with _lock:
+        return {domain: dict(stats) for domain, stats in _stats.items()}
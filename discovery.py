@@ -0,0 +1,199 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin, urlparse
+
+from lxml import etree
+
+import robots_cache
+import warc
+from config import MAX_RESPONSE_BYTES
+
+"""
+Article discovery from RSS/Atom feeds and sitemaps
+
+Feeds and news sitemaps list a site's articles with their dates, so reading one
+is a lot less data than downloading the whole homepage and they only point at
+articles (the homepage also links to every section page). Sources are tried in
+this order until one gives us articles:
+1. Sitemap: lines in robots.txt, which is cached anyway so this costs no request
+2. FEED_PATHS, the usual places sites put their feed or sitemap
+The scraper falls back to the homepage when none of them work.
+
+Files are parsed with lxml's pull parser while they download, entries are cleared
+as soon as they're read so a big sitemap doesn't sit in memory. Links come back
+newest first, entries without a date go after the dated ones.
+"""
+_enabled = True
+
+# Tried in order when robots.txt doesn't list a sitemap
+FEED_PATHS = ("/feed", "/rss", "/news-sitemap.xml", "/sitemap.xml")
+# A sitemap index can point at hundreds of sitemaps, only the newest few are read
+MAX_CHILD_SITEMAPS = 3
+
+# Turn discovery on or off, off means the homepage is always used
+def configure(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+def _local_name(element):
+    return etree.QName(element).localname
+
+# Feed and sitemap dates as a unix timestamp, None if missing or unreadable
+def _parse_date(text):
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        # RSS uses RFC 822 dates, Atom and sitemaps use ISO 8601
+        date = parsedate_to_datetime(text) if text[:1].isalpha() else datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+# Text of the first child with one of the given local names
+def _child_text(element, names):
+    for child in element.iter():
+        if child is not element and _local_name(child) in names and child.text:
+            return child.text.strip()
+    return None
+
+"""
+Reads one entry (an RSS item, Atom entry, sitemap url or sitemap index entry)
+Returns (kind, link, timestamp), kind is 'sitemap' for sitemap index entries
+"""
+def _read_entry(element, base_url):
+    name = _local_name(element)
+    if name == "entry":
+        link = None
+        for child in element:
+            if _local_name(child) == "link" and child.get("rel", "alternate") == "alternate":
+                link = child.get("href")
+                break
+        date = _child_text(element, ("published", "updated"))
+    elif name == "item":
+        link = _child_text(element, ("link",))
+        date = _child_text(element, ("pubDate", "date"))
+    else:
+        link = _child_text(element, ("loc",))
+        date = _child_text(element, ("publication_date", "lastmod"))
+
+    kind = "sitemap" if name == "sitemap" else "article"
+    return kind, urljoin(base_url, link) if link else None, _parse_date(date)
+
+"""
+Downloads and parses a feed or sitemap, returns (entries, bytes downloaded)
+entries is a list of (kind, link, timestamp), empty if the file isn't there or
+isn't a feed/sitemap
+"""
+def _read_source(source_url, fetch):
+    try:
+        return fetch(source_url, read=lambda response: _read_entries(response, source_url))
+    except Exception as e:
+        print(f"Could not fetch {source_url}: {e}")
+        return [], 0
+
+# read= for fetch, parses the feed or sitemap as it downloads
+def _read_entries(response, source_url):
+    if response.status_code != 200:
+        # Error pages are small, reading them lets the connection go back to the pool
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size >= MAX_RESPONSE_BYTES:
+                break
+        response.close()
+        return [], size
+
+    parser = etree.XMLPullParser(events=("end",), recover=True, resolve_entities=False, no_network=True)
+    entries = []
+    size = 0
+    # Only kept when the response goes in a WARC archive
+    chunks = [] if warc.is_recording() else None
+    try:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                if _local_name(element) not in ("item", "entry", "url", "sitemap"):
+                    continue
+                entry = _read_entry(element, source_url)
+                if entry[1]:
+                    entries.append(entry)
+                # Drop what we've read so memory doesn't grow with the file
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+            if size >= MAX_RESPONSE_BYTES:
+                break
+    except etree.LxmlError:
+        # An HTML error page or broken XML, whatever was read before still counts
+        pass
+    finally:
+        response.close()
+    if chunks is not None:
+        warc.record_response(response, b"".join(chunks), truncated=size >= MAX_RESPONSE_BYTES)
+
+    tell = getattr(response.raw, "tell", None)
+    return entries, tell() if tell else size
+
+# Articles have a path like /politics/2024/05/some-title, not /politics or /
+def _looks_like_article(link):
+    segments = [segment for segment in urlparse(link).path.split("/") if segment]
+    return len(segments) >= 2 or (segments and segments[-1].count("-") >= 3)
+
+# Same site, so a feed full of links to other sites doesn't send us there
+def _same_site(link, domain):
+    host = urlparse(link).netloc.replace("www.", "")
+    return host == domain or host.endswith("." + domain)
+
+"""
+Finds up to max_articles article links for a site from its feeds or sitemaps
+fetch is the scraper's fetch(url, read=...) and allowed(url) its robots.txt
+check, both passed in so requests go through the scraper's limits.
+Returns (links, bytes downloaded), links is empty when nothing was found.
+"""
+def discover_article_links(url, max_articles, fetch, allowed):
+    domain = urlparse(url).netloc.replace("www.", "")
+    sources = robots_cache.sitemaps(url, fetch) or [urljoin(url, path) for path in FEED_PATHS]
+    downloaded = 0
+
+    for source_url in sources:
+        if not allowed(source_url):
+            continue
+        entries, size = _read_source(source_url, fetch)
+        downloaded += size
+
+        # A sitemap index, read its newest sitemaps that are on this site and robots.txt allows
+        children = [entry for entry in entries if entry[0] == "sitemap"
+                    and _same_site(entry[1], domain) and allowed(entry[1])]
+        if children:
+            children.sort(key=lambda entry: (entry[2] is None, -(entry[2] or 0)))
+            for _, child_url, _ in children[:MAX_CHILD_SITEMAPS]:
+                child_entries, size = _read_source(child_url, fetch)
+                downloaded += size
+                entries += [entry for entry in child_entries if entry[0] == "article"]
+
+        entries = [entry for entry in entries if entry[0] != "sitemap"]
+        # Newest first, sort is stable so undated entries keep the order the file had
+        entries.sort(key=lambda entry: (entry[2] is None, -(entry[2] or 0)))
+        links = []
+        seen = set()
+        for _, link, _ in entries:
+            if link in seen or "#" in link:
+                continue
+            seen.add(link)
+            if _same_site(link, domain) and _looks_like_article(link) and allowed(link):
+                links.append(link)
+                if len(links) >= max_articles:
+                    break
+        if links:
+            return links, downloaded
+
+    return [], downloaded
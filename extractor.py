@@ -0,0 +1,127 @@
+import re
+from lxml import etree
+from lxml import html as lxml_html
+from config import HTML_ENGINE
+
+"""
+Article text extraction
+
+Two engines that find the same text:
+lxml: parses the raw bytes with libxml2, this is the fast one and the default
+soup: the original BeautifulSoup + html.parser code
+
+Both remove the same elements and use the same fallbacks to find the main
+content, see benchmarks/bench_extract.py for a parity check on saved pages.
+bs4 is only imported once the soup engine is used, so lxml runs (and every
+parse worker process) don't pay for loading it.
+"""
+_engine = HTML_ENGINE
+
+# Elements that never hold article text, see _extract_soup for why each one is here
+REMOVED_TAGS = ("script", "style", "header", "footer", "nav", "aside")
+CONTENT_PATTERN = re.compile(r"article|story|content", re.I)
+
+# Pick the engine used when extract_article_text isn't told which one to use
+def configure(engine):
+    global _engine
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown HTML engine {engine}, use one of {', '.join(ENGINES)}")
+    _engine = engine
+
+# Replace whitespace with single spaces and remove leading/trailing whitespace
+def _clean_text(text):
+    # str.split() splits on the same whitespace as \s+ and is a lot faster than re.sub
+    return " ".join(text.split()).lower()
+
+# Original BeautifulSoup extractor, slower but kept around to compare against
+def _extract_soup(content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+
+    """
+    This removes specfic elements that we dont need to search
+    script: No need to search any javascript elements as that just adds 
+            website interaction
+    style: How the website is stylized typically has little to do
+           with a websites politics
+    header/footer: Typically websites aren't using the header and footer
+                   for meaningful content
+    nav: The nav bar is typically just meant for user navigation, no need
+         to look there
+    aside: Used for content not related to article so no need for it
+    """
+    for element in soup(list(REMOVED_TAGS)):
+        element.decompose()
+
+    article_content = None
+
+    # Try multiple common HTML patterns in order to locate main content
+    article_selectors = [
+        soup.find("article"), # Article tag, used by most modern sites
+        soup.find("div", class_=CONTENT_PATTERN), # Div elements with article, story, or content class names
+        soup.find("div", id=CONTENT_PATTERN), # Div elements with IDs article, story, content
+    ]
+
+    for selector in article_selectors:
+        if selector:
+            article_content = selector
+            break
+    if article_content:
+        text = article_content.get_text()
+    # Fallback to all paragraphs
+    else:
+        paragraphs = soup.find_all("p")
+        text = " ".join([p.get_text() for p in paragraphs])
+
+    return _clean_text(text)
+
+# Parses the page with lxml, bytes are tried as UTF-8 first since most sites use it
+def _parse_lxml(content):
+    if isinstance(content, bytes):
+        try:
+            content = content.decode("utf-8")
+        except UnicodeDecodeError:
+            # Let libxml2 use the pages <meta charset> instead
+            return lxml_html.document_fromstring(content)
+    try:
+        return lxml_html.document_fromstring(content)
+    except ValueError:
+        # Strings can't have an <?xml encoding?> declaration, hand it the bytes instead
+        return lxml_html.document_fromstring(content.encode("utf-8"))
+
+# Same steps as _extract_soup but on an lxml tree
+def _extract_lxml(content):
+    try:
+        root = _parse_lxml(content)
+    except etree.ParserError:
+        # Empty page
+        return ""
+
+    # with_tail=False keeps the text that comes right after a removed element, like decompose() does
+    etree.strip_elements(root, *REMOVED_TAGS, with_tail=False)
+
+    # Try multiple common HTML patterns in order to locate main content
+    article_content = next(root.iter("article"), None)
+    if article_content is None:
+        article_content = next((div for div in root.iter("div")
+                                if CONTENT_PATTERN.search(div.get("class", ""))), None)
+    if article_content is None:
+        article_content = next((div for div in root.iter("div")
+                                if CONTENT_PATTERN.search(div.get("id", ""))), None)
+
+    if article_content is not None:
+        text = article_content.text_content()
+    # Fallback to all paragraphs
+    else:
+        text = " ".join([p.text_content() for p in root.iter("p")])
+
+    return _clean_text(text)
+
+ENGINES = {
+    "lxml": _extract_lxml,
+    "soup": _extract_soup,
+}
+
+# Pull the article text out of a pages HTML (bytes or str), lowercased with whitespace collapsed
+def extract_article_text(content, engine=None):
+    return ENGINES[engine or _engine](content)
@@ -0,0 +1,276 @@
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from config import HISTORY_PATH
+
+"""
+Result history (python main.py --history) and bias trends (python -m history trend)
+
+Every run's results go in SQLite next to the caches: one row per site per run
+with its calculated and known bias and keyword counts. Rows are only ever
+added, never changed.
+
+Trends are read from rollups instead of the raw rows. Every result added also
+adds itself to the hour, day and week it falls in (UTC, weeks start on Monday),
+so a bucket holds how many runs it has and sums of their bias, bias squared
+and keyword counts, plus the lowest and highest bias. A trend query reads one
+row per bucket straight off the rollups primary key, a year of hourly runs is
+365 rows for a daily trend whatever the number of raw results.
+"""
+_path = HISTORY_PATH
+_enabled = False
+_conn = None
+_lock = threading.Lock()
+
+# Bucket sizes in seconds
+PERIODS = {'hour': 60 * 60, 'day': 24 * 60 * 60, 'week': 7 * 24 * 60 * 60}
+# The unix epoch was a Thursday, weeks are moved 4 days so they start on Monday
+_WEEK_OFFSET = 4 * 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL,
+    at REAL NOT NULL,
+    domain TEXT NOT NULL,
+    calculated_bias REAL NOT NULL,
+    known_bias REAL NOT NULL,
+    left_count INTEGER NOT NULL,
+    center_count INTEGER NOT NULL,
+    right_count INTEGER NOT NULL,
+    total_keywords INTEGER NOT NULL,
+    PRIMARY KEY (run_id, domain)
+);
+CREATE INDEX IF NOT EXISTS results_by_domain ON results (domain, at);
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+    bias_sum REAL NOT NULL,
+    bias_squares REAL NOT NULL,
+    bias_min REAL NOT NULL,
+    bias_max REAL NOT NULL,
+    known_sum REAL NOT NULL,
+    left_sum INTEGER NOT NULL,
+    center_sum INTEGER NOT NULL,
+    right_sum INTEGER NOT NULL,
+    keywords_sum INTEGER NOT NULL,
+    PRIMARY KEY (period, domain, bucket)
+) WITHOUT ROWID;
+"""
+
+ROLLUP_SQL = """
+INSERT INTO rollups (period, domain, bucket, runs, bias_sum, bias_squares, bias_min, bias_max,
+                     known_sum, left_sum, center_sum, right_sum, keywords_sum)
+VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (period, domain, bucket) DO UPDATE SET
+    runs = runs + 1,
+    bias_sum = bias_sum + excluded.bias_sum,
+    bias_squares = bias_squares + excluded.bias_squares,
+    bias_min = MIN(bias_min, excluded.bias_min),
+    bias_max = MAX(bias_max, excluded.bias_max),
+    known_sum = known_sum + excluded.known_sum,
+    left_sum = left_sum + excluded.left_sum,
+    center_sum = center_sum + excluded.center_sum,
+    right_sum = right_sum + excluded.right_sum,
+    keywords_sum = keywords_sum + excluded.keywords_sum
+"""
+
+# Turn recording on or off, or move the database somewhere else
+def configure(enabled=None, path=None):
+    global _enabled, _path, _conn
+    with _lock:
+        if path is not None and path != _path:
+            _path = path
+            if _conn is not None:
+                _conn.close()
+                _conn = None
+        if enabled is not None:
+            _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+def path():
+    return _path
+
+# Opens the database the first time it's needed, must hold _lock
+def _connect():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(_path) or ".", exist_ok=True)
+        _conn = sqlite3.connect(_path, check_same_thread=False)
+        _conn.executescript(SCHEMA)
+    return _conn
+
+# Start of the period's bucket that a unix time falls in
+def bucket_start(at, period):
+    size = PERIODS[period]
+    offset = _WEEK_OFFSET if period == "week" else 0
+    return int((at - offset) // size * size + offset)
+
+# Starts a run, results added with its id are recorded at its start time
+def start_run(at=None):
+    at = time.time() if at is None else at
+    with _lock:
+        conn = _connect()
+        with conn:
+            run_id = conn.execute("INSERT INTO runs (started) VALUES (?)", (at,)).lastrowid
+    return run_id
+
+"""
+Appends results (from analyze_site / analyze_all_sites) to a run and adds them
+to the rollups, all in one transaction so the rollups always match the rows
+Sites that end up with the same domain in one run (www.x.com and x.com, or the
+http and https versions) are merged into one row, their keyword counts added
+up and the bias worked out again from them.
+"""
+def add_results(run_id, results):
+    with _lock:
+        conn = _connect()
+        at = conn.execute("SELECT started FROM runs WHERE id = ?", (run_id,)).fetchone()[0]
+        with conn:
+            for result in results:
+                scores = result["scores"]
+                row = [result["name"], result["calculated_bias"], result["known_bias"], scores["left"],
+                       scores["center"], scores["right"], result["total_keywords"]]
+                saved = conn.execute("SELECT left_count, center_count, right_count, total_keywords FROM results "
+                                     "WHERE run_id = ? AND domain = ?", (run_id, result["name"])).fetchone()
+                if saved is not None:
+                    _merge_result(conn, run_id, at, row, saved)
+                    continue
+                conn.execute("INSERT INTO results (run_id, at, domain, calculated_bias, known_bias, left_count, "
+                             "center_count, right_count, total_keywords) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (run_id, at) + tuple(row))
+                bias = row[1]
+                conn.executemany(ROLLUP_SQL, [
+                    (period, row[0], bucket_start(at, period), bias, bias * bias, bias, bias) + tuple(row[2:])
+                    for period in PERIODS
+                ])
+
+"""
+Adds a result to the row its domain already has in the run, must be inside
+add_results' transaction. A bucket's min and max can't be taken back, so the
+domain's rollups for the run's buckets are worked out again from its rows.
+"""
+def _merge_result(conn, run_id, at, row, saved):
+    domain = row[0]
+    left, center, right = row[3] + saved[0], row[4] + saved[1], row[5] + saved[2]
+    total = left + center + right
+    # Same formula as analyzer.bias_score_calc
+    bias = (right - left) / total * 5 if total else 0
+    conn.execute("UPDATE results SET calculated_bias = ?, left_count = ?, center_count = ?, right_count = ?, "
+                 "total_keywords = ? WHERE run_id = ? AND domain = ?",
+                 (bias, left, center, right, row[6] + saved[3], run_id, domain))
+    for period in PERIODS:
+        bucket = bucket_start(at, period)
+        conn.execute(
+            "INSERT OR REPLACE INTO rollups (period, domain, bucket, runs, bias_sum, bias_squares, bias_min, "
+            "bias_max, known_sum, left_sum, center_sum, right_sum, keywords_sum) "
+            "SELECT ?, domain, ?, COUNT(*), SUM(calculated_bias), SUM(calculated_bias * calculated_bias), "
+            "MIN(calculated_bias), MAX(calculated_bias), SUM(known_bias), SUM(left_count), SUM(center_count), "
+            "SUM(right_count), SUM(total_keywords) FROM results WHERE domain = ? AND at >= ? AND at < ? "
+            "GROUP BY domain",
+            (period, bucket, domain, bucket, bucket + PERIODS[period]))
+
+# Bucket size that keeps a trend from since to until at a readable number of points
+def pick_period(since, until):
+    days = (until - since) / PERIODS['day']
+    if days <= 7:
+        return "hour"
+    if days <= 180:
+        return "day"
+    return "week"
+
+def _point(row):
+    bucket, runs, bias_sum, bias_squares, bias_min, bias_max, known_sum, left, center, right, keywords = row
+    mean = bias_sum / runs
+    return {
+        'start': bucket,
+        'runs': runs,
+        'calculated_bias': mean,
+        'min_bias': bias_min,
+        'max_bias': bias_max,
+        'stddev': math.sqrt(max(bias_squares / runs - mean * mean, 0.0)),
+        'known_bias': known_sum / runs,
+        'scores': {'left': left / runs, 'center': center / runs, 'right': right / runs},
+        'total_keywords': keywords / runs,
+    }
+
+"""
+Trend of one domain, a list of points oldest first, one per bucket with runs in it
+since and until are unix times (default: the last 90 days), period is
+'hour', 'day' or 'week' or None to pick one for the range. Every value in a
+point is the mean over the bucket's runs, plus its min_bias, max_bias and stddev.
+"""
+def trend(domain, period=None, since=None, until=None):
+    until = time.time() if until is None else until
+    since = until - 90 * PERIODS['day'] if since is None else since
+    period = period or pick_period(since, until)
+    with _lock:
+        rows = _connect().execute(
+            "SELECT bucket, runs, bias_sum, bias_squares, bias_min, bias_max, known_sum, left_sum, center_sum, "
+            "right_sum, keywords_sum FROM rollups WHERE period = ? AND domain = ? AND bucket BETWEEN ? AND ? "
+            "ORDER BY bucket", (period, domain, bucket_start(since, period), until)).fetchall()
+    return [_point(row) for row in rows]
+
+# Trends of several domains (default: every domain with history), {domain: points}
+def trends(domains=None, period=None, since=None, until=None):
+    if domains is None:
+        domains = known_domains()
+    return {domain: trend(domain, period, since, until) for domain in domains}
+
+# Every domain with results, from the weekly rollups since those are the fewest rows
+def known_domains():
+    with _lock:
+        rows = _connect().execute("SELECT DISTINCT domain FROM rollups WHERE period = 'week' ORDER BY domain")
+        return [row[0] for row in rows]
+
+# One line per domain, how far its calculated bias moved over the trend
+def print_trend_summary(series):
+    for domain, points in series.items():
+        if not points:
+            print(f"{domain}: no history in this range")
+            continue
+        first, last = points[0]['calculated_bias'], points[-1]['calculated_bias']
+        low = min(point['min_bias'] for point in points)
+        high = max(point['max_bias'] for point in points)
+        runs = sum(point['runs'] for point in points)
+        print(f"{domain}: {first:.2f} -> {last:.2f} ({last - first:+.2f}) over {runs} runs, "
+              f"range {low:.2f} to {high:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bias trends from the result history")
+    parser.add_argument("--db", default=HISTORY_PATH, help=f"history database (default {HISTORY_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    trend_parser = commands.add_parser("trend", help="how calculated bias moved over time")
+    trend_parser.add_argument("domains", nargs="*", help="domains like foxnews.com (default: all of them)")
+    trend_parser.add_argument("--days", type=float, default=90, help="how far back to go (default 90)")
+    trend_parser.add_argument("--period", choices=sorted(PERIODS), help="bucket size (default: picked from --days)")
+    trend_parser.add_argument("--chart", metavar="FILE", help="save a trend chart to FILE")
+    trend_parser.add_argument("--chart-mode", choices=["full", "shared", "cdn", "json"], default="full",
+                              help="how the chart is saved, same as main.py --chart-mode")
+    args = parser.parse_args()
+
+    configure(path=args.db)
+    until = time.time()
+    since = until - args.days * PERIODS['day']
+    period = args.period or pick_period(since, until)
+    series = trends(args.domains or None, period, since, until)
+    print(f"Calculated bias by {period}, last {args.days:g} days")
+    print_trend_summary(series)
+    if args.chart:
+        # Imported here so printing a summary doesn't load plotly
+        from visualizer import create_trend_chart, save_chart
+        save_chart(create_trend_chart(series, period), args.chart, mode=args.chart_mode)
+
+if __name__ == "__main__":
+    main()
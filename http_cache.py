@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import metrics
+from config import CACHE_DIR, HTTP_CACHE_MAX_BYTES
+
+"""
+On-disk cache for article pages
+
+For every article we keep the ETag / Last-Modified the server sent and the
+text we extracted from it, one JSON file per url. On the next run the request
+is sent with If-None-Match / If-Modified-Since and if the server answers
+304 Not Modified we use the saved text, so the page isn't downloaded or parsed again.
+
+The cache is kept under HTTP_CACHE_MAX_BYTES by deleting the least recently
+used files, a files mtime is bumped every time it's used so mtime is the LRU order.
+"""
+_dir = os.path.join(CACHE_DIR, "articles")
+_max_bytes = HTTP_CACHE_MAX_BYTES
+_enabled = True
+_lock = threading.Lock()
+_index = None   # path -> (size, last_used), built from the directory the first time it's needed
+_total_bytes = 0
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+# Turn the cache on/off (--no-cache) or change where it lives and how big it can get
+def configure(enabled=None, path=None, max_bytes=None):
+    global _enabled, _dir, _max_bytes, _index
+    with _lock:
+        if enabled is not None:
+            _enabled = enabled
+        if path is not None:
+            _dir = path
+            _index = None
+        if max_bytes is not None:
+            _max_bytes = max_bytes
+            _load_index()
+            _evict()
+
+def _entry_path(url):
+    return os.path.join(_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+# Scans the cache directory once so we know the size and age of every file, must hold _lock
+def _load_index():
+    global _index, _total_bytes
+    if _index is not None:
+        return
+    _index = {}
+    _total_bytes = 0
+    try:
+        with os.scandir(_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    _index[entry.path] = (stat.st_size, stat.st_mtime)
+                    _total_bytes += stat.st_size
+    except FileNotFoundError:
+        pass
+
+# Deletes the least recently used files until we're under the size limit, must hold _lock
+def _evict():
+    global _total_bytes
+    if _total_bytes <= _max_bytes:
+        return
+    for path, (size, _) in sorted(_index.items(), key=lambda item: item[1][1]):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        del _index[path]
+        _total_bytes -= size
+        _stats['evictions'] += 1
+        if _total_bytes <= _max_bytes:
+            break
+
+# Gets the saved entry for a url, None if there isn't one or the cache is off
+def lookup(url):
+    if not _enabled:
+        return None
+    path = _entry_path(url)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Two urls with the same hash would be very unlucky but check anyway
+    if entry.get('url') != url:
+        return None
+    return entry
+
+# Headers that make the request conditional on the saved entry
+def conditional_headers(entry):
+    headers = {}
+    if entry is None:
+        return headers
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+# Marks an entry as just used after a 304 so it's the last to be evicted
+def mark_hit(url):
+    global _total_bytes
+    metrics.inc("article_cache_hits_total", domain=urlparse(url).netloc.replace("www.", ""))
+    with _lock:
+        _stats['hits'] += 1
+        if not _enabled:
+            return
+        _load_index()
+        path = _entry_path(url)
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+            # Only entries the index doesn't have yet need a stat, the file can go away in between
+            size = _index[path][0] if path in _index else os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if path not in _index:
+            _total_bytes += size
+        _index[path] = (size, now)
+
+"""
+Writes the entry file for a url, this only touches the file so worker processes
+can call it too, the main process then has to call note_store so the size
+limit is kept. Responses without an ETag or Last-Modified can't be revalidated
+so they aren't saved, returns whether the entry was written.
+"""
+def write_entry(url, etag, last_modified, text):
+    if not _enabled or (not etag and not last_modified):
+        return False
+
+    data = json.dumps({
+        'url': url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'text': text,
+    })
+    path = _entry_path(url)
+    os.makedirs(_dir, exist_ok=True)
+    # Write to a temp file first so a crash can't leave half an entry behind
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+# Counts a full download and, if an entry was written for it, adds it to the size index
+def note_store(url, written):
+    global _total_bytes
+    metrics.inc("article_cache_misses_total", domain=urlparse(url).netloc.replace("www.", ""))
+    with _lock:
+        _stats['misses'] += 1
+        if not written:
+            return
+        _load_index()
+        path = _entry_path(url)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        old_size = _index.get(path, (0, 0))[0]
+        _index[path] = (size, time.time())
+        _total_bytes += size - old_size
+        _stats['stores'] += 1
+        _evict()
+
+# Hits (304s), misses (full downloads), stores and evictions since the program started
+def cache_stats():
+    with _lock:
+        return dict(_stats, enabled=_enabled)
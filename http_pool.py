@@ -0,0 +1,117 @@
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import USER_AGENT, REQUEST_TIMEOUT, POOL_CONNECTIONS, POOL_MAXSIZE
+
+"""
+Pooled keep-alive HTTP sessions
+
+Every host gets its own requests.Session, so the homepage, the articles and
+the robots.txt for a site all reuse the same open connections instead of
+doing a new TCP and TLS handshake for every request.
+pool_connections: how many hosts one session keeps pools for (redirects can add a host)
+pool_maxsize: how many open connections are kept per host, this should be at
+              least MAX_PER_HOST or concurrent requests will open throwaway connections
+"""
+_sessions = {}
+_lock = threading.Lock()
+_pool_connections = POOL_CONNECTIONS
+_pool_maxsize = POOL_MAXSIZE
+_timeout = REQUEST_TIMEOUT
+_request_count = 0
+_closed = {'hosts': 0, 'connections': 0}   # Sessions close_host closed, for pool_stats
+
+# Change the pool sizes (only affects sessions made after this is called) or the request timeout
+def configure(pool_connections=None, pool_maxsize=None, timeout=None):
+    global _pool_connections, _pool_maxsize, _timeout
+    if timeout is not None:
+        _timeout = timeout
+    if pool_connections is not None:
+        _pool_connections = pool_connections
+    if pool_maxsize is not None:
+        _pool_maxsize = pool_maxsize
+
+# Gets the session for a urls host, making one the first time we see that host
+def get_session(url):
+    parsed_url = urlparse(url)
+    key = parsed_url.scheme + "://" + parsed_url.netloc
+
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            # User-Agent is set once here so every request sends the same one
+            session.headers['User-Agent'] = USER_AGENT
+            adapter = HTTPAdapter(pool_connections=_pool_connections, pool_maxsize=_pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+    return session
+
+# Makes a GET request through the pooled session for the urls host
+def get(url, **kwargs):
+    global _request_count
+    kwargs.setdefault('timeout', _timeout)
+    with _lock:
+        _request_count += 1
+    return get_session(url).get(url, **kwargs)
+
+"""
+Reuse statistics for every session so far
+connections is the number of connections urllib3 opened, each one is a handshake,
+every other request went over a connection that was already open
+"""
+def pool_stats():
+    with _lock:
+        sessions = list(_sessions.values())
+        requests_made = _request_count
+        closed = dict(_closed)
+
+    connections = closed['connections'] + sum(_session_connections(session) for session in sessions)
+    return {
+        'hosts': len(sessions) + closed['hosts'],
+        'requests': requests_made,
+        'connections': connections,
+        'reused': max(requests_made - connections, 0),
+    }
+
+# Connections a session's pools have opened so far
+def _session_connections(session):
+    connections = 0
+    for adapter in set(session.adapters.values()):
+        # Requests through HTTP(S)_PROXY go over the proxy managers' pools instead
+        for manager in [adapter.poolmanager] + list(adapter.proxy_manager.values()):
+            pools = manager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+    return connections
+
+"""
+Closes the session for a urls host once we're done with the host, so a crawl
+of thousands of sites doesn't keep a session and its pools for every one of them.
+Its connections still count in pool_stats, a later request just opens a new session.
+"""
+def close_host(url):
+    parsed_url = urlparse(url)
+    with _lock:
+        session = _sessions.pop(parsed_url.scheme + "://" + parsed_url.netloc, None)
+        if session is None:
+            return
+        _closed['hosts'] += 1
+        _closed['connections'] += _session_connections(session)
+    session.close()
+
+# Closes every session and resets the statistics
+def close_all():
+    global _request_count
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _request_count = 0
+        _closed.update(hosts=0, connections=0)
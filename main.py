@@ -1,29 +1,384 @@
-from config import WEBSITES
-from scraper import scrape_mutiple
-from analyzer import analyze_all_sites, print_results
-from visualizer import create_bias_chart, display_chart, save_chart
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import analyzer
+import dedup
+import discovery
+import extractor
+import http_cache
+import history
+import http_pool
+import metrics
+import pipeline
+import politeness
+import ratings
+import result_store
+import robots_cache
+import warc
+import work_queue
+from config import (WEBSITES, MAX_WORKERS, MAX_PER_HOST, POOL_MAXSIZE, HTML_ENGINE, DEFAULT_CRAWL_DELAY,
+                    MAX_RETRIES, BOOTSTRAP_SAMPLES)
+from scraper import iter_scrape_sites, scrape_mutiple
+from analyzer import (analyze_all_sites, analyze_site, print_result, print_results,
+                      print_results_header, save_results)
+from results_sink import ResultsSink
 
-def main():
+# Command line options, running with no options works the same as before
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze political bias in news media")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="scrape sites and articles at the same time instead of one by one")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"max requests in flight with --concurrent (default {MAX_WORKERS})")
+    parser.add_argument("--per-host", type=int, default=MAX_PER_HOST,
+                        help=f"max requests in flight to one host with --concurrent (default {MAX_PER_HOST})")
+    parser.add_argument("--pool-size", type=int, default=POOL_MAXSIZE,
+                        help=f"keep-alive connections kept open per host (default {POOL_MAXSIZE})")
+    parser.add_argument("--crawl-delay", type=float, default=DEFAULT_CRAWL_DELAY,
+                        help="seconds between requests to a site whose robots.txt has no Crawl-delay "
+                             f"(default {DEFAULT_CRAWL_DELAY})")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES,
+                        help=f"times a timed out, 429 or 5xx request is retried (default {MAX_RETRIES})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="download every article again instead of using the article cache")
+    parser.add_argument("--html-engine", choices=sorted(extractor.ENGINES), default=HTML_ENGINE,
+                        help=f"parser used to pull article text out of pages (default {HTML_ENGINE})")
+    parser.add_argument("--no-feeds", action="store_true",
+                        help="find articles on the homepage only, without trying feeds and sitemaps first")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="parse and analyze articles in this many worker processes (default 0, off)")
+    parser.add_argument("--fold", action="store_true",
+                        help="count every article's keywords as soon as it's scraped and keep only the counts, "
+                             "instead of each site's text (--parse-workers and --store already do this)")
+    parser.add_argument("--store", action="store_true",
+                        help="keep per article keyword counts so re-runs only analyze new articles")
+    parser.add_argument("--queue", metavar="PATH",
+                        help="crawl through a shared SQLite work queue at PATH instead of in this process")
+    parser.add_argument("--role", choices=["coordinator", "worker"], default="coordinator",
+                        help="with --queue: coordinator queues the sites and analyzes the results, "
+                             "worker only runs jobs (default coordinator)")
+    parser.add_argument("--queue-workers", type=int, default=0,
+                        help="with --queue: local worker processes the coordinator starts "
+                             "(default 0, the coordinator runs jobs itself)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="leave out articles that are exact or near copies of one already scraped")
+    parser.add_argument("--dedup-index", metavar="PATH",
+                        help="with --dedup: load and save the article fingerprints at PATH so "
+                             "copies of articles from earlier runs are caught too")
+    parser.add_argument("--history", action="store_true",
+                        help="add this run's results to the history that python -m history trend reads")
+    parser.add_argument("--history-db", metavar="PATH",
+                        help="with --history: keep the history at PATH instead of the cache folder")
+    parser.add_argument("--ratings-index", metavar="PATH",
+                        help="ratings index built with python -m ratings build (default: the one in the cache folder)")
+    parser.add_argument("--warc", metavar="DIR",
+                        help="save every response in a new WARC archive in DIR so the run can be replayed")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="scrape from a WARC archive written with --warc instead of the network")
+    parser.add_argument("--no-chart", action="store_true",
+                        help="don't build, open or save the chart, plotly isn't even imported")
+    parser.add_argument("--hover-labels", action="store_true",
+                        help="only show site names on hover instead of as labels on the chart")
+    parser.add_argument("--chart-file", default="political_bias_chart.html",
+                        help="where to save the chart (default political_bias_chart.html)")
+    parser.add_argument("--chart-mode", choices=["full", "shared", "cdn", "json"], default="full",
+                        help="full: HTML with plotly.js inside, shared/cdn: small HTML that loads plotly.js "
+                             "from the chart's folder or the CDN, json: figure JSON for chart_viewer.html "
+                             "(default full)")
+    parser.add_argument("--gzip-chart", action="store_true",
+                        help="gzip the saved chart")
+    parser.add_argument("--output", metavar="PATH",
+                        help="save the results as JSON at PATH")
+    parser.add_argument("--results-file", metavar="PATH",
+                        help="write every site result to PATH as it's analyzed (.jsonl, .csv or .parquet)")
+    parser.add_argument("--article-results", metavar="PATH",
+                        help="with --results-file: also write one row per article to PATH")
+    parser.add_argument("--bootstrap", type=int, default=BOOTSTRAP_SAMPLES, metavar="N",
+                        help=f"resamples for the calculated bias confidence intervals, 0 turns them off "
+                             f"(default {BOOTSTRAP_SAMPLES})")
+    parser.add_argument("--matrix", action="store_true",
+                        help="analyze every site at once with a NumPy document-term matrix")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="save stage timings and per domain request metrics as JSON at PATH")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="save the same metrics in Prometheus text format at PATH")
+    args = parser.parse_args(argv)
+    if args.article_results and not args.results_file:
+        parser.error("--article-results needs --results-file")
+    if args.bootstrap < 0:
+        parser.error("--bootstrap can't be negative")
+    if args.history_db and not args.history:
+        parser.error("--history-db needs --history")
+    if args.dedup_index and not args.dedup:
+        parser.error("--dedup-index needs --dedup")
+    if args.dedup and args.queue:
+        # Queue jobs run in other processes, they never see the fingerprint index
+        parser.error("--dedup doesn't work with --queue")
+    if args.warc and args.replay:
+        parser.error("--warc and --replay can't be used together")
+    if (args.warc or args.replay) and args.queue:
+        # Queue jobs are fetched by other processes, they'd each need their own archive
+        parser.error("--warc and --replay don't work with --queue")
+    return args
+
+# Entry point for local queue workers, spawned processes don't inherit our settings
+def run_queue_worker(path, html_engine, use_cache, use_feeds=True, crawl_delay=DEFAULT_CRAWL_DELAY,
+                     retries=MAX_RETRIES):
+    politeness.configure(default_delay=crawl_delay, max_retries=retries)
+    http_cache.configure(enabled=use_cache)
+    extractor.configure(html_engine)
+    discovery.configure(enabled=use_feeds)
+    work_queue.run_worker(path)
+
+"""
+Queue mode, the coordinator queues the sites, jobs get run by local worker
+processes and/or workers started elsewhere with --role worker, and once the
+queue is drained the results are merged into scraped_data
+"""
+def crawl_with_queue(args):
+    if args.role == "worker":
+        finished = work_queue.run_worker(args.queue)
+        print(f"Worker finished {finished} jobs")
+        return None
+
+    try:
+        queued = work_queue.seed(args.queue, WEBSITES)
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+    print(f"Queued {queued} sites in {args.queue}")
+
+    if args.queue_workers > 0:
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=run_queue_worker,
+                                   args=(args.queue, args.html_engine, not args.no_cache, not args.no_feeds,
+                                         args.crawl_delay, args.retries))
+                   for _ in range(args.queue_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        work_queue.run_worker(args.queue)
+
+    # Workers on other machines might still be running jobs
+    conn = work_queue.open_queue(args.queue)
+    try:
+        while not work_queue.is_drained(conn):
+            time.sleep(1)
+        print(f"Queue drained: {work_queue.queue_counts(conn)}")
+    finally:
+        conn.close()
+
+    return work_queue.collect_results(args.queue)
+
+# Writes the metrics files asked for on the command line
+def save_metrics(args):
+    if args.metrics_json:
+        metrics.dump(args.metrics_json, "json")
+    if args.metrics_prom:
+        metrics.dump(args.metrics_prom, "prometheus")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics_json or args.metrics_prom:
+        metrics.enable()
+    try:
+        run(args)
+    finally:
+        save_metrics(args)
+
+# Prints how the scrape went, start is when it started
+def print_scrape_stats(args, start, parse_pool):
+    mode = "concurrent" if args.concurrent else "serial"
+    if args.queue:
+        mode = f"queue {args.queue}"
+    if parse_pool is not None:
+        mode += f", {args.parse_workers} parse workers"
+    print(f"Scraping took {time.perf_counter() - start:.1f}s ({mode})")
+    stats = http_pool.pool_stats()
+    print(f"Connections: {stats['connections']} opened for {stats['requests']} requests "
+          f"to {stats['hosts']} hosts ({stats['reused']} reused)")
+    polite_stats = politeness.politeness_stats()
+    print(f"Politeness: {polite_stats['retries']} retries, waited {polite_stats['wait_seconds']:.1f}s "
+          f"for crawl delays and Retry-After")
+    robots_stats = robots_cache.cache_stats()
+    print(f"robots.txt cache: {robots_stats['hits']} hits, {robots_stats['misses']} misses")
+    article_stats = http_cache.cache_stats()
+    if article_stats['enabled']:
+        print(f"Article cache: {article_stats['hits']} unchanged, {article_stats['misses']} downloaded, "
+              f"{article_stats['evictions']} evicted")
+    peak_rss = metrics.peak_rss_bytes()
+    if peak_rss is not None:
+        print(f"Peak memory: {peak_rss / 1024 / 1024:.1f} MB")
+    store_stats = result_store.store_stats()
+    if store_stats['enabled']:
+        print(f"Article store: {store_stats['hits']} already analyzed, {store_stats['misses']} new")
+    if dedup.is_enabled():
+        print_duplicate_stats()
+    warc_stats = warc.warc_stats()
+    if args.warc:
+        print(f"Archive: {warc_stats['records']} records ({warc_stats['bytes'] / 1024 / 1024:.1f} MB) "
+              f"saved to {warc_stats['path']}")
+    if args.replay:
+        print(f"Replay: {warc_stats['replayed']} responses from {args.replay}, "
+              f"{warc_stats['missing']} urls not in it")
+
+# Duplicate rate of every domain that had duplicates, and over all articles
+def print_duplicate_stats():
+    stats = dedup.duplicate_stats()
+    articles = sum(domain['articles'] for domain in stats.values())
+    duplicates = sum(domain['exact'] + domain['near'] for domain in stats.values())
+    rate = duplicates / articles * 100 if articles else 0
+    print(f"Duplicates: {duplicates} of {articles} articles ({rate:.1f}%) left out")
+    for domain, counts in sorted(stats.items()):
+        found = counts['exact'] + counts['near']
+        if found:
+            print(f"  {domain}: {found}/{counts['articles']} ({found / counts['articles'] * 100:.0f}%), "
+                  f"{counts['exact']} exact, {counts['near']} near")
+
+"""
+Streaming run, used when nothing needs every result at once (no chart, no --matrix)
+Every site is analyzed, printed and written to the sink as soon as it's scraped
+and then dropped, so memory stays flat however many sites there are. The
+results are only kept when --output needs the whole list.
+"""
+def stream_sites(args, websites, parse_pool, sink, history_run=None):
+    sites = iter_scrape_sites(websites, concurrent=args.concurrent,
+                              max_workers=args.workers, max_per_host=args.per_host,
+                              parse_pool=parse_pool, window=args.workers * 2, fold=args.fold)
+    results = [] if args.output else None
+    analyzed = 0
+    for url, data in sites:
+        result = analyze_site(url, data)
+        if analyzed == 0:
+            print_results_header()
+        print_result(result)
+        if sink is not None:
+            sink.write_site(result, data)
+        if history_run is not None:
+            history.add_results(history_run, [result])
+        if results is not None:
+            results.append(result)
+        analyzed += 1
+    return analyzed, results
+
+def run(args):
     print("Using AllSides Media Bias Ratings + MBFC Credibility Scores")
     print("=" * 50)
 
+    http_pool.configure(pool_maxsize=args.pool_size)
+    politeness.configure(default_delay=args.crawl_delay, max_retries=args.retries)
+    http_cache.configure(enabled=not args.no_cache)
+    extractor.configure(args.html_engine)
+    discovery.configure(enabled=not args.no_feeds)
+    result_store.configure(enabled=args.store)
+    dedup.configure(enabled=args.dedup, path=args.dedup_index)
+    ratings.configure(path=args.ratings_index)
+    history.configure(enabled=args.history, path=args.history_db)
+    analyzer.configure(bootstrap_samples=args.bootstrap)
+    if ratings.index_size():
+        print(f"Ratings index: {ratings.index_size()} domains")
+
+    websites = WEBSITES
+    replay_dir = None
+    if args.replay:
+        websites = warc.start_replay(args.replay)
+        print(f"Replaying {len(websites)} sites from {args.replay}")
+        # robots.txt and articles have to come from the archive, not from the caches on disk
+        replay_dir = tempfile.TemporaryDirectory()
+        robots_cache.configure(path=os.path.join(replay_dir.name, "robots.json"))
+        http_cache.configure(enabled=False)
+    if args.warc:
+        print(f"Saving responses to {warc.start_recording(args.warc, websites)}")
+
+    sink = None
+    if args.results_file:
+        sink = ResultsSink(args.results_file, args.article_results)
+    try:
+        scrape_and_report(args, websites, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+        warc.stop_replay()
+        if replay_dir is not None:
+            replay_dir.cleanup()
+
+# Scrapes, analyzes and reports, results go to the console, the sink, --output and the chart
+def scrape_and_report(args, websites, sink):
+    parse_pool = None
+    if args.parse_workers > 0:
+        parse_pool = pipeline.start_parse_pool(args.parse_workers, args.html_engine,
+                                               use_cache=not args.no_cache)
+    streaming = args.no_chart and not args.matrix and not args.queue
+    # Queue workers only scrape, the coordinator records the results
+    history_run = None
+    if history.is_enabled() and not (args.queue and args.role == "worker"):
+        history_run = history.start_run()
+
     # Scrape websites and get bias ratings
-    scraped_data = scrape_mutiple(WEBSITES)
+    start = time.perf_counter()
+    try:
+        if args.queue:
+            scraped_data = crawl_with_queue(args)
+            if args.role == "worker":
+                return
+        elif streaming:
+            analyzed, results = stream_sites(args, websites, parse_pool, sink, history_run)
+        else:
+            scraped_data = scrape_mutiple(websites, concurrent=args.concurrent,
+                                          max_workers=args.workers, max_per_host=args.per_host,
+                                          parse_pool=parse_pool, fold=args.fold)
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown()
+        dedup.save()
+        warc.stop_recording()
+    print_scrape_stats(args, start, parse_pool)
+
+    if streaming:
+        if history_run is not None:
+            print(f"History: {analyzed} results saved to {history.path()}")
+        if not analyzed:
+            print("No website could be scraped, check url or network connection")
+        elif args.output:
+            save_results(results, args.output)
+        return
 
     if not scraped_data:
         print("No website could be scraped, check url or network connection")
         return
 
     # Analyze bias
-    results = analyze_all_sites(scraped_data)
+    if args.matrix:
+        # NumPy is only loaded when it's used
+        from term_matrix import analyze_all_sites_matrix
+        results = analyze_all_sites_matrix(scraped_data)
+    else:
+        results = analyze_all_sites(scraped_data)
+
+    if sink is not None:
+        for result in results:
+            sink.write_site(result, scraped_data[result["url"]])
+    if history_run is not None:
+        history.add_results(history_run, results)
+        print(f"History: {len(results)} results saved to {history.path()}")
 
     # Print results console
     print_results(results)
+    if args.output:
+        save_results(results, args.output)
+    if args.no_chart:
+        return
 
-    # Generate and display visual
-    fig = create_bias_chart(results)
+    # Generate and display visual, plotly takes a while to import so it's only loaded here
+    with metrics.stage("chart"):
+        from visualizer import create_bias_chart, display_chart, save_chart
+        fig = create_bias_chart(results, hover_labels=args.hover_labels or None)
     display_chart(fig)
-    save_chart(fig)
+    with metrics.stage("chart"):
+        save_chart(fig, args.chart_file, mode=args.chart_mode, compress=args.gzip_chart)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
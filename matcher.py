@@ -0,0 +1,118 @@
+import re
+from bisect import bisect_right
+from collections import Counter
+
+"""
+Single pass keyword matcher
+
+Instead of running one regex per keyword over the text (which means a full
+pass over the text for every keyword) we build one regex out of the whole
+keyword dictionary and scan the text once.
+
+The keywords are folded into a trie first so the regex looks like
+(?:clima(?:te (?:change|crisis))|...) instead of a flat list of alternatives,
+that way the regex engine only has to try the branches that share the
+characters it has already matched, which keeps it fast with thousands of phrases.
+
+Every keyword is matched inside a lookahead so matches can overlap, this keeps
+the counts the same as the old per keyword re.findall, for example
+"constitutional conservative" also counts as a hit for "conservative".
+"""
+
+# Builds the regex source for a trie node
+def _trie_pattern(node):
+    terminal = "" in node
+    branches = []
+    for char in sorted(c for c in node if c != ""):
+        branches.append(re.escape(char) + _trie_pattern(node[char]))
+
+    if not branches:
+        return ""
+
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+
+    body = "(?:" + "|".join(branches) + ")"
+    if terminal:
+        body += "?"
+    return body
+
+# Builds one lookahead regex that matches any keyword in the given list
+def _compile_layer(keywords):
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    """
+    The \b before and after the group is the same word boundary check the old
+    per keyword pattern used, the whole thing sits in a lookahead so the scan
+    moves one character at a time and overlapping keywords are still found
+    """
+    return re.compile(r"(?=\b(" + _trie_pattern(trie) + r")\b)")
+
+"""
+A regex can only report one match per starting position, so if one keyword is a
+prefix of another (like "patriot" and "patriotism") they can't share a regex.
+We split the keywords into layers where no keyword in a layer is a prefix
+of another keyword in the same layer, most dictionaries only need one or two.
+"""
+def _split_layers(keywords):
+    keyword_set = set(keywords)
+    layers = []
+    for keyword in sorted(keyword_set):
+        # Count how many other keywords are a prefix of this one
+        depth = sum(1 for i in range(1, len(keyword)) if keyword[:i] in keyword_set)
+        while len(layers) <= depth:
+            layers.append([])
+        layers[depth].append(keyword)
+    return [layer for layer in layers if layer]
+
+# Builds the matcher from a {category: [keywords]} dictionary
+def build_matcher(keyword_dict):
+    all_keywords = [kw for keywords in keyword_dict.values() for kw in keywords]
+    layers = [_compile_layer(layer) for layer in _split_layers(all_keywords)]
+    return {
+        "layers": layers,
+        "keywords": keyword_dict,
+    }
+
+"""
+Counts how many times each keyword is in the text with a single scan per layer
+Returns a Counter of keyword -> count, keywords with no hits aren't in it
+"""
+def count_keywords(matcher, text):
+    counts = Counter()
+    for layer in matcher["layers"]:
+        last_end = {}
+        for match in layer.finditer(text):
+            keyword = match.group(1)
+            start = match.start()
+            # re.findall doesn't return overlapping matches of the same keyword
+            if start < last_end.get(keyword, 0):
+                continue
+            last_end[keyword] = start + len(keyword)
+            counts[keyword] += 1
+    return counts
+
+"""
+count_keywords for a text made of pieces, like a site's articles joined together
+starts are the offsets where the pieces begin, in order. Returns one Counter per
+piece, a hit goes to the piece it starts in, so added up they're exactly what
+count_keywords gives for the whole text, still in one scan per layer.
+"""
+def count_keywords_by_piece(matcher, text, starts):
+    starts = list(starts) or [0]
+    pieces = [Counter() for _ in starts]
+    for layer in matcher["layers"]:
+        last_end = {}
+        for match in layer.finditer(text):
+            keyword = match.group(1)
+            start = match.start()
+            if start < last_end.get(keyword, 0):
+                continue
+            last_end[keyword] = start + len(keyword)
+            pieces[max(bisect_right(starts, start) - 1, 0)][keyword] += 1
+    return pieces
@@ -0,0 +1,186 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+"""
+Run metrics (python main.py --metrics-json metrics.json / --metrics-prom metrics.prom)
+
+A small registry of counters, histograms and per stage timers that gets dumped
+as JSON or in Prometheus text format at the end of a run.
+Stages: robots, discovery, homepage, article_fetch, parse, analyze, chart. Their wall and
+CPU time is added up over every thread, so with --concurrent the wall time of a
+stage can be more than the run took. Stages can also sit inside each other,
+discovery and homepage include the robots checks for the links they find.
+
+Metrics are off unless enable() is called. While they're off every function
+returns straight away and stage() hands back the same do-nothing context
+manager, so the instrumentation costs next to nothing.
+Worker processes (--parse-workers, queue workers) keep their own registry,
+which isn't merged back.
+"""
+_enabled = False
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_stages = {}
+_NULL_STAGE = nullcontext()
+
+# Seconds, covers everything from a fast local request to a timeout
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def is_enabled():
+    return _enabled
+
+# Empties the registry
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _stages.clear()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+# Adds amount to a counter, labels become Prometheus labels (domain="npr.org")
+def inc(name, amount=1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+# Records one value in a histogram
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets),
+                                            'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['counts'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+@contextmanager
+def _timed_stage(name):
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        with _lock:
+            stage = _stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            stage['calls'] += 1
+            stage['wall_seconds'] += wall
+            stage['cpu_seconds'] += cpu
+
+# Times a block of code as part of a stage: with metrics.stage("parse"): ...
+def stage(name):
+    if not _enabled:
+        return _NULL_STAGE
+    return _timed_stage(name)
+
+# Everything in the registry as plain dicts and lists
+def snapshot():
+    with _lock:
+        return {
+            'stages': {name: dict(stage) for name, stage in _stages.items()},
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in sorted(_counters.items())],
+            'histograms': [{'name': name, 'labels': dict(labels),
+                            'buckets': list(histogram['buckets']), 'counts': list(histogram['counts']),
+                            'sum': histogram['sum'], 'count': histogram['count']}
+                           for (name, labels), histogram in sorted(_histograms.items())],
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+
+"""
+Most memory the process has used so far in bytes, None where the OS can't tell us
+On Linux this is VmHWM, ru_maxrss there keeps the parent's peak across exec so a
+small process started by a big one would report the big one. Elsewhere it's
+ru_maxrss (the resource module is Unix only), macOS reports that in bytes.
+"""
+def peak_rss_bytes():
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def to_json():
+    return json.dumps(snapshot(), indent=2)
+
+def _labels_text(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in sorted(labels.items()))
+    return "{" + ",".join(escaped) + "}"
+
+# Prometheus text exposition format, every metric gets a poliscraper_ prefix
+def to_prometheus():
+    data = snapshot()
+    lines = []
+
+    for field, help_text in (('wall_seconds', "Wall time spent in each stage"),
+                             ('cpu_seconds', "CPU time spent in each stage"),
+                             ('calls', "Times each stage ran")):
+        metric = f"poliscraper_stage_{field}" + ("_total" if field == 'calls' else "")
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name, stage in sorted(data['stages'].items()):
+            lines.append(f"{metric}{_labels_text({}, stage=name)} {stage[field]}")
+
+    seen = set()
+    for counter in data['counters']:
+        metric = "poliscraper_" + counter['name']
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_labels_text(counter['labels'])} {counter['value']}")
+
+    for histogram in data['histograms']:
+        metric = "poliscraper_" + histogram['name']
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            lines.append(f"{metric}_bucket{_labels_text(histogram['labels'], le=bound)} {count}")
+        lines.append(f"{metric}_bucket{_labels_text(histogram['labels'], le='+Inf')} {histogram['count']}")
+        lines.append(f"{metric}_sum{_labels_text(histogram['labels'])} {histogram['sum']}")
+        lines.append(f"{metric}_count{_labels_text(histogram['labels'])} {histogram['count']}")
+
+    if data['peak_rss_bytes'] is not None:
+        lines.append("# HELP poliscraper_peak_rss_bytes Most memory the process used during the run")
+        lines.append("# TYPE poliscraper_peak_rss_bytes gauge")
+        lines.append(f"poliscraper_peak_rss_bytes {data['peak_rss_bytes']}")
+
+    return "\n".join(lines) + "\n"
+
+# Writes the registry to path as "json" or "prometheus"
+def dump(path, fmt="json"):
+    text = to_json() if fmt == "json" else to_prometheus()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    print(f"Metrics saved at {path}")
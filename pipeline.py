@@ -0,0 +1,82 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import dedup
+import extractor
+import http_cache
+import metrics
+from analyzer import MATCHER
+from matcher import count_keywords
+
+"""
+Parse + analyze workers for pipeline mode (python main.py --parse-workers N)
+
+Parsing HTML and counting keywords is pure Python and only uses one core, so in
+pipeline mode the scraper hands the raw page bytes to a pool of worker processes
+instead. Workers send back a small record per article (its length and the keyword
+counts) rather than the article text, so very little has to be copied back.
+"""
+
+# Runs once in every worker so it uses the same settings as the main process
+def _init_worker(engine, use_cache):
+    extractor.configure(engine)
+    http_cache.configure(enabled=use_cache)
+
+"""
+Parses one article and counts its keywords, this runs in a worker process
+page is what scraper.fetch_article returned, limit is the most text we'll use
+from one article (a site never keeps more than MAX_CHARS * 10 anyway, the
+article that fills the budget up gets counted again with recount_article).
+Returns {'url', 'chars', 'text_bytes', 'counts', 'written'}, written is whether
+an article cache entry was saved, the main process needs that for the cache size.
+With fingerprint=True the record also gets the text's dedup fingerprint, the
+duplicate check itself happens in the main process where the index is.
+"""
+def process_article(url, page, limit, fingerprint=False):
+    written = False
+    if page['content'] is not None:
+        with metrics.stage("parse"):
+            text = extractor.extract_article_text(page['content'])
+        written = http_cache.write_entry(url, page['etag'], page['last_modified'], text)
+    else:
+        text = page['text']
+
+    text = text[:limit]
+    with metrics.stage("analyze"):
+        counts = dict(count_keywords(MATCHER, text))
+    record = {
+        'url': url,
+        'chars': len(text),
+        'text_bytes': len(text.encode("utf-8")),
+        'counts': counts,
+        'written': written,
+    }
+    if fingerprint:
+        record['fingerprint'] = dedup.fingerprint(text)
+    return record
+
+"""
+Counts an article again with only the first limit characters of its text, for
+the last article of a site that only partly fits in the budget. That's at most
+one article per site so it runs in the main process, the cache entry was
+already written the first time.
+"""
+def recount_article(url, page, limit):
+    if page['content'] is not None:
+        with metrics.stage("parse"):
+            page = {'content': None, 'text': extractor.extract_article_text(page['content'])}
+    record = process_article(url, page, limit)
+    del record['written']
+    return record
+
+"""
+Starts the worker pool, spawn is used instead of fork because the scraper
+may already have threads running and forking those isn't safe
+"""
+def start_parse_pool(workers, engine, use_cache=True):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(engine, use_cache),
+    )
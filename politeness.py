@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import metrics
+from config import DEFAULT_CRAWL_DELAY, MAX_CRAWL_DELAY, MAX_RETRIES, RETRY_BACKOFF, MAX_RETRY_AFTER
+
+"""
+Per host politeness: crawl delays, Retry-After and retry backoff
+
+Every host gets a token bucket that holds one request and refills at one
+request per Crawl-delay (from robots.txt, DEFAULT_CRAWL_DELAY if it doesn't say),
+so requests to a host are spaced out however many threads want it. A 429 or 503
+with Retry-After pauses the whole host until then, other failures (timeouts,
+dropped connections, 5xx) make only that request wait, an exponential backoff
+with full jitter so retries from many threads don't all land at once.
+
+The scraper waits for the bucket while holding only the host's slot and sleeps
+off retries holding no slot at all, so a slow or rate limited host never keeps
+requests to the other hosts waiting.
+"""
+_lock = threading.Lock()
+_buckets = {}   # host -> {'interval', 'tokens', 'updated', 'paused_until', 'seeded'}
+_default_delay = DEFAULT_CRAWL_DELAY
+_max_retries = MAX_RETRIES
+_stats = {'retries': 0, 'waits': 0, 'wait_seconds': 0.0}
+
+# Change the delay for hosts without a Crawl-delay, or how many times a request is retried
+def configure(default_delay=None, max_retries=None):
+    global _default_delay, _max_retries
+    with _lock:
+        if default_delay is not None:
+            _default_delay = default_delay
+            for bucket in _buckets.values():
+                if not bucket['seeded']:
+                    bucket['interval'] = default_delay
+        if max_retries is not None:
+            _max_retries = max_retries
+
+# Forgets every host's bucket, for benchmarks that crawl the same sites more than once
+def reset():
+    with _lock:
+        _buckets.clear()
+
+def max_retries():
+    return _max_retries
+
+# Bucket for a host, made the first time the host is seen, must hold _lock
+def _bucket(host):
+    bucket = _buckets.get(host)
+    if bucket is None:
+        bucket = _buckets[host] = {'interval': _default_delay, 'tokens': 1.0, 'updated': time.monotonic(),
+                                   'paused_until': 0.0, 'seeded': False}
+    return bucket
+
+def is_seeded(url):
+    with _lock:
+        return _bucket(urlparse(url).netloc)['seeded']
+
+# Sets a host's request interval from its robots.txt Crawl-delay (None if it has none)
+def set_crawl_delay(url, delay):
+    with _lock:
+        bucket = _bucket(urlparse(url).netloc)
+        bucket['interval'] = min(delay, MAX_CRAWL_DELAY) if delay is not None else _default_delay
+        bucket['seeded'] = True
+
+"""
+Waits until the url's host can take another request
+The token is taken before sleeping, so threads queue up one interval apart
+instead of all waking up at the same time.
+"""
+def acquire(url):
+    with _lock:
+        bucket = _bucket(urlparse(url).netloc)
+        now = time.monotonic()
+        start = max(now, bucket['paused_until'])
+        interval = bucket['interval']
+        if interval > 0:
+            bucket['tokens'] = min(1.0, bucket['tokens'] + (now - bucket['updated']) / interval)
+            bucket['updated'] = now
+            bucket['tokens'] -= 1
+            if bucket['tokens'] < 0:
+                start = max(start, now - bucket['tokens'] * interval)
+        else:
+            # Keep track anyway, robots.txt is fetched before we know the host's Crawl-delay
+            bucket['tokens'] = 0.0
+            bucket['updated'] = now
+        wait = start - now
+        if wait > 0:
+            _stats['waits'] += 1
+            _stats['wait_seconds'] += wait
+    if wait > 0:
+        time.sleep(wait)
+
+# Holds every request to the url's host for seconds, for a 429 or 503
+def pause(url, seconds):
+    with _lock:
+        bucket = _bucket(urlparse(url).netloc)
+        bucket['paused_until'] = max(bucket['paused_until'], time.monotonic() + seconds)
+
+# Seconds the server's Retry-After header asks for, None if it didn't send a usable one
+def retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    # It can also be an HTTP date
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+# Full jitter backoff, anywhere from 0 up to RETRY_BACKOFF * 2 ** attempt seconds
+def backoff(attempt):
+    return random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+
+# Whether a Retry-After is too long to be worth waiting for
+def too_long(seconds):
+    return seconds > MAX_RETRY_AFTER
+
+# Counts a retry, reason is the status code or "timeout" / "connection" / "body"
+def note_retry(url, reason):
+    with _lock:
+        _stats['retries'] += 1
+    metrics.inc("http_retries_total", domain=urlparse(url).netloc.replace("www.", ""), reason=reason)
+
+# Retries and time spent waiting on crawl delays and Retry-After since the program started
+def politeness_stats():
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,327 @@
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from urllib.parse import urlparse
+
+from config import RATINGS, MBFC_CREDIBILITY, RATINGS_INDEX
+
+"""
+Ratings registry, the bias and credibility of every domain we know about
+
+Ratings come from two places:
+1. RATINGS and MBFC_CREDIBILITY in config.py
+2. An index compiled from AllSides / MBFC style CSV or JSON exports with
+   python -m ratings build allsides.csv mbfc.json (saved to RATINGS_INDEX)
+
+A host gets the rating of its closest rated parent, so edition.cnn.com and
+amp.theguardian.com get the cnn.com and theguardian.com ratings. Every suffix
+of the host is looked up from the longest to the shortest, one hash lookup
+each, so a lookup costs one probe per label however many domains the index has.
+When a domain is in both places config.py wins.
+
+The index is an open addressing hash table that's memory mapped instead of
+read, so opening one with tens of thousands of domains is instant and only the
+pages a lookup touches get read from disk.
+Layout: header, then SLOT.size byte slots, then the domain names. An index
+that is cut off anywhere is ignored with a warning, like one that isn't an index.
+"""
+_path = RATINGS_INDEX
+_lock = threading.Lock()
+_index = None     # {'file', 'map', 'slots', 'count', 'names_at'} once loaded
+_loaded = False
+
+MAGIC = b"PSRATES2"
+HEADER = struct.Struct("<8sIII")        # magic, slot count, domain count, bytes of domain names
+SLOT = struct.Struct("<QIHbB")          # name hash, name offset, name length, bias, credibility
+NO_BIAS = -128
+NO_CREDIBILITY = 255
+
+"""
+Default credibility is gonna set it to 5 if it cant be found
+the logic behind this is that 5 is right in the center so it
+shouldn't skew a website unrated by the MBFC either way
+"""
+DEFAULT_CREDIBILITY = 5
+
+# AllSides labels for each bias score
+BIAS_LABELS = {-2: 'Left', -1: 'Lean Left', 0: 'Center', 1: 'Lean Right', 2: 'Right'}
+# Bias labels used by the exports, AllSides and MBFC name them differently
+BIAS_SCORES = {
+    'left': -2, 'extreme left': -2, 'far left': -2,
+    'lean left': -1, 'left-center': -1, 'left center': -1,
+    'center': 0, 'least biased': 0,
+    'lean right': 1, 'right-center': 1, 'right center': 1,
+    'right': 2, 'extreme right': 2, 'far right': 2,
+}
+# MBFC credibility and factual reporting labels on our 0-10 scale
+CREDIBILITY_SCORES = {
+    'very high': 10, 'high': 8, 'mostly factual': 7, 'medium': 5, 'mixed': 5, 'low': 3, 'very low': 1,
+}
+# Export columns, first one a row has wins
+DOMAIN_COLUMNS = ('domain', 'url', 'source_url', 'website', 'site')
+BIAS_COLUMNS = ('bias', 'bias_rating', 'rating', 'media_bias')
+CREDIBILITY_COLUMNS = ('credibility', 'credibility_rating', 'mbfc_credibility', 'factual_reporting')
+
+# Use another index file
+def configure(path=None):
+    global _path, _loaded
+    with _lock:
+        if path is not None and path != _path:
+            _close()
+            _path = path
+            _loaded = False
+
+# Must hold _lock
+def _close():
+    global _index
+    if _index is not None:
+        _index['map'].close()
+        _index['file'].close()
+        _index = None
+
+def _hash(domain):
+    value = int.from_bytes(hashlib.blake2b(domain.encode("utf-8"), digest_size=8).digest(), "little")
+    # 0 marks an empty slot
+    return value or 1
+
+# Lowercase host of a url or bare domain, without www., a port or a trailing dot
+def normalize_host(value):
+    value = value.strip().lower()
+    if "://" not in value:
+        value = "//" + value
+    host = (urlparse(value).hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+# Opens the index the first time it's needed, must hold _lock
+def _load():
+    global _index, _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        f = open(_path, "rb")
+    except OSError:
+        # No index built, only config.py's ratings are used
+        return
+    try:
+        index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        f.close()
+        return
+    _index = {'file': f, 'map': index_map}
+    if len(index_map) < HEADER.size:
+        _bad_index("isn't a ratings index")
+        return
+    magic, slots, count, names_size = HEADER.unpack_from(index_map, 0)
+    if magic != MAGIC:
+        _bad_index("isn't a ratings index")
+        return
+    # The slot count is a power of two and every slot and name has to be in the file
+    names_at = HEADER.size + slots * SLOT.size
+    if slots == 0 or slots & (slots - 1) or len(index_map) < names_at + names_size:
+        _bad_index("is cut off")
+        return
+    _index.update(slots=slots, count=count, names_at=names_at)
+
+# Warns about a broken index and stops using it, only config.py's ratings are left, must hold _lock
+def _bad_index(problem):
+    print(f"Warning: {_path} {problem}, rebuild it with python -m ratings build")
+    _close()
+
+"""
+(bias, credibility) for exactly this domain from the index, either can be None
+Must hold _lock so build() or configure() can't close the map mid lookup.
+"""
+def _index_lookup(domain):
+    index_map = _index['map']
+    mask = _index['slots'] - 1
+    wanted = _hash(domain)
+    name = domain.encode("utf-8")
+    slot = wanted & mask
+    # write_index leaves half the slots empty, but a damaged table might not have any
+    for _ in range(_index['slots']):
+        value, offset, length, bias, credibility = SLOT.unpack_from(index_map, HEADER.size + slot * SLOT.size)
+        if value == 0:
+            return None
+        if value == wanted:
+            start = _index['names_at'] + offset
+            if index_map[start:start + length] == name:
+                return (None if bias == NO_BIAS else bias,
+                        None if credibility == NO_CREDIBILITY else credibility)
+        slot = (slot + 1) & mask
+    return None
+
+"""
+Rating of the closest rated parent of a host (or url), None if nothing above it is rated
+Returns (domain the rating is for, {'bias', 'rating', 'credibility'}).
+A domain only counts as rated when it has a bias, credibility alone isn't enough.
+"""
+def resolve(host):
+    host = normalize_host(host)
+    labels = host.split(".")
+    with _lock:
+        _load()
+        for i in range(len(labels)):
+            domain = ".".join(labels[i:])
+            if domain in RATINGS:
+                rating = RATINGS[domain]
+                return domain, {'bias': rating['bias'], 'rating': rating['rating'],
+                                'credibility': MBFC_CREDIBILITY.get(domain, DEFAULT_CREDIBILITY)}
+            if _index is None:
+                continue
+            found = _index_lookup(domain)
+            if found is not None and found[0] is not None:
+                bias, credibility = found
+                if credibility is None:
+                    credibility = MBFC_CREDIBILITY.get(domain, DEFAULT_CREDIBILITY)
+                return domain, {'bias': bias, 'rating': BIAS_LABELS.get(bias, 'Unknown'),
+                                'credibility': credibility}
+    return None
+
+# Domains in the loaded index, 0 when there isn't one
+def index_size():
+    with _lock:
+        _load()
+        return _index['count'] if _index is not None else 0
+
+# Bias score from a number or a label, None if it's neither
+def _parse_bias(value):
+    if value is None or str(value).strip() == "":
+        return None
+    value = str(value).strip().lower()
+    try:
+        bias = round(float(value))
+    except (ValueError, OverflowError):
+        return BIAS_SCORES.get(value)
+    return bias if -2 <= bias <= 2 else None
+
+# Credibility from a 0-10 number or a label, None if it's neither
+def _parse_credibility(value):
+    if value is None or str(value).strip() == "":
+        return None
+    value = str(value).strip().lower()
+    try:
+        credibility = round(float(value))
+    except (ValueError, OverflowError):
+        return CREDIBILITY_SCORES.get(value.replace(" credibility", ""))
+    return credibility if 0 <= credibility <= 10 else None
+
+def _first(row, columns):
+    for column in columns:
+        if row.get(column) not in (None, ""):
+            return row[column]
+    return None
+
+# Rows of a CSV or JSON export as dicts with lowercase keys
+def _read_export(path):
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        # Either a list of rows or {domain: row}
+        if isinstance(data, dict):
+            rows = [dict(row, domain=domain) for domain, row in data.items()]
+        else:
+            rows = data
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+    for row in rows:
+        yield {str(key).strip().lower().replace(" ", "_"): value for key, value in row.items()}
+
+"""
+Reads exports into {domain: [bias, credibility]}, rows without a domain or
+without a bias and credibility are skipped. The first file to rate a domain
+wins, later ones only fill in what it's missing, so with an AllSides export
+first the bias comes from AllSides and an MBFC one after it only adds the
+credibility (MBFC has bias labels too). Returns (ratings, rows skipped).
+"""
+def read_exports(paths):
+    ratings = {}
+    skipped = 0
+    for path in paths:
+        for row in _read_export(path):
+            domain = normalize_host(str(_first(row, DOMAIN_COLUMNS) or ""))
+            bias = _parse_bias(_first(row, BIAS_COLUMNS))
+            credibility = _parse_credibility(_first(row, CREDIBILITY_COLUMNS))
+            if not domain or (bias is None and credibility is None):
+                skipped += 1
+                continue
+            entry = ratings.setdefault(domain, [None, None])
+            if entry[0] is None:
+                entry[0] = bias
+            if entry[1] is None:
+                entry[1] = credibility
+    return ratings, skipped
+
+# Writes {domain: [bias, credibility]} as an index at path
+def write_index(ratings, path):
+    # Half the slots stay empty so probes stay short
+    slots = 1
+    while slots < len(ratings) * 2:
+        slots *= 2
+    table = bytearray(slots * SLOT.size)
+    names = bytearray()
+    for domain, (bias, credibility) in ratings.items():
+        name = domain.encode("utf-8")
+        value = _hash(domain)
+        slot = value & (slots - 1)
+        while SLOT.unpack_from(table, slot * SLOT.size)[0] != 0:
+            slot = (slot + 1) & (slots - 1)
+        SLOT.pack_into(table, slot * SLOT.size, value, len(names), len(name),
+                       NO_BIAS if bias is None else bias, NO_CREDIBILITY if credibility is None else credibility)
+        names += name
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write to a temp file first so a crash can't leave half an index behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, slots, len(ratings), len(names)))
+        f.write(table)
+        f.write(names)
+    os.replace(tmp_path, path)
+
+# Builds the index from exports, returns (domains, rows skipped)
+def build(paths, path=None):
+    global _loaded
+    ratings, skipped = read_exports(paths)
+    path = path or _path
+    # A loaded index would keep mapping the old file
+    with _lock:
+        if path == _path:
+            _close()
+            _loaded = False
+    write_index(ratings, path)
+    return len(ratings), skipped
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the ratings index")
+    parser.add_argument("--index", default=RATINGS_INDEX, help=f"index file (default {RATINGS_INDEX})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="compile CSV or JSON exports into the index")
+    build_parser.add_argument("exports", nargs="+", help="AllSides / MBFC style exports, earlier ones win, later ones fill in")
+    lookup_parser = commands.add_parser("lookup", help="show the rating a host or url resolves to")
+    lookup_parser.add_argument("hosts", nargs="+")
+    args = parser.parse_args()
+
+    configure(path=args.index)
+    if args.command == "build":
+        count, skipped = build(args.exports)
+        print(f"Saved {count} domains to {args.index} ({skipped} rows skipped)")
+        return
+    for host in args.hosts:
+        match = resolve(host)
+        if match is None:
+            print(f"{host}: not rated")
+        else:
+            domain, rating = match
+            print(f"{host}: {rating['rating']} ({rating['bias']}), credibility {rating['credibility']}/10 via {domain}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+import metrics
+from config import KEYWORDS, STORE_PATH
+
+"""
+Incremental per article result store (python main.py --store)
+
+Keeps the keyword counts for every article we've analyzed in SQLite, keyed by
+the article url and a hash of its content. When a re-run gets the same page
+back (or a 304 from the article cache) the saved counts are used and the page
+isn't parsed or counted again, so only new or changed articles cost anything.
+
+The counts are only valid for the keyword dictionary they were made with, so
+the store keeps a hash of KEYWORDS and empties itself when that changes.
+"""
+_path = STORE_PATH
+_enabled = False
+_conn = None
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    site TEXT,
+    chars INTEGER NOT NULL,
+    text_bytes INTEGER NOT NULL,
+    counts TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (url, content_hash)
+);
+CREATE INDEX IF NOT EXISTS articles_by_url ON articles (url, last_seen);
+"""
+
+# Hash of the keyword dictionary, any change to KEYWORDS changes it
+def keywords_hash(keyword_dict=KEYWORDS):
+    data = json.dumps(keyword_dict, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+# Turn the store on or off, or move it somewhere else
+def configure(enabled=None, path=None):
+    global _enabled, _path, _conn
+    with _lock:
+        if path is not None and path != _path:
+            _path = path
+            if _conn is not None:
+                _conn.close()
+                _conn = None
+        if enabled is not None:
+            _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+# Opens the database the first time it's needed, must hold _lock
+def _connect():
+    global _conn
+    if _conn is not None:
+        return _conn
+
+    os.makedirs(os.path.dirname(_path) or ".", exist_ok=True)
+    # Site threads share this connection, _lock makes sure only one uses it at a time
+    _conn = sqlite3.connect(_path, check_same_thread=False)
+    _conn.executescript(SCHEMA)
+
+    current = keywords_hash()
+    row = _conn.execute("SELECT value FROM meta WHERE key = 'keywords_hash'").fetchone()
+    if row is None or row[0] != current:
+        if row is not None:
+            print("Keywords changed since the last run, clearing the article store")
+        with _conn:
+            _conn.execute("DELETE FROM articles")
+            _conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('keywords_hash', ?)",
+                          (current,))
+    return _conn
+
+"""
+Hash that identifies a fetched page (see scraper.fetch_article)
+Downloaded pages are hashed by their bytes, pages that came back 304 only
+have the cached text so those get a text hash instead
+"""
+def content_hash(page):
+    if page['content'] is not None:
+        return hashlib.sha256(page['content']).hexdigest()
+    return "text:" + hashlib.sha256(page['text'].encode("utf-8")).hexdigest()
+
+def _record_from_row(url, row):
+    chars, text_bytes, counts = row
+    return {'url': url, 'chars': chars, 'text_bytes': text_bytes, 'counts': json.loads(counts)}
+
+"""
+Gets the saved record for a page, None if this content hasn't been analyzed yet
+A 304 means the page is the same as last time, so the newest row for the url is used
+"""
+def lookup(url, page, page_hash):
+    if not _enabled:
+        return None
+    with _lock:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT content_hash, chars, text_bytes, counts FROM articles WHERE url = ? AND content_hash = ?",
+            (url, page_hash)).fetchone()
+        if row is None and page['content'] is None:
+            row = conn.execute(
+                "SELECT content_hash, chars, text_bytes, counts FROM articles WHERE url = ? "
+                "ORDER BY last_seen DESC LIMIT 1", (url,)).fetchone()
+
+        if row is None:
+            _stats['misses'] += 1
+            return None
+
+        _stats['hits'] += 1
+        metrics.inc("store_hits_total", domain=urlparse(url).netloc.replace("www.", ""))
+        # Touch the row we used, on a 304 that's the newest row, not one for page_hash
+        with conn:
+            conn.execute("UPDATE articles SET last_seen = ? WHERE url = ? AND content_hash = ?",
+                         (time.time(), url, row[0]))
+    return _record_from_row(url, row[1:])
+
+# Saves the record for a page that was just analyzed
+def save(url, page_hash, site, record):
+    if not _enabled:
+        return
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO articles (url, content_hash, site, chars, text_bytes, counts, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (url, content_hash) DO UPDATE SET last_seen = excluded.last_seen",
+                (url, page_hash, site, record['chars'], record['text_bytes'],
+                 json.dumps(record['counts']), now, now))
+
+# Hits (articles we didn't have to analyze) and misses since the program started
+def store_stats():
+    with _lock:
+        return dict(_stats, enabled=_enabled)
+
+def close():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
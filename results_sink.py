@@ -0,0 +1,179 @@
+import csv
+import json
+import os
+
+from analyzer import bias_score_calc, scores_from_counts
+
+"""
+Results sinks (python main.py --results-file results.jsonl --article-results articles.jsonl)
+
+Writes every site result to a file as soon as it's analyzed, and optionally one
+row per article, so other jobs can read the results without parsing our console
+output. Rows are written one at a time (Parquet in small row groups), so the
+sink never holds more than a few rows no matter how many sites are crawled.
+
+The format comes from the file extension:
+.jsonl: one JSON object per line, keyword lists and counts stay JSON lists/objects
+.csv: same columns, the keyword lists and counts are JSON strings
+.parquet: same columns as CSV, needs pyarrow (pip install pyarrow)
+"""
+
+SITE_COLUMNS = ["url", "name", "known_bias", "bias_rating", "calculated_bias", "bias_ci_low", "bias_ci_high",
+                "reliability",
+                "left", "center", "right", "total_keywords", "keywords", "source"]
+ARTICLE_COLUMNS = ["site", "url", "chars", "text_bytes", "left", "center", "right",
+                   "calculated_bias", "counts"]
+
+# Column types for Parquet, anything that isn't listed is text
+FLOAT_COLUMNS = {"known_bias", "calculated_bias", "bias_ci_low", "bias_ci_high"}
+INT_COLUMNS = {"reliability", "left", "center", "right", "total_keywords", "chars", "text_bytes"}
+
+# Rows a Parquet file buffers before writing them out as a row group
+PARQUET_BATCH_ROWS = 1000
+
+# Result dict -> flat site row, the keyword lists are the only nested part left
+def site_row(result):
+    # Empty when the confidence intervals are turned off
+    low, high = result.get("bias_ci") or (None, None)
+    return {
+        "url": result["url"],
+        "name": result["name"],
+        "known_bias": result["known_bias"],
+        "bias_rating": result["bias_rating"],
+        "calculated_bias": result["calculated_bias"],
+        "bias_ci_low": low,
+        "bias_ci_high": high,
+        "reliability": result["reliability"],
+        "left": result["scores"]["left"],
+        "center": result["scores"]["center"],
+        "right": result["scores"]["right"],
+        "total_keywords": result["total_keywords"],
+        "keywords": result["keywords"],
+        "source": result["source"],
+    }
+
+# Article record from the scraper -> article row with its own scores and bias
+def article_row(site, record):
+    scores, _ = scores_from_counts(record["counts"])
+    return {
+        "site": site,
+        "url": record["url"],
+        "chars": record["chars"],
+        "text_bytes": record["text_bytes"],
+        "left": scores["left"],
+        "center": scores["center"],
+        "right": scores["right"],
+        "calculated_bias": bias_score_calc(scores),
+        "counts": record["counts"],
+    }
+
+# Dicts and lists don't fit in a CSV/Parquet cell, they're stored as JSON text
+def _flatten(row):
+    return {key: json.dumps(value) if isinstance(value, (dict, list)) else value
+            for key, value in row.items()}
+
+class JsonlWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", encoding="utf-8")
+        self.columns = columns
+
+    def write(self, row):
+        # Same keys in the same order as the CSV and Parquet columns
+        self.file.write(json.dumps({column: row.get(column) for column in self.columns}) + "\n")
+        # Flushed every row so anyone tailing the file sees results right away
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(_flatten(row))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow, install it with pip install pyarrow "
+                               "or use a .jsonl or .csv file") from None
+        self.pa = pyarrow
+        # A fixed schema, otherwise a batch where calculated_bias is always 0 would make it an int column
+        self.schema = pyarrow.schema([
+            (column, pyarrow.float64() if column in FLOAT_COLUMNS
+             else pyarrow.int64() if column in INT_COLUMNS else pyarrow.string())
+            for column in columns
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(_flatten(row))
+        if len(self.rows) >= PARQUET_BATCH_ROWS:
+            self._write_batch()
+
+    def _write_batch(self):
+        if not self.rows:
+            return
+        self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self._write_batch()
+        self.writer.close()
+
+WRITERS = {".jsonl": JsonlWriter, ".csv": CsvWriter, ".parquet": ParquetWriter}
+
+# Opens the writer that matches the file extension
+def open_writer(path, columns):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Unknown results format {extension}, use one of {', '.join(WRITERS)}")
+    return WRITERS[extension](path, columns)
+
+"""
+Writes site results and, if article_path is given, per article rows
+Articles only exist for sites scraped as records (--parse-workers, --store or
+--queue), sites scraped as one block of text have no article rows.
+"""
+class ResultsSink:
+    def __init__(self, site_path, article_path=None):
+        self.sites = open_writer(site_path, SITE_COLUMNS)
+        self.articles = open_writer(article_path, ARTICLE_COLUMNS) if article_path else None
+        self.site_path = site_path
+        self.article_path = article_path
+        self.site_rows = 0
+        self.article_rows = 0
+
+    # Writes one analyzed site, data is its scraped_data entry
+    def write_site(self, result, data=None):
+        self.sites.write(site_row(result))
+        self.site_rows += 1
+
+        if self.articles is not None and data is not None:
+            for record in data.get("articles", []):
+                self.articles.write(article_row(result["url"], record))
+                self.article_rows += 1
+
+    def close(self):
+        self.sites.close()
+        print(f"Results saved at {self.site_path} ({self.site_rows} sites)")
+        if self.articles is not None:
+            self.articles.close()
+            print(f"Article results saved at {self.article_path} ({self.article_rows} articles)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+import metrics
+import warc
+from config import CACHE_DIR, ROBOTS_CACHE_TTL, ROBOTS_RETRY_DELAY, ROBOTS_RETRY_MAX, USER_AGENT
+
+"""
+robots.txt cache that lives in memory and on disk
+
+Entries are keyed by scheme + netloc (https://www.npr.org) so the homepage and
+every article on a host share one robots.txt. An entry holds the robots.txt
+lines, the Crawl-delay for our user agent and when it was fetched, once it is
+older than ROBOTS_CACHE_TTL seconds it gets fetched again.
+
+How a fetch turns into rules (same idea as RobotFileParser.read() and RFC 9309)
+2xx/3xx: parse the file
+401/403: we aren't allowed to read robots.txt, so nothing is allowed
+other 4xx: there is no robots.txt, so everything is allowed
+5xx or no response: we can't tell what's allowed, so nothing is allowed,
+                    these are only kept in memory and only for
+                    ROBOTS_RETRY_DELAY seconds, doubled after every failure
+                    in a row up to ROBOTS_RETRY_MAX, so the host gets
+                    tried again soon instead of a day later
+
+The file is a log with one JSON entry per line, every new entry is appended
+so a crawl of thousands of hosts writes each robots.txt once instead of
+rewriting the whole cache every time. When an entry is fetched again the
+later line wins, the file gets compacted when it's loaded if most of its
+lines are old. Concurrent lookups for a host that isn't cached yet wait for
+the one request already fetching it.
+"""
+_entries = {}
+_parsers = {}
+_lock = threading.Lock()
+# Only held while appending to the file, so lookups don't wait on the disk
+_file_lock = threading.Lock()
+_inflight = {}   # key -> Event set once its fetch is done
+_loaded = False
+_path = os.path.join(CACHE_DIR, "robots.json")
+_ttl = ROBOTS_CACHE_TTL
+_retry_delay = ROBOTS_RETRY_DELAY
+_stats = {'hits': 0, 'misses': 0}
+
+# Change the cache file, the TTL or the first retry delay after a failed fetch (in seconds)
+def configure(path=None, ttl=None, retry_delay=None):
+    global _path, _ttl, _retry_delay, _loaded
+    with _lock:
+        if path is not None:
+            _path = path
+            _loaded = False
+            _entries.clear()
+            _parsers.clear()
+        if ttl is not None:
+            _ttl = ttl
+        if retry_delay is not None:
+            _retry_delay = retry_delay
+
+# Builds the cache key for a url, the robots.txt url is this plus /robots.txt
+def robots_key(url):
+    """
+    To construct a websites robots.txt URL you must combine a few things
+    First you need the scheme which like http or https
+    Then you need the netlock which is the domain with a subdomain like www.colliniscool.com
+    After you add the path which is robots.txt
+    """
+    parsed_url = urlparse(url)
+    return parsed_url.scheme + "://" + parsed_url.netloc
+
+# Reads the cache file the first time the cache is used, must hold _lock
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    lines = 0
+    # Old format or a cut off line, both get rewritten so new lines append cleanly
+    rewrite = False
+    try:
+        with open(_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    # A line cut off by a crash, the rest still counts
+                    rewrite = True
+                    continue
+                lines += 1
+                if 'url' in data:
+                    _entries[robots_key(data['url'])] = data
+                else:
+                    # Older caches were one JSON object of every entry
+                    _entries.update(data)
+                    rewrite = True
+    except OSError:
+        # No cache yet or it's unreadable, either way start empty
+        return
+    if rewrite or lines > 2 * len(_entries) + 100:
+        _compact()
+
+# Rewrites the file with only the latest line of every entry, must hold _lock
+def _compact():
+    os.makedirs(os.path.dirname(_path) or ".", exist_ok=True)
+    # Write to a temp file first so a crash can't leave half a cache behind
+    tmp_path = _path + ".tmp"
+    with _file_lock:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in _entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, _path)
+
+# Appends one entry we got a real answer for to the cache file at path
+def _save(entry, path):
+    line = json.dumps(entry) + "\n"
+    with _file_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+# Downloads robots.txt and turns the response into a cache entry
+def _fetch_entry(robots_url, fetch):
+    entry = {'url': robots_url, 'fetched_at': time.time(), 'lines': [],
+             'crawl_delay': None, 'rule': 'parse'}
+    try:
+        response = fetch(robots_url)
+        entry['status'] = response.status_code
+        warc.record_response(response, response.content)
+        if response.status_code in (401, 403):
+            entry['rule'] = 'disallow_all'
+        elif 400 <= response.status_code < 500:
+            entry['rule'] = 'allow_all'
+        elif response.status_code >= 500:
+            entry['rule'] = 'disallow_all'
+            entry['transient'] = True
+        else:
+            entry['lines'] = response.content.decode("utf-8", errors="replace").splitlines()
+    except requests.RequestException as e:
+        print(f"Could not fetch {robots_url}: {e}")
+        entry['status'] = None
+        entry['rule'] = 'disallow_all'
+        entry['transient'] = True
+
+    if entry['rule'] == 'parse':
+        entry['crawl_delay'] = _build_parser(entry).crawl_delay(USER_AGENT)
+    return entry
+
+# Whether an entry can still be used, failed fetches expire a lot sooner than the TTL
+def _is_fresh(entry, now):
+    if entry.get('transient'):
+        return now < entry['retry_at']
+    return now - entry['fetched_at'] < _ttl
+
+# Turns a cache entry back into a RobotFileParser
+def _build_parser(entry):
+    robots_parser = RobotFileParser(entry['url'])
+    if entry['rule'] == 'disallow_all':
+        robots_parser.disallow_all = True
+    elif entry['rule'] == 'allow_all':
+        robots_parser.allow_all = True
+    else:
+        robots_parser.parse(entry['lines'])
+    return robots_parser
+
+"""
+Gets the robots.txt entry for a urls host, fetching it with fetch(url) if we don't
+have a fresh one. fetch is passed in so the request goes through the scrapers
+limits and pooled sessions.
+"""
+def get_entry(url, fetch):
+    key = robots_key(url)
+    domain = urlparse(key).netloc.replace("www.", "")
+    while True:
+        with _lock:
+            _load()
+            entry = _entries.get(key)
+            if entry is not None and _is_fresh(entry, time.time()):
+                _stats['hits'] += 1
+                metrics.inc("robots_cache_hits_total", domain=domain)
+                return entry
+            fetching = _inflight.get(key)
+            if fetching is None:
+                fetching = _inflight[key] = threading.Event()
+                _stats['misses'] += 1
+                # The file the entry goes in, in case configure() moves the cache meanwhile
+                path = _path
+                failures = entry.get('failures', 0) if entry is not None and entry.get('transient') else 0
+                break
+        # Another thread is already fetching it, its entry will be a hit
+        fetching.wait()
+    metrics.inc("robots_cache_misses_total", domain=domain)
+
+    try:
+        entry = _fetch_entry(key + "/robots.txt", fetch)
+        if entry.get('transient'):
+            entry['failures'] = failures + 1
+            entry['retry_at'] = entry['fetched_at'] + min(_retry_delay * 2 ** failures, ROBOTS_RETRY_MAX)
+        with _lock:
+            _entries[key] = entry
+            _parsers.pop(key, None)
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        fetching.set()
+    if not entry.get('transient'):
+        _save(entry, path)
+    return entry
+
+# Checks if robots.txt lets us fetch the url
+def can_fetch(url, fetch):
+    entry = get_entry(url, fetch)
+    key = robots_key(url)
+    with _lock:
+        robots_parser = _parsers.get(key)
+        if robots_parser is None:
+            robots_parser = _parsers[key] = _build_parser(entry)
+    return robots_parser.can_fetch(USER_AGENT, url)
+
+# Crawl-delay in seconds robots.txt asks of us for the urls host, None if it doesn't say
+def crawl_delay(url, fetch):
+    return get_entry(url, fetch)['crawl_delay']
+
+# Sitemap urls robots.txt lists for the urls host, empty if it doesn't list any
+def sitemaps(url, fetch):
+    entry = get_entry(url, fetch)
+    return [line.split(":", 1)[1].strip() for line in entry['lines']
+            if line.strip().lower().startswith("sitemap:")]
+
+# Hit and miss counts since the program started
+def cache_stats():
+    with _lock:
+        return dict(_stats, entries=len(_entries))
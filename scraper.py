@@ -1,9 +1,38 @@
+import dedup
+import discovery
+import http_cache
+from analyzer import MATCHER, article_scores as score_article
+from extractor import extract_article_text
+from matcher import count_keywords
+from pipeline import process_article, recount_article
+import http_pool
+import metrics
+import politeness
+import ratings
 import requests
-from bs4 import BeautifulSoup
-import re
+import result_store
+import robots_cache
+import threading
+import urllib3
+from contextlib import contextmanager
+import time
+import warc
+from collections import deque
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from urllib.parse import urlparse, urljoin
-from config import MAX_CHARS, REQUEST_TIMEOUT, USER_AGENT, RATINGS, MBFC_CREDIBILITY
-from urllib.robotparser import RobotFileParser
+from config import MAX_CHARS, MAX_WORKERS, MAX_PER_HOST, MAX_RESPONSE_BYTES
+
+"""
+Request limits for concurrent scraping, these stay None when scraping one
+site at a time so the serial path doesn't pay for any locking
+_global_slots: caps how many requests are in flight at once
+_host_slots: one semaphore per host so we never hit a single site too hard
+"""
+_global_slots = None
+_host_slots = {}
+_host_limit = None
+_host_slots_lock = threading.Lock()
 
 # Method to get the domain from a given url
 def getDomain(url):
@@ -11,61 +40,227 @@ def getDomain(url):
     domain = parsed_url.netloc.replace("www.","")
     return domain
 
-# Checks for a robots.txt to file to make sure we can scrape
-def can_scrape(url):
+# Turn the request limits on, or off again by passing None
+def set_request_limits(max_workers, max_per_host):
+    global _global_slots, _host_limit, _host_slots
+    with _host_slots_lock:
+        _global_slots = threading.BoundedSemaphore(max_workers) if max_workers else None
+        _host_limit = max_per_host
+        _host_slots = {}
+
+"""
+Holds a global slot and a slot for the url's host while a request is made
+The host's crawl delay is waited out holding only the host slot, so the global
+slots keep going to hosts that are ready.
+"""
+@contextmanager
+def request_slot(url):
+    if _global_slots is None:
+        politeness.acquire(url)
+        yield
+        return
+
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(_host_limit)
+        host_slot = _host_slots[host]
+
+    # Take the host slot first so a busy host doesn't sit on global slots
+    with host_slot:
+        politeness.acquire(url)
+        with _global_slots:
+            yield
+
+# Responses worth trying again, the server is busy or having a moment
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Errors worth trying again, ChunkedEncodingError is a body that got cut off halfway
+RETRY_ERRORS = (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)
+
+# Reads a small error body before closing so the connection goes back to the pool
+def _discard(response):
+    size = 0
     try:
-        parsed_url = urlparse(url)
-
-        # Construct robots.txt URL, if you understand this ignore large comment
-        """
-        To construct a websites robots.txt URL you must combine a few things
-        First you need the scheme which like http or https
-        Then you need the netlock which is the domain with a subdomain like www.colliniscool.com
-        After you add the path which is robots.txt
-        """
-        robots_url = parsed_url.scheme + "://" + parsed_url.netloc + "/robots.txt"
-
-        # Create the robot parser
-        robots_parser = RobotFileParser()
-        robots_parser.set_url(robots_url)
-        robots_parser.read()
-
-        # Check if we are allowed to fetch the url, * is just so its generic
-        can_fetch = robots_parser.can_fetch("*",url)
-
-        if not can_fetch:
-            print(f"Warning for {url}: robots.txt does not allow scraping")
-
-        return can_fetch
-
-    except Exception as e:
-        print(f"No robots.txt for {url} proceeding as normal")
-        return True
-# Gets the bias rating from Allsides and credibility from MBFC
-def get_bias_cred(url):
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size >= MAX_RESPONSE_BYTES:
+                break
+    except requests.RequestException:
+        pass
+    response.close()
+
+"""
+Every request goes through here so the limits, the politeness rules and the
+pooled sessions apply everywhere
+read: the request is streamed and read(response) is called with the request's
+      slots still held, so the limits also cover reading the body. fetch then
+      returns what read returns instead of the response. read has to close
+      the response, if it raises the response gets closed for it.
+One attempt is the request plus read, so a body that stalls past the timeout
+or gets cut off is fetched again from the start like a failed request.
+Timeouts, connection errors, 429s and 5xx responses are retried up to
+politeness.max_retries() times. A 429/503 waits for its Retry-After (or a
+backoff) with the whole host paused, the rest back off just this request.
+Retries are waited out holding no slots. The last failure is returned (or
+handed to read) or raised like it would have been without retries.
+"""
+def fetch(url, headers=None, read=None):
+    if warc.is_replaying():
+        # Replaying an archive, nothing goes over the network
+        response = warc.replay_response(url)
+        return response if read is None else read(response)
+    attempt = 0
+    while True:
+        try:
+            response, result, wait = _fetch_once(url, headers, read, attempt)
+        except RETRY_ERRORS as e:
+            if attempt >= politeness.max_retries():
+                raise
+            reason = _error_reason(e)
+            wait = politeness.backoff(attempt)
+        else:
+            if wait is None:
+                return result
+            reason = str(response.status_code)
+            if response.status_code in (429, 503):
+                # The whole host is asking us to slow down, not just this url
+                politeness.pause(url, wait)
+                wait = 0
+
+        attempt += 1
+        politeness.note_retry(url, reason)
+        if wait > 0:
+            time.sleep(wait)
+
+# Retry reason for an error, a body read that times out comes back as a ConnectionError
+def _error_reason(error):
+    if isinstance(error, requests.Timeout) or isinstance(error.args[0] if error.args else None,
+                                                          urllib3.exceptions.ReadTimeoutError):
+        return "timeout"
+    if isinstance(error, requests.exceptions.ChunkedEncodingError):
+        return "body"
+    return "connection"
+
+# How long to wait before trying a response's request again, None if it shouldn't be
+def _retry_wait(response, attempt):
+    if response.status_code not in RETRY_STATUSES or attempt >= politeness.max_retries():
+        return None
+    wait = politeness.retry_after(response)
+    if wait is not None and politeness.too_long(wait):
+        return None
+    return politeness.backoff(attempt) if wait is None else wait
+
+"""
+One try at a request, under the request limits
+Returns (response, what fetch returns, seconds to wait before retrying or None).
+A response that's going to be retried is discarded while the slots are held.
+"""
+def _fetch_once(url, headers, read, attempt):
+    with request_slot(url):
+        response = _get(url, headers, read is not None)
+        wait = _retry_wait(response, attempt)
+        if wait is not None:
+            _discard(response)
+            return response, None, wait
+        if read is None:
+            return response, response, None
+        try:
+            return response, read(response), None
+        except BaseException:
+            response.close()
+            raise
+
+# The request itself, timed when metrics are on
+def _get(url, headers, stream):
+    if not metrics.is_enabled():
+        return http_pool.get(url, headers=headers, stream=stream)
+
+    # Latency is until the headers arrive, a streamed body is read after that by read
     domain = getDomain(url)
+    start = time.perf_counter()
+    try:
+        response = http_pool.get(url, headers=headers, stream=stream)
+    except Exception:
+        metrics.inc("http_errors_total", domain=domain)
+        raise
+    metrics.observe("http_request_seconds", time.perf_counter() - start, domain=domain)
+    metrics.inc("http_responses_total", domain=domain, status=response.status_code)
+    return response
+
+"""
+Reads a streamed response body but stops after max_bytes, so one giant page
+can't eat our bandwidth. Returns the body and how many bytes came over the wire
+(that can be less than the body if the server gzipped it).
+"""
+def read_body(response, max_bytes=MAX_RESPONSE_BYTES):
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    # If we stopped early this drops the connection instead of reading the rest
+    response.close()
+
+    tell = getattr(response.raw, "tell", None)
+    downloaded = tell() if tell else size
+    metrics.inc("http_bytes_total", downloaded, domain=getDomain(response.url))
+    body = b"".join(chunks)[:max_bytes]
+    warc.record_response(response, body, truncated=size >= max_bytes)
+    return body, downloaded
+
+# read= for fetch, the body of a response that isn't an error
+def _read_ok(response):
+    response.raise_for_status()
+    return read_body(response)
 
-    if domain in RATINGS:
-        bias_rating = RATINGS[domain]
-        """
-        Default credibility is gonna set it to 5 if it cant be found
-        the logic behind this is that 5 is right in the center so it
-        shouldn't skew a website unrated by the MBFC either way
-        """
-        cred = MBFC_CREDIBILITY.get(domain, 5)
-
-        return {
-            'bias': bias_rating['bias'],
-            'rating': bias_rating['rating'],
-            'credibility': cred,
-            'source': "AllSides and MBFC"
-        }
+# Checks for a robots.txt to file to make sure we can scrape
+def can_scrape(url):
+    """
+    robots.txt comes from robots_cache, so it's only downloaded once per host
+    and then reused for the homepage and every article until it expires
+    """
+    with metrics.stage("robots"):
+        can_fetch = robots_cache.can_fetch(url, fetch)
+        # The first time we see a host its Crawl-delay sets how fast we can go
+        if not politeness.is_seeded(url):
+            politeness.set_crawl_delay(url, robots_cache.crawl_delay(url, fetch))
+
+    if not can_fetch:
+        print(f"Warning for {url}: robots.txt does not allow scraping")
+
+    return can_fetch
+
+"""
+Gets the bias rating from Allsides and credibility from MBFC
+Subdomains get their parent's rating (edition.cnn.com is rated as cnn.com), see ratings.py
+"""
+def get_bias_cred(url):
+    match = ratings.resolve(url)
     # If it cant be found then theres nothing to return
-    return None
+    if match is None:
+        return None
+
+    _, rating = match
+    return {
+        'bias': rating['bias'],
+        'rating': rating['rating'],
+        'credibility': rating['credibility'],
+        'source': "AllSides and MBFC"
+    }
+
+# Parts of a url that mean a homepage link goes to an article
+ARTICLE_INDICATORS = (
+    "/article/", "/story/", "/news/", "/politics/",
+    "/opinion/", "/world/", "/us/", "/national/",
+    "/investigation/", "/analysis/", "/commentary/"
+)
 
 # Get article links from a websites homepage
 def extract_article_links(url, soup, max_articles=7):
     links = []
+    seen = set()
     domain = getDomain(url)
     parsed_url = urlparse(url)
 
@@ -78,132 +273,477 @@ def extract_article_links(url, soup, max_articles=7):
         elif not href.startswith("http"):
             continue
 
-        # If link isn't from same domain, don't include it
-        article_indicators = [
-            "/article/", "/story/", "/news/", "/politics/",
-            "/opinion/", "/world/", "/us/", "/national/",
-            "/investigation/", "/analysis/", "/commentary/"
-        ]
-
-        if any(indicator in href.lower() for indicator in article_indicators):
-            if href not in links and "#" not in href:
+        if any(indicator in href.lower() for indicator in ARTICLE_INDICATORS):
+            # A set for the dedup, checking the links list is slow on big homepages
+            if href not in seen and "#" not in href and can_scrape(href):
+                seen.add(href)
                 links.append(href)
                 if len(links) >= max_articles:
                     break
     return links
 
-# Scrape a single article
-def scrape_article(url):
-    try:
-        # Here we have to set the User-Agent header to mimic a real browser or it might get blocked
-        headers = {'User-Agent': USER_AGENT}
+"""
+Fetches an article page without parsing it, the result is a dict with
+content: the raw page bytes, None if the cached text can be used
+text: the cached text when the server said the page didn't change (304)
+etag/last_modified: validators for the article cache
+downloaded: bytes that came over the wire
+"""
+def fetch_article(url):
+    """
+    If we have this article cached the request asks the server to only send
+    it if it changed, a 304 means it didn't so we can reuse the saved text
+    """
+    with metrics.stage("article_fetch"):
+        if warc.is_replaying():
+            # Archived as text when it came back 304 at the time
+            text = warc.replay_text(url)
+            if text is not None:
+                return {'content': None, 'text': text, 'downloaded': 0}
+        cached = http_cache.lookup(url)
+
+        def read(response):
+            if response.status_code == 304 and cached is not None:
+                response.close()
+                return None
+            content, downloaded = _read_ok(response)
+            return {
+                'content': content,
+                'text': None,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'downloaded': downloaded,
+            }
+
         # Make an HTTP GET request and check for error
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        """
-        This removes specfic elements that we dont need to search
-        script: No need to search any javascript elements as that just adds 
-                website interaction
-        style: How the website is stylized typically has little to do
-               with a websites politics
-        header/footer: Typically websites aren't using the header and footer
-                       for meaningful content
-        nav: The nav bar is typically just meant for user navigation, no need
-             to look there
-        aside: Used for content not related to article so no need for it
-        """
-        for element in soup(["script", "style", "header", "footer", "nav", "aside"]):
-            element.decompose()
-
-        article_content = None
-
-        # Try multiple common HTML patterns in order to locate main content
-        article_selectors = [
-            soup.find("article"), # Article tag, used by most modern sites
-            soup.find("div", class_=re.compile(r"article|story|content", re.I)), # Div elements with article, story, or content class names
-            soup.find("div", id=re.compile(r"article|story|content", re.I)), # Div elements with IDs article, story, content
-        ]
-
-        for selector in article_selectors:
-            if selector:
-                article_content = selector
-                break
-        if article_content:
-            text = article_content.get_text()
-        # Fallback to all paragraphs
-        else:
-            paragraphs = soup.find_all("p")
-            text = " ".join([p.get_text() for p in paragraphs])
+        page = fetch(url, headers=http_cache.conditional_headers(cached), read=read)
+        if page is None:
+            warc.record_text(url, cached['text'])
+            return {'content': None, 'text': cached['text'], 'downloaded': 0}
+    return page
+
+# Scrape a single article, returns the text and how many bytes were downloaded for it
+def _scrape_article(url):
+    try:
+        page = fetch_article(url)
+        if page['content'] is None:
+            http_cache.mark_hit(url)
+            return page['text'], 0
 
-        # Replace whitespace with single spaces and remove leading/trailing whitespace also limit char
-        text = re.sub(r'\s+',' ', text).strip()
-        return text.lower()
+        with metrics.stage("parse"):
+            text = extract_article_text(page['content'])
+        written = http_cache.write_entry(url, page['etag'], page['last_modified'], text)
+        http_cache.note_store(url, written)
+        return text, page['downloaded']
 
     except Exception as e:
         print(f"Error in scrape article on website {url}: {e}")
-        return ""
+        return "", 0
 
-# Scrape homepage plus mutiple articles
-def scrape_multi_article(url, num_articles=7):
-    try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+# Scrape a single article
+def scrape_article(url):
+    return _scrape_article(url)[0]
+
+# With dedup on, an article we've already seen on this or another site gets skipped
+def _is_duplicate(article_url, site, fingerprint):
+    duplicate = dedup.check(article_url, site, fingerprint)
+    if duplicate is None:
+        return False
+    print(f"Skipping {article_url}: {duplicate['kind']} duplicate of {duplicate['duplicate_of']}")
+    return True
+
+"""
+Gets article links for a site, also returns the bytes downloaded for them
+Feeds and sitemaps are tried first (see discovery.py), they're smaller than the
+homepage and only list articles, the homepage is the fallback.
+"""
+def fetch_article_links(url, num_articles=7):
+    downloaded = 0
+    if discovery.is_enabled():
+        with metrics.stage("discovery"):
+            article_links, downloaded = discovery.discover_article_links(url, num_articles, fetch, can_scrape)
+        if article_links:
+            print(f"Found {len(article_links)} articles in feeds and sitemaps")
+            return article_links, downloaded
+
+    with metrics.stage("homepage"):
+        content, homepage_bytes = fetch(url, read=_read_ok)
+        downloaded += homepage_bytes
+        # Imported here so modules that only use the fetch helpers don't load bs4
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(content, 'html.parser')
 
         # Get article links
         article_links = extract_article_links(url, soup, max_articles=num_articles)
-        print(f"Found {len(article_links)} articles")
-
-        all_text = ""
-
-        # Scrape each article
+    print(f"Found {len(article_links)} articles")
+    return article_links, downloaded
+
+"""
+Scrapes a site's articles and hands each one's text to keep(text) right away
+Articles are only fetched until the site has MAX_CHARS * 10 characters of text,
+anything after that would be cut off anyway. The text keep gets is already cut
+to the room that's left, the same place joining every article would cut it.
+Returns (characters kept, bytes downloaded for the homepage and articles).
+"""
+def _scrape_articles(url, num_articles, executor, keep):
+    budget = MAX_CHARS * 10
+    article_links, downloaded = fetch_article_links(url, num_articles)
+    # Length of the site text so far, every article gets a space in front
+    collected = 0
+
+    def use(article_url, article_text):
+        nonlocal collected
+        if dedup.is_enabled() and _is_duplicate(article_url, url, dedup.fingerprint(article_text)):
+            return
+        keep(article_text[:max(budget - collected - 1, 0)])
+        collected += len(article_text) + 1
+
+    """
+    With an executor a few articles are fetched at the same time, only as many as
+    the host limit lets run, so we can stop as soon as the budget is met instead
+    of having every article already downloaded. Results are used in link order.
+    """
+    if executor is not None:
+        window = max(_host_limit or MAX_PER_HOST, 1)
+        pending = deque()
+        links = iter(article_links)
+        while True:
+            while len(pending) < window and collected < budget:
+                article_url = next(links, None)
+                if article_url is None:
+                    break
+                pending.append((article_url, executor.submit(_scrape_article, article_url)))
+            if not pending:
+                break
+            article_url, future = pending.popleft()
+            article_text, article_bytes = future.result()
+            downloaded += article_bytes
+            if article_text and collected < budget:
+                use(article_url, article_text)
+    else:
         for i, article_url in enumerate(article_links,1):
+            if collected >= budget:
+                print(f"Got enough text, skipping the last {len(article_links) - i + 1} articles")
+                break
             print(f"Scraping article {i}/{len(article_links)}")
-            article_text = scrape_article(article_url)
+            article_text, article_bytes = _scrape_article(article_url)
+            downloaded += article_bytes
             if article_text:
-                all_text += " " + article_text
+                use(article_url, article_text)
+
+    return min(collected, budget), downloaded
+
+"""
+Scrape homepage plus mutiple articles, returns the site text
+If stats is passed it gets filled with bytes_downloaded (homepage and articles)
+and bytes_used (the text we kept).
+"""
+def scrape_multi_article(url, num_articles=7, executor=None, stats=None, starts=None):
+    downloaded = 0
+    # Parts get joined once at the end, adding to one string each time copies everything again
+    parts = []
+    try:
+        _, downloaded = _scrape_articles(url, num_articles, executor, parts.append)
 
         # Increased text limit for multiple articles
-        return all_text[:MAX_CHARS * 10]
+        all_text = (" " + " ".join(parts) if parts else "")[:MAX_CHARS * 10]
+
+        # Where every article begins in the site text, its space in front included
+        if starts is not None:
+            offset = 0
+            for part in parts:
+                if part and offset < len(all_text):
+                    starts.append(offset)
+                offset += len(part) + 1
 
     except Exception as e:
         print(f"Error in scrape article on website {url}: {e}")
-        return ""
+        all_text = ""
+        if starts is not None:
+            starts.clear()
+
+    if stats is not None:
+        stats['bytes_downloaded'] = downloaded
+        stats['bytes_used'] = len(all_text.encode("utf-8"))
+    return all_text
+
+"""
+Fold version of scrape_multi_article (python main.py --fold)
+Every article's keywords are counted as soon as it's scraped and then its text
+is dropped, so a site only ever holds one article plus a running count per
+keyword instead of up to MAX_CHARS * 10 characters of text.
+Returns (keyword counts, characters of text they came from).
+Counts match counting the joined site text, except a keyword phrase can't
+start at the end of one article and finish at the start of the next.
+With article_scores every article's (left, center, right) hits get added to it.
+"""
+def scrape_multi_article_counts(url, num_articles=7, executor=None, stats=None, article_scores=None):
+    counts = Counter()
+    downloaded = 0
+    used = 0
+
+    def count(text):
+        nonlocal used
+        with metrics.stage("analyze"):
+            article_counts = count_keywords(MATCHER, text)
+            counts.update(article_counts)
+        # Plus the space that would go in front of it in the site text
+        if text:
+            used += len(text.encode("utf-8")) + 1
+            if article_scores is not None:
+                article_scores.append(score_article(article_counts))
 
-# Scrape multiple websites
-def scrape_mutiple(websites):
-    scraped_data = {}
+    try:
+        chars, downloaded = _scrape_articles(url, num_articles, executor, count)
+    except Exception as e:
+        print(f"Error in scrape article on website {url}: {e}")
+        counts, chars, used = Counter(), 0, 0
+        if article_scores is not None:
+            article_scores.clear()
 
-    for website in websites:
-            print(f"Scraping {website}")
+    if stats is not None:
+        stats['bytes_downloaded'] = downloaded
+        stats['bytes_used'] = used
+    return dict(counts), chars
 
-            # Check robots.txt for scraping permissions
-            if not can_scrape(website):
-                print(f"Skipping {website}: Robots.txt disallows scraping")
-                continue
+# fetch_article that prints the error and returns None instead of raising
+def _fetch_article_safe(url):
+    try:
+        return fetch_article(url)
+    except Exception as e:
+        print(f"Error in scrape article on website {url}: {e}")
+        return None
+
+"""
+executor.map that only keeps window calls running at once, results come back in order
+A site's article fetches can't go faster than its host slots anyway, queueing
+them all up front would only tie up threads the other sites could use.
+"""
+def _windowed_map(executor, func, items, window):
+    pending = deque()
+    items = iter(items)
+    while True:
+        while len(pending) < window:
+            item = next(items, None)
+            if item is None:
+                break
+            pending.append(executor.submit(func, item))
+        if not pending:
+            return
+        yield pending.popleft().result()
+
+# Runs func right away but hands back a Future, so inline work looks like pool work
+def _run_now(func, *args):
+    future = Future()
+    future.set_result(func(*args))
+    return future
+
+"""
+Record version of scrape_multi_article, it returns one small record per article
+with its keyword counts instead of the site text. Used for pipeline mode and
+the article store.
+parse_pool: pages are parsed and counted by worker processes (see pipeline.py),
+            as soon as they're downloaded so parsing overlaps with fetching
+            the next page, without it they're processed right here
+result_store: when it's on, pages it already has counts for are skipped
+With dedup on, articles that are copies of one seen before are left out.
+Since the text length is only known after parsing, every link gets fetched,
+records past the MAX_CHARS * 10 budget are dropped and the article that fills
+it up is counted again with only the room that was left, like _scrape_articles.
+"""
+def scrape_multi_article_records(url, parse_pool=None, num_articles=7, executor=None, stats=None):
+    budget = MAX_CHARS * 10
+    downloaded = 0
+    records = []
+    try:
+        article_links, downloaded = fetch_article_links(url, num_articles)
 
-            bias_info = get_bias_cred(website)
+        if executor is not None:
+            pages = _windowed_map(executor, _fetch_article_safe, article_links, max(_host_limit or MAX_PER_HOST, 1))
+        else:
+            # A generator so each page goes to the pool before the next one is fetched
+            pages = (_fetch_article_safe(article_url) for article_url in article_links)
 
-            if bias_info is None:
-                # No need to stop completely, just send a warning and move on
-                print(f"Warning for {website}: No bias rating found")
+        parse_jobs = []
+        for article_url, page in zip(article_links, pages):
+            if page is None:
                 continue
+            downloaded += page['downloaded']
+
+            page_hash = result_store.content_hash(page) if result_store.is_enabled() else None
+            record = result_store.lookup(article_url, page, page_hash)
+            if record is not None:
+                record.update(written=False, stored=True)
+                future = _run_now(dict, record)
+            elif parse_pool is not None:
+                future = parse_pool.submit(process_article, article_url, page, budget, dedup.is_enabled())
+            else:
+                future = _run_now(process_article, article_url, page, budget, dedup.is_enabled())
+            parse_jobs.append((article_url, page, page_hash, future))
+
+        collected = 0
+        for article_url, page, page_hash, future in parse_jobs:
+            record = future.result()
+            written = record.pop('written')
+            if page['content'] is None:
+                http_cache.mark_hit(article_url)
+            else:
+                http_cache.note_store(article_url, written)
+            if not record.pop('stored', False):
+                result_store.save(article_url, page_hash, url, record)
+
+            # Store hits have no text to fingerprint, the saved index may still know them
+            fingerprint = record.pop('fingerprint', None)
+            if record['chars'] and collected < budget:
+                if dedup.is_enabled() and _is_duplicate(article_url, url,
+                                                        fingerprint or dedup.fingerprint_for(article_url)):
+                    continue
+                chars = record['chars']
+                # Every article gets a space in front, same cut as the joined site text
+                room = budget - collected - 1
+                if chars > room:
+                    record = recount_article(article_url, page, max(room, 0))
+                if record['chars']:
+                    records.append(record)
+                collected += chars + 1
 
-            # Scrape text
-            text = scrape_multi_article(website, num_articles=7)
+    except Exception as e:
+        print(f"Error in scrape article on website {url}: {e}")
 
-            if text:
-                scraped_data[website] = {
-                    'text': text,
-                    'bias_info': bias_info
-                }
-                print(f"Rating found for {website}: {bias_info['rating']} Credibility: {bias_info['credibility']}/10")
-                print(f"  Collected {len(text)} characters of text")
-            else:
-                print(f"Failed to scrape any content")
+    if stats is not None:
+        stats['bytes_downloaded'] = downloaded
+        stats['bytes_used'] = sum(record['text_bytes'] for record in records)
+    return records
+
+"""
+Scrape one website, returns its scraped data or None if it got skipped
+The data has the site's 'text' and 'article_starts', or with fold=True its
+keyword 'counts', 'chars' and 'article_scores', or its 'articles' records with
+a parse_pool or the article store. The per article parts are what the bias
+confidence intervals resample.
+"""
+def scrape_site(website, executor=None, parse_pool=None, fold=False):
+    print(f"Scraping {website}")
+
+    # Checked first so an unrated site doesn't cost a robots.txt request
+    bias_info = get_bias_cred(website)
+
+    if bias_info is None:
+        # No need to stop completely, just send a warning and move on
+        print(f"Warning for {website}: No bias rating found")
+        return None
+
+    # Check robots.txt for scraping permissions
+    if not can_scrape(website):
+        print(f"Skipping {website}: Robots.txt disallows scraping")
+        return None
+
+    stats = {}
+    if parse_pool is not None or result_store.is_enabled():
+        # Pipeline mode or the article store, the keywords are already counted
+        records = scrape_multi_article_records(website, parse_pool, num_articles=7,
+                                               executor=executor, stats=stats)
+        if not records:
+            print(f"Failed to scrape any content")
+            return None
+
+        print(f"Rating found for {website}: {bias_info['rating']} Credibility: {bias_info['credibility']}/10")
+        print(f"  Collected {sum(record['chars'] for record in records)} characters of text")
+        print(f"  Downloaded {stats['bytes_downloaded']} bytes, used {stats['bytes_used']} bytes of text")
+        return {
+            'articles': records,
+            'bias_info': bias_info,
+            'stats': stats
+        }
 
-    return scraped_data
\ No newline at end of file
+    if fold:
+        per_article = []
+        counts, chars = scrape_multi_article_counts(website, num_articles=7, executor=executor, stats=stats,
+                                                    article_scores=per_article)
+        if not chars:
+            print(f"Failed to scrape any content")
+            return None
+
+        print(f"Rating found for {website}: {bias_info['rating']} Credibility: {bias_info['credibility']}/10")
+        print(f"  Collected {chars} characters of text")
+        print(f"  Downloaded {stats['bytes_downloaded']} bytes, used {stats['bytes_used']} bytes of text")
+        return {
+            'counts': counts,
+            'chars': chars,
+            'article_scores': per_article,
+            'bias_info': bias_info,
+            'stats': stats
+        }
+
+    # Scrape text
+    starts = []
+    text = scrape_multi_article(website, num_articles=7, executor=executor, stats=stats, starts=starts)
+
+    if text:
+        print(f"Rating found for {website}: {bias_info['rating']} Credibility: {bias_info['credibility']}/10")
+        print(f"  Collected {len(text)} characters of text")
+        print(f"  Downloaded {stats['bytes_downloaded']} bytes, used {stats['bytes_used']} bytes of text")
+        return {
+            'text': text,
+            'article_starts': starts,
+            'bias_info': bias_info,
+            'stats': stats
+        }
+    else:
+        print(f"Failed to scrape any content")
+        return None
+
+"""
+Scrape multiple websites, yielding (website, data) for every site that could be
+scraped, in the same order as websites, so the caller can use each site as soon
+as it's done and then let go of it. The site's pooled session is closed once
+it's done too.
+With concurrent=True sites are scraped at the same time on a thread pool,
+max_workers caps how many requests are in flight overall and max_per_host
+how many go to the same site. window caps how many sites are being scraped or
+waiting to be picked up at once, None queues every site straight away.
+With a parse_pool (pipeline.start_parse_pool) or the article store turned on
+sites get 'articles' records with keyword counts instead of 'text', with
+fold=True they get their keyword 'counts', analyze_site handles all of them.
+"""
+def iter_scrape_sites(websites, concurrent=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                      parse_pool=None, window=None, fold=False):
+    if not concurrent:
+        for website in websites:
+            data = scrape_site(website, parse_pool=parse_pool, fold=fold)
+            http_pool.close_host(website)
+            if data:
+                yield website, data
+        return
+
+    """
+    Sites and articles get separate pools, a site waits on its articles so if
+    they shared one pool the sites could take every thread and never finish
+    """
+    set_request_limits(max_workers, max_per_host)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as site_pool, \
+                ThreadPoolExecutor(max_workers=max_workers) as article_pool:
+            pending = deque()
+            sites = iter(websites)
+            while True:
+                while window is None or len(pending) < window:
+                    website = next(sites, None)
+                    if website is None:
+                        break
+                    pending.append((website, site_pool.submit(scrape_site, website, article_pool, parse_pool, fold)))
+                if not pending:
+                    break
+                website, future = pending.popleft()
+                data = future.result()
+                http_pool.close_host(website)
+                if data:
+                    yield website, data
+    finally:
+        set_request_limits(None, None)
+
+# Scrape multiple websites, returns scraped_data with every site in the same order as websites
+def scrape_mutiple(websites, concurrent=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                   parse_pool=None, fold=False):
+    return dict(iter_scrape_sites(websites, concurrent=concurrent, max_workers=max_workers,
+                                  max_per_host=max_per_host, parse_pool=parse_pool, fold=fold))
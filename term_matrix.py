@@ -0,0 +1,200 @@
+from itertools import chain, repeat
+
+import numpy as np
+from urllib.parse import urlparse
+
+import metrics
+from analyzer import MATCHER, bootstrap_bias_ci, bootstrap_samples
+from config import KEYWORDS
+from matcher import count_keywords, count_keywords_by_piece
+
+"""
+Document-term matrix analysis (python main.py --matrix)
+
+analyze_all_sites works one site at a time with dicts. This does the same
+analysis for every site at once with NumPy: every article (or the site text or
+--fold counts, when a site has no article records) becomes a row of a documents x keywords
+count matrix, and the category scores, calculated bias and known vs calculated
+differences all come out of a few array operations on it. The results list is
+the same one analyze_all_sites makes, so print_results and the visualizer
+don't know the difference.
+"""
+
+# Categories in the order the bias formula uses them
+CATEGORIES = ("left", "center", "right")
+
+"""
+Keyword -> category index for a {category: [keywords]} dictionary
+keywords: every keyword, in dictionary order (that's the order found keywords are listed in)
+columns: keyword -> column in the count matrix
+membership: keywords x categories 0/1 matrix, count matrix @ membership gives the category scores
+"""
+def build_index(keyword_dict=KEYWORDS):
+    keywords = [kw for category in CATEGORIES for kw in keyword_dict.get(category, [])]
+    columns = {}
+    for keyword in keywords:
+        columns.setdefault(keyword, len(columns))
+    membership = np.zeros((len(columns), len(CATEGORIES)), dtype=np.int64)
+    for c, category in enumerate(CATEGORIES):
+        for keyword in keyword_dict.get(category, []):
+            membership[columns[keyword], c] = 1
+    return {
+        'keywords': list(columns),
+        'columns': columns,
+        'membership': membership,
+    }
+
+INDEX = build_index()
+
+"""
+Builds the documents x keywords count matrix for scraped_data
+Returns the matrix, the site each row belongs to (as an index into sites) and the sites.
+The rows of a site are next to each other, in site order.
+
+The counts dicts are flattened into one array of columns and one of counts with
+np.fromiter, so the loop over keywords runs in C, and then written into the
+matrix with a single fancy index assignment instead of row by row.
+Keywords that aren't in the index go to a spare last column that gets dropped.
+"""
+def build_matrix(sdata, index=INDEX):
+    columns = index['columns']
+    spare = len(columns)
+    sites = list(sdata)
+    documents = []
+    doc_sites = []
+
+    for s, url in enumerate(sites):
+        data = sdata[url]
+        if "articles" in data:
+            documents.extend(article["counts"] for article in data["articles"])
+            doc_sites.extend(repeat(s, len(data["articles"])))
+        elif "counts" in data:
+            documents.append(data["counts"])
+            doc_sites.append(s)
+        elif data.get("article_starts"):
+            # Site text with its article offsets, every article gets its own row
+            with metrics.stage("analyze"):
+                pieces = count_keywords_by_piece(MATCHER, data["text"], data["article_starts"])
+            documents.extend(pieces)
+            doc_sites.extend(repeat(s, len(pieces)))
+        else:
+            with metrics.stage("analyze"):
+                documents.append(count_keywords(MATCHER, data["text"]))
+            doc_sites.append(s)
+
+    lengths = np.fromiter(map(len, documents), dtype=np.intp, count=len(documents))
+    entries = int(lengths.sum())
+    cols = np.fromiter(map(columns.get, chain.from_iterable(documents), repeat(spare)),
+                       dtype=np.intp, count=entries)
+    values = np.fromiter(chain.from_iterable(map(dict.values, documents)), dtype=np.int64, count=entries)
+    rows = np.repeat(np.arange(len(documents)), lengths)
+
+    matrix = np.zeros((len(documents), spare + 1), dtype=np.int64)
+    matrix[rows, cols] = values
+    return matrix[:, :spare], np.asarray(doc_sites, dtype=np.intp), sites
+
+"""
+Runs the whole analysis on the matrix, returns a dict of arrays with one row per site
+counts: documents x keywords, doc_sites: site of every document
+keyword_counts: sites x keywords, how often every keyword was found on a site
+keyword_frequency: keywords, how often every keyword was found over all sites
+scores: sites x categories, calculated_bias / known_bias / delta: one value per site
+bias_ci: sites x 2, the low and high end of every site's confidence interval,
+         None when they're turned off
+"""
+def analyze_matrix(sdata, index=INDEX):
+    matrix, doc_sites, sites = build_matrix(sdata, index)
+
+    with metrics.stage("analyze"):
+        # Sum the documents of every site, a site's rows are next to each other so
+        # reduceat can add each block up, sites without rows stay at 0
+        keyword_counts = np.zeros((len(sites), matrix.shape[1]), dtype=np.int64)
+        has_rows = np.bincount(doc_sites, minlength=len(sites)) > 0
+        if has_rows.any():
+            starts = np.searchsorted(doc_sites, np.flatnonzero(has_rows))
+            keyword_counts[has_rows] = np.add.reduceat(matrix, starts, axis=0)
+
+        scores = keyword_counts @ index['membership']
+        left = scores[:, CATEGORIES.index("left")]
+        right = scores[:, CATEGORIES.index("right")]
+        total = scores.sum(axis=1)
+
+        # Same -5 to +5 scale as bias_score_calc, sites without keywords get 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            calculated_bias = np.where(total > 0, (right - left) / total * 5, 0.0)
+        known_bias = np.array([sdata[url]["bias_info"]["bias"] for url in sites], dtype=np.float64)
+
+    bias_ci = None
+    if bootstrap_samples() and sites:
+        with metrics.stage("bootstrap"):
+            bias_ci = np.array(bootstrap_bias_ci(site_article_scores(sdata, sites, matrix, doc_sites, scores, index)))
+
+    return {
+        'sites': sites,
+        'keywords': index['keywords'],
+        'counts': matrix,
+        'doc_sites': doc_sites,
+        'keyword_counts': keyword_counts,
+        'keyword_frequency': keyword_counts.sum(axis=0),
+        'scores': scores,
+        'total_keywords': total,
+        'calculated_bias': calculated_bias,
+        'known_bias': known_bias,
+        'delta': calculated_bias - known_bias,
+        'bias_ci': bias_ci,
+    }
+
+"""
+Every site's per article (left, center, right) hits for bootstrap_bias_ci
+The category hits of every document come from one matrix product, --fold sites
+only have one row so theirs come from the 'article_scores' they were scraped
+with. A site with nothing per article counts as one article.
+"""
+def site_article_scores(sdata, sites, matrix, doc_sites, scores, index=INDEX):
+    doc_scores = (matrix @ index['membership']).tolist()
+    per_site = [[] for _ in sites]
+    for s, row in zip(doc_sites.tolist(), doc_scores):
+        per_site[s].append(row)
+    for s, url in enumerate(sites):
+        if "counts" in sdata[url] and sdata[url].get("article_scores"):
+            per_site[s] = sdata[url]["article_scores"]
+        elif not per_site[s]:
+            per_site[s] = [scores[s].tolist()]
+    return per_site
+
+# Turns the arrays back into the results list print_results and the visualizer use
+def results_from_analysis(sdata, analysis, index=INDEX):
+    keywords = index['keywords']
+    membership = index['membership']
+    results = []
+
+    for s, url in enumerate(analysis['sites']):
+        bias_info = sdata[url]["bias_info"]
+        found = analysis['keyword_counts'][s] > 0
+        scores = {category: int(analysis['scores'][s, c]) for c, category in enumerate(CATEGORIES)}
+        found_keywords = {
+            category: [keywords[k] for k in np.flatnonzero(found & (membership[:, c] > 0))]
+            for c, category in enumerate(CATEGORIES)
+        }
+        # bias_score_calc returns an int 0 when there are no keywords, keep that
+        total = int(analysis['total_keywords'][s])
+        calculated_bias = float(analysis['calculated_bias'][s]) if total else 0
+
+        results.append({
+            "url": url,
+            "name": urlparse(url).netloc.replace("www.", ""),
+            "known_bias": bias_info["bias"],
+            "bias_rating": bias_info["rating"],
+            "calculated_bias": calculated_bias,
+            "bias_ci": None if analysis['bias_ci'] is None else analysis['bias_ci'][s].tolist(),
+            "reliability": bias_info["credibility"],
+            "scores": scores,
+            "keywords": found_keywords,
+            "total_keywords": total,
+            "source": bias_info["source"]
+        })
+    return results
+
+# Matrix version of analyzer.analyze_all_sites, returns the same results list
+def analyze_all_sites_matrix(sdata):
+    return results_from_analysis(sdata, analyze_matrix(sdata))
@@ -0,0 +1,55 @@
+"""
+Article discovery from feeds and sitemaps (discovery.py)
+"""
+import discovery
+import robots_cache
+
+SITE = "https://www.example.test"
+
+def index_entry(url, at):
+    return ("sitemap", url, at)
+
+def article(n, at=None):
+    return ("article", f"{SITE}/politics/2026/story-{n}", at)
+
+def discover(monkeypatch, sources, allowed=lambda url: True):
+    fetched = []
+
+    def read_source(source_url, fetch):
+        fetched.append(source_url)
+        return sources.get(source_url, []), 0
+    monkeypatch.setattr(discovery, "_read_source", read_source)
+    monkeypatch.setattr(robots_cache, "sitemaps", lambda url, fetch: [f"{SITE}/sitemap.xml"])
+    links, _ = discovery.discover_article_links(SITE, 10, None, allowed)
+    return links, fetched
+
+def test_child_sitemaps_are_read_newest_first(monkeypatch):
+    sources = {
+        f"{SITE}/sitemap.xml": [index_entry(f"{SITE}/sitemap-old.xml", 1), index_entry(f"{SITE}/sitemap-new.xml", 2)],
+        f"{SITE}/sitemap-old.xml": [article(1, 1)],
+        f"{SITE}/sitemap-new.xml": [article(2, 2)],
+    }
+    links, fetched = discover(monkeypatch, sources)
+    assert fetched == [f"{SITE}/sitemap.xml", f"{SITE}/sitemap-new.xml", f"{SITE}/sitemap-old.xml"]
+    assert links == [article(2)[1], article(1)[1]]
+
+def test_child_sitemaps_on_other_sites_are_skipped(monkeypatch):
+    sources = {
+        f"{SITE}/sitemap.xml": [index_entry("https://tracker.test/sitemap.xml", 2),
+                                index_entry(f"{SITE}/news/sitemap.xml", 1)],
+        f"{SITE}/news/sitemap.xml": [article(1)],
+    }
+    links, fetched = discover(monkeypatch, sources)
+    assert "https://tracker.test/sitemap.xml" not in fetched
+    assert links == [article(1)[1]]
+
+def test_child_sitemaps_disallowed_by_robots_are_skipped(monkeypatch):
+    private = f"{SITE}/private/sitemap.xml"
+    sources = {
+        f"{SITE}/sitemap.xml": [index_entry(private, 2), index_entry(f"{SITE}/news/sitemap.xml", 1)],
+        private: [article(9)],
+        f"{SITE}/news/sitemap.xml": [article(1)],
+    }
+    links, fetched = discover(monkeypatch, sources, allowed=lambda url: "/private/" not in url)
+    assert private not in fetched
+    assert links == [article(1)[1]]
@@ -0,0 +1,67 @@
+"""
+Both extractor engines have to pull the same text out of every saved page in
+benchmarks/fixtures/html, including pages without an <article>, with script
+and style noise and with malformed markup
+"""
+import os
+
+import pytest
+
+import extractor
+from benchmarks.bench_extract import FIXTURE_DIR, load_fixtures
+
+PAGES = load_fixtures()
+
+def extract_both(page):
+    return {engine: extractor.extract_article_text(page, engine) for engine in extractor.ENGINES}
+
+def fixture_text(name):
+    texts = extract_both(PAGES[name])
+    assert texts['lxml'] == texts['soup']
+    return texts['lxml']
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_engines_agree_on_fixture(name):
+    texts = extract_both(PAGES[name])
+    assert texts['lxml'] == texts['soup']
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_engines_agree_on_decoded_fixture(name):
+    # Pages can also come in as str
+    try:
+        page = PAGES[name].decode("utf-8")
+    except UnicodeDecodeError:
+        pytest.skip("not UTF-8")
+    texts = extract_both(page)
+    assert texts['lxml'] == texts['soup']
+
+def test_fixtures_are_found():
+    assert os.path.isdir(FIXTURE_DIR)
+    for name in ("paragraphs_only.html", "script_style_noise.html", "malformed.html"):
+        assert name in PAGES
+
+def test_no_article_falls_back_to_paragraphs():
+    text = fixture_text("paragraphs_only.html")
+    assert text.startswith("parents deserve school choice")
+    assert "not a paragraph" not in text
+    # <aside> is removed before the fallback
+    assert "most read" not in text
+
+def test_script_and_style_are_left_out():
+    text = fixture_text("script_style_noise.html")
+    assert "gun control" in text and "gun rights" in text
+    for noise in ("tax cuts", "voter fraud", "track(", "display: none", "headline", "written by script"):
+        assert noise not in text
+
+def test_malformed_markup():
+    text = fixture_text("malformed.html")
+    assert "tax cuts for working families" in text
+    assert "balanced approach & tax relief © 2026" in text
+    assert "tax plan unveiled" not in text
+
+def test_empty_article_tag_wins():
+    assert fixture_text("empty_article.html") == ""
+
+@pytest.mark.parametrize("page", [b"", "", b"   ", "<html></html>", b"<p>"])
+def test_empty_pages(page):
+    assert extract_both(page) == {engine: "" for engine in extractor.ENGINES}
@@ -0,0 +1,137 @@
+"""
+Retries, Retry-After, backoff and per host pauses against a local server with
+scripted 429s, 5xx responses and timeouts (benchmarks/news_server.py)
+"""
+import threading
+import time
+
+import pytest
+import requests
+
+import http_cache
+import http_pool
+import politeness
+import scraper
+from benchmarks.news_server import proxied, start_server
+from config import DEFAULT_CRAWL_DELAY, MAX_RETRIES, REQUEST_TIMEOUT
+
+TIMEOUT = 0.5
+# Small slack for timer and scheduling jitter
+SLACK = 0.05
+BODY = b"<html><body><article><p>" + b"Tax cuts and climate change. " * 2000 + b"</p></article></body></html>"
+
+def page_url(host, n):
+    return f"http://{host}/2026/story-{n}"
+
+PAGES = {page_url(host, n): (BODY, "text/html") for host in ("a.test", "b.test") for n in range(6)}
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    http_pool.close_all()
+    politeness.reset()
+    politeness.configure(default_delay=0, max_retries=3)
+    http_pool.configure(timeout=TIMEOUT)
+    http_cache.configure(enabled=False)
+    scraper.set_request_limits(8, 2)
+    yield
+    scraper.set_request_limits(None, None)
+    politeness.configure(default_delay=DEFAULT_CRAWL_DELAY, max_retries=MAX_RETRIES)
+    http_pool.configure(timeout=REQUEST_TIMEOUT)
+    http_cache.configure(enabled=True)
+    http_pool.close_all()
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(faults):
+        server = start_server(PAGES, faults=faults)
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+
+def fetch_page(url):
+    body, _ = scraper.fetch(url, read=scraper._read_ok)
+    return body
+
+def retries():
+    return politeness.politeness_stats()['retries']
+
+def times_of(server, url):
+    return [(at, status) for at, logged_url, status in server.log if logged_url == url]
+
+def test_retry_after_is_waited_out(serve):
+    url = page_url("a.test", 0)
+    server = serve({url: [("status", 429, 1)]})
+    before = retries()
+    with proxied(server):
+        assert fetch_page(url) == BODY
+    (first, status), (second, _) = times_of(server, url)
+    assert status == 429
+    assert second - first >= 1 - SLACK
+    assert retries() - before == 1
+
+def test_5xx_backs_off_with_growing_attempts(serve, monkeypatch):
+    url = page_url("a.test", 1)
+    server = serve({url: [("status", 500, None), ("status", 502, None), ("status", 503, None)]})
+    attempts = []
+    real_backoff = politeness.backoff
+
+    def backoff(attempt):
+        attempts.append(attempt)
+        return real_backoff(attempt)
+    monkeypatch.setattr(politeness, "backoff", backoff)
+    before = retries()
+    with proxied(server):
+        assert fetch_page(url) == BODY
+    assert attempts == [0, 1, 2]
+    assert retries() - before == 3
+    assert [status for _, status in times_of(server, url)] == [500, 502, 503, 200]
+
+def test_backoff_has_full_jitter():
+    for attempt in range(4):
+        waits = [politeness.backoff(attempt) for _ in range(200)]
+        assert all(0 <= wait <= politeness.RETRY_BACKOFF * 2 ** attempt for wait in waits)
+        # Spread over the range, not always the maximum
+        assert min(waits) < politeness.RETRY_BACKOFF * 2 ** attempt / 2
+
+def test_timeouts_are_retried(serve):
+    stalled, cut_off, slow_body = page_url("a.test", 2), page_url("a.test", 3), page_url("a.test", 4)
+    server = serve({stalled: [("stall", TIMEOUT * 3)], cut_off: [("body_stall", 0)],
+                    slow_body: [("body_stall", TIMEOUT * 3)]})
+    before = retries()
+    with proxied(server):
+        for url in (stalled, cut_off, slow_body):
+            assert fetch_page(url) == BODY
+    assert retries() - before == 3
+
+def test_retries_stop_at_max_retries(serve):
+    url = page_url("a.test", 5)
+    server = serve({url: [("status", 500, None)] * 5})
+    politeness.configure(max_retries=2)
+    before = retries()
+    with proxied(server):
+        with pytest.raises(requests.HTTPError):
+            fetch_page(url)
+    assert retries() - before == 2
+    assert len(times_of(server, url)) == 3
+
+def test_paused_host_does_not_hold_up_others(serve):
+    limited = page_url("a.test", 0)
+    others = [page_url("b.test", n) for n in range(6)]
+    server = serve({limited: [("status", 429, 1)]})
+    with proxied(server):
+        thread = threading.Thread(target=fetch_page, args=(limited,))
+        thread.start()
+        # Let the 429 come back before the other host's requests start
+        while not times_of(server, limited):
+            time.sleep(0.01)
+        for url in others:
+            assert fetch_page(url) == BODY
+        thread.join()
+    (rate_limited, _), (retried, _) = times_of(server, limited)
+    other_times = [at for at, url, _ in server.log if url in others]
+    # Every request to the other host went through while a.test was paused
+    assert all(rate_limited < at < retried for at in other_times)
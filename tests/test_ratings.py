@@ -0,0 +1,51 @@
+"""
+Ratings exports and the compiled index (ratings.py)
+"""
+import threading
+
+import pytest
+
+import ratings
+from config import RATINGS_INDEX
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = str(tmp_path / "ratings.idx")
+    yield path
+    ratings.configure(path=RATINGS_INDEX)
+
+def test_first_export_keeps_its_bias(tmp_path):
+    allsides = tmp_path / "allsides.csv"
+    allsides.write_text("domain,bias\nexample-news.test,Lean Left\nonly-allsides.test,Right\n")
+    mbfc = tmp_path / "mbfc.csv"
+    mbfc.write_text("url,bias,credibility\nhttps://www.example-news.test,right-center,High\n"
+                    "only-mbfc.test,least biased,Mixed\n")
+    found, skipped = ratings.read_exports([str(allsides), str(mbfc)])
+    assert skipped == 0
+    # MBFC's bias for the AllSides domain is ignored, its credibility fills the gap
+    assert found == {
+        'example-news.test': [-1, 8],
+        'only-allsides.test': [2, None],
+        'only-mbfc.test': [0, 5],
+    }
+
+def test_lookup_in_a_full_table_ends(index_path):
+    ratings.write_index({'rated-a.test': [1, 7], 'rated-b.test': [-1, 3]}, index_path)
+    # Fill every empty slot, like a damaged index could be
+    with open(index_path, "r+b") as f:
+        data = bytearray(f.read())
+        _, slots, _, _ = ratings.HEADER.unpack_from(data, 0)
+        for slot in range(slots):
+            at = ratings.HEADER.size + slot * ratings.SLOT.size
+            if ratings.SLOT.unpack_from(data, at)[0] == 0:
+                ratings.SLOT.pack_into(data, at, 12345 + slot, 0, 0, 0, 0)
+        f.seek(0)
+        f.write(data)
+    ratings.configure(path=index_path)
+
+    found = []
+    lookup = threading.Thread(target=lambda: found.append(ratings.resolve("unrated.example.test")), daemon=True)
+    lookup.start()
+    lookup.join(timeout=5)
+    assert found == [None]
+    assert ratings.resolve("news.rated-a.test")[1]['bias'] == 1
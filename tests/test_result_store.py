@@ -0,0 +1,42 @@
+"""
+The per article result store (result_store.py)
+"""
+import pytest
+
+import result_store
+
+RECORD = {'chars': 12, 'text_bytes': 12, 'counts': {'left': {'tax the rich': 1}}}
+
+@pytest.fixture(autouse=True)
+def store(tmp_path):
+    result_store.configure(enabled=True, path=str(tmp_path / "store.db"))
+    yield
+    result_store.close()
+    result_store.configure(enabled=False)
+
+def last_seen(url):
+    with result_store._lock:
+        conn = result_store._connect()
+        return dict(conn.execute("SELECT content_hash, last_seen FROM articles WHERE url = ?", (url,)).fetchall())
+
+def test_same_content_is_a_hit():
+    url = "http://a.test/story"
+    page = {'content': b"<p>tax the rich</p>", 'text': None}
+    page_hash = result_store.content_hash(page)
+    assert result_store.lookup(url, page, page_hash) is None
+    result_store.save(url, page_hash, "a.test", RECORD)
+    assert result_store.lookup(url, page, page_hash)['counts'] == RECORD['counts']
+
+def test_304_touches_the_row_it_used():
+    url = "http://a.test/story"
+    downloaded = {'content': b"<p>tax the rich</p>", 'text': None}
+    result_store.save(url, result_store.content_hash(downloaded), "a.test", RECORD)
+    before = last_seen(url)
+
+    # A 304 only has the cached text, its hash isn't in the store
+    not_modified = {'content': None, 'text': "tax the rich"}
+    record = result_store.lookup(url, not_modified, result_store.content_hash(not_modified))
+    assert record['counts'] == RECORD['counts']
+    after = last_seen(url)
+    assert list(after) == list(before)
+    assert all(after[key] > before[key] for key in before)
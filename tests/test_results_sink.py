@@ -0,0 +1,34 @@
+"""
+Results files (results_sink.py), every format has the same columns
+"""
+import csv
+import json
+
+import results_sink
+
+ROW = {"site": "https://a.test", "url": "https://a.test/1", "chars": 10, "text_bytes": 10, "left": 1,
+       "center": 0, "right": 2, "calculated_bias": 1.67, "counts": {"tax cuts": 2, "climate crisis": 1},
+       "extra": "not a column"}
+
+def write(path):
+    writer = results_sink.open_writer(str(path), results_sink.ARTICLE_COLUMNS)
+    writer.write(ROW)
+    writer.write({"site": "https://b.test", "url": "https://b.test/1"})
+    writer.close()
+
+def test_jsonl_rows_have_exactly_the_columns(tmp_path):
+    write(tmp_path / "articles.jsonl")
+    rows = [json.loads(line) for line in (tmp_path / "articles.jsonl").read_text().splitlines()]
+    assert [list(row) for row in rows] == [results_sink.ARTICLE_COLUMNS] * 2
+    assert rows[0]["counts"] == ROW["counts"]
+    assert rows[1]["chars"] is None
+
+def test_csv_has_the_same_columns(tmp_path):
+    path = tmp_path / "articles.csv"
+    writer = results_sink.open_writer(str(path), results_sink.ARTICLE_COLUMNS)
+    writer.write({column: ROW[column] for column in results_sink.ARTICLE_COLUMNS})
+    writer.close()
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == results_sink.ARTICLE_COLUMNS
+    assert json.loads(rows[0]["counts"]) == ROW["counts"]
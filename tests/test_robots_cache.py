@@ -0,0 +1,68 @@
+"""
+robots.txt cache (robots_cache.py), how fetch results turn into entries and
+how long they're kept
+"""
+import os
+import time
+
+import pytest
+import requests
+
+import robots_cache
+from config import CACHE_DIR, ROBOTS_RETRY_DELAY
+
+SITE = "http://a.test"
+
+class Response:
+    def __init__(self, status_code, content=b""):
+        self.status_code = status_code
+        self.content = content
+
+class Server:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = 0
+
+    # fetch() for the cache, answers are status codes or an exception to raise
+    def __call__(self, url):
+        self.requests += 1
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return Response(answer, b"User-agent: *\nDisallow: /private/\n" if answer == 200 else b"")
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path):
+    robots_cache.configure(path=str(tmp_path / "robots.json"), retry_delay=0.1)
+    yield tmp_path / "robots.json"
+    robots_cache.configure(path=os.path.join(CACHE_DIR, "robots.json"), retry_delay=ROBOTS_RETRY_DELAY)
+
+def test_good_answer_is_kept_and_saved(cache):
+    server = Server(200)
+    assert robots_cache.can_fetch(f"{SITE}/news/1", server)
+    assert not robots_cache.can_fetch(f"{SITE}/private/1", server)
+    assert server.requests == 1
+    assert cache.read_text().count("\n") == 1
+
+@pytest.mark.parametrize("failure", [503, requests.ConnectionError("refused")])
+def test_failed_fetch_is_retried_soon(cache, failure):
+    server = Server(failure, 200)
+    assert not robots_cache.can_fetch(f"{SITE}/news/1", server)
+    assert not robots_cache.can_fetch(f"{SITE}/news/1", server)
+    assert server.requests == 1
+    time.sleep(0.15)
+    assert robots_cache.can_fetch(f"{SITE}/news/1", server)
+    assert server.requests == 2
+    # Only the real answer goes in the file
+    assert '"transient"' not in cache.read_text()
+
+def test_failures_in_a_row_back_off(monkeypatch):
+    monkeypatch.setattr(robots_cache, "ROBOTS_RETRY_MAX", 0.3)
+    server = Server(503)
+    waits = []
+    for _ in range(4):
+        entry = robots_cache.get_entry(SITE, server)
+        waits.append(round(entry['retry_at'] - entry['fetched_at'], 3))
+        time.sleep(waits[-1] + 0.01)
+    assert waits == [0.1, 0.2, 0.3, 0.3]
+    assert server.requests == 4
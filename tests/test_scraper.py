@@ -0,0 +1,36 @@
+"""
+The per article record path (scraper.scrape_multi_article_records) against
+the counting path it has to match
+"""
+import pytest
+
+import http_cache
+import scraper
+
+SITE = "http://a.test"
+LINKS = [f"{SITE}/politics/story-{n}" for n in range(4)]
+ARTICLE = "<html><body><article><p>" + "tax cuts and climate change, " * 20 + "</p></article></body></html>"
+
+@pytest.fixture(autouse=True)
+def fake_site(monkeypatch):
+    http_cache.configure(enabled=False)
+    monkeypatch.setattr(scraper, "fetch_article_links", lambda url, num_articles=7: (LINKS, 0))
+    monkeypatch.setattr(scraper, "fetch_article", lambda url: {
+        'content': ARTICLE.encode(), 'text': None, 'etag': None, 'last_modified': None, 'downloaded': len(ARTICLE)})
+    yield
+    http_cache.configure(enabled=True)
+
+# Budgets that end inside an article, right after one, and before the first one is done
+@pytest.mark.parametrize("max_chars", [100, 116, 125, 15])
+def test_last_article_is_cut_to_the_room_left(monkeypatch, max_chars):
+    monkeypatch.setattr(scraper, "MAX_CHARS", max_chars)
+    counts, chars = scraper.scrape_multi_article_counts(SITE)
+    records = scraper.scrape_multi_article_records(SITE)
+
+    merged = {}
+    for record in records:
+        for keyword, count in record['counts'].items():
+            merged[keyword] = merged.get(keyword, 0) + count
+    assert merged == counts
+    assert sum(record['chars'] for record in records) + len(records) == chars
+    assert len(scraper.scrape_multi_article(SITE)) == chars
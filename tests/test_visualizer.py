@@ -0,0 +1,27 @@
+"""
+Shared files the smaller chart modes write next to the chart (visualizer.save_chart)
+"""
+import plotly.graph_objs as go
+import pytest
+
+import visualizer
+
+@pytest.fixture
+def fig():
+    return go.Figure(go.Scatter(x=[1, 2], y=[0.5, -1.5], text=["a.test", "b.test"]))
+
+def test_shared_chart_loads_the_versioned_script(tmp_path, fig):
+    saved = visualizer.save_chart(fig, str(tmp_path / "chart.html"), mode="shared")
+    html = open(saved['path'], encoding="utf-8").read()
+    assert f'src="{visualizer.PLOTLY_JS}"' in html
+    assert visualizer.PLOTLY_JS.startswith(f"plotly-{visualizer.plotly.__version__}")
+    assert (tmp_path / visualizer.PLOTLY_JS).read_text(encoding="utf-8") == visualizer.get_plotlyjs()
+
+def test_stale_shared_files_are_replaced(tmp_path, fig):
+    # Left over from an older plotly or cut off by a crash
+    (tmp_path / visualizer.PLOTLY_JS).write_text("/* old */", encoding="utf-8")
+    (tmp_path / visualizer.VIEWER_PAGE).write_text('<script src="plotly.min.js"></script>', encoding="utf-8")
+    visualizer.save_chart(fig, str(tmp_path / "chart.json"), mode="json")
+    assert (tmp_path / visualizer.PLOTLY_JS).read_text(encoding="utf-8") == visualizer.get_plotlyjs()
+    assert (tmp_path / visualizer.VIEWER_PAGE).read_text(encoding="utf-8") == visualizer.VIEWER_HTML
+    assert f'src="{visualizer.PLOTLY_JS}"' in visualizer.VIEWER_HTML
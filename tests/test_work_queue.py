@@ -0,0 +1,100 @@
+"""
+The shared work queue (work_queue.py): leases, lease expiry and N worker
+processes crawling local stand-in sites from the same queue file
+"""
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import http_cache
+import robots_cache
+import work_queue
+from benchmarks.bench_pool import ARTICLES, start_sites
+from benchmarks.bench_queue import BIAS_INFO, crashing_worker
+
+LEASE = 1.0
+
+# Worker process, reports how many jobs it finished
+def worker(path, cache_dir, finished):
+    robots_cache.configure(path=os.path.join(cache_dir, "robots.json"))
+    http_cache.configure(enabled=False)
+    finished.put(work_queue.run_worker(path, poll=0.2, lease_seconds=LEASE))
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = work_queue.open_queue(str(tmp_path / "queue.db"))
+    yield conn
+    conn.close()
+
+def job_row(conn, job_id):
+    return conn.execute("SELECT status, attempts, lease_owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+def test_leased_job_is_not_handed_out_twice(conn):
+    work_queue.enqueue(conn, 'article', "http://a.test", "http://a.test/1")
+    assert work_queue.lease(conn, "first") is not None
+    assert work_queue.lease(conn, "second") is None
+
+def test_expired_lease_is_handed_out_again(conn):
+    work_queue.enqueue(conn, 'article', "http://a.test", "http://a.test/1")
+    first = work_queue.lease(conn, "first", lease_seconds=0.05)
+    time.sleep(0.1)
+    second = work_queue.lease(conn, "second", lease_seconds=LEASE)
+    assert second['id'] == first['id']
+    assert second['attempts'] == 2
+    # The first owner lost the lease, its late result is dropped
+    assert not work_queue.complete(conn, first, "first", {'from': "first"})
+    assert work_queue.complete(conn, second, "second", {'from': "second"})
+    assert job_row(conn, first['id']) == ('done', 2, None)
+
+def test_expired_lease_fails_after_max_attempts(conn):
+    work_queue.enqueue(conn, 'article', "http://a.test", "http://a.test/1")
+    for _ in range(2):
+        job = work_queue.lease(conn, "crasher", lease_seconds=0, max_attempts=2)
+        time.sleep(0.01)
+    assert work_queue.lease(conn, "next", max_attempts=2) is None
+    assert job_row(conn, job['id'])[0] == 'failed'
+
+def test_seed_refuses_a_used_queue(tmp_path, conn):
+    path = str(tmp_path / "queue.db")
+    work_queue.enqueue_site(conn, "http://a.test", BIAS_INFO)
+    with pytest.raises(ValueError):
+        work_queue.seed(path, ["http://b.test"])
+    assert work_queue.queue_counts(conn) == {'pending': 1}
+
+def test_every_job_done_exactly_once_across_workers(tmp_path):
+    sites = [site for _, site in start_sites(4)]
+    path = str(tmp_path / "queue.db")
+    conn = work_queue.open_queue(path)
+    for site in sites:
+        work_queue.enqueue_site(conn, site, BIAS_INFO)
+    conn.close()
+
+    context = multiprocessing.get_context("spawn")
+    # One worker dies holding a lease, so that job has to be picked up again
+    crasher = context.Process(target=crashing_worker, args=(path, LEASE))
+    crasher.start()
+    crasher.join()
+    finished = context.Queue()
+    workers = [context.Process(target=worker, args=(path, str(tmp_path), finished)) for _ in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    conn = work_queue.open_queue(path)
+    rows = conn.execute("SELECT site, url, status, attempts, result FROM jobs").fetchall()
+    conn.close()
+    expected = {(site, site) for site in sites}
+    expected |= {(site, f"{site}/news/story-{i}") for site in sites for i in range(ARTICLES)}
+    assert sorted((site, url) for site, url, *_ in rows) == sorted(expected)
+    assert all(status == 'done' and result is not None for _, _, status, _, result in rows)
+    assert any(attempts > 1 for *_, attempts, _ in rows)
+    # No job was finished by two workers
+    assert sum(finished.get() for _ in workers) == len(rows)
+
+    scraped_data = work_queue.collect_results(path)
+    assert sorted(scraped_data) == sorted(sites)
+    assert all(len(data['articles']) == ARTICLES for data in scraped_data.values())
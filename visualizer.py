@@ -1,6 +1,17 @@
+import plotly
 import plotly.graph_objs as go
-from plotly.subplots import make_subplots
+from plotly.offline import get_plotlyjs
+import gzip
 import math
+import os
+from datetime import datetime, timezone
+import metrics
+from config import BOOTSTRAP_LEVEL
+
+# Above this many sites markers and lines are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_THRESHOLD = 1000
+# Above this many sites names are only shown on hover, thousands of labels just cover the chart
+LABEL_THRESHOLD = 200
 
 # This created hover text for whenever you go over a data point
 def create_hover_text(result):
@@ -8,6 +19,8 @@ def create_hover_text(result):
     hover_text += f"Rating: {result['bias_rating']}<br>"
     hover_text += f"Known Bias: {result['known_bias']}<br>"
     hover_text += f"Calculated Bias: {result['calculated_bias']}<br>"
+    if result.get("bias_ci") is not None:
+        hover_text += f"{BOOTSTRAP_LEVEL:.0%} CI: {result['bias_ci'][0]:.2f} to {result['bias_ci'][1]:.2f}<br>"
     hover_text += f"Credibility: {result['reliability']}<br>"
     hover_text += f"Total Keywords: {result['total_keywords']}<br>"
     hover_text += f"Left: {result['scores']['left']}<br>"
@@ -16,25 +29,39 @@ def create_hover_text(result):
     hover_text += f"Source: {result['source']}<br>"
     return hover_text
 
-# Adjusts label positions to avoid overlaps and increase readability
+"""
+Adjusts label positions to avoid overlaps and increase readability
+A point joins the first group that already has a point less than 1.0 away on
+both axes. Instead of checking every group, points are put in a grid of 1.0 x 1.0
+cells so only the 3 x 3 cells around a point can hold a close one. Each cell keeps
+the first (lowest) group used at every distinct position, so lots of sites on
+the same spot don't make the search slower.
+"""
 def adjust_label_pos(results):
     positions = {}
 
     # Group by similar positions
     position_groups = []
+    grid = {}
     for result in results:
         pos = (result["known_bias"], result["reliability"])
+        cell = (math.floor(pos[0]), math.floor(pos[1]))
 
-        # Find if this position is close to an already existing group
-        added = False
-        for group in position_groups:
-            if any(abs(pos[0] -p[0]) < 1.0 and abs(pos[1] - p[1]) < 1.0 for p in [r["pos"] for r in group]):
-                group.append({"result": result, "pos": pos})
-                added = True
-                break
+        # Find the first existing group with a point close to this position
+        group_id = None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for p, first_group in grid.get((cell[0] + dx, cell[1] + dy), {}).items():
+                    if abs(pos[0] - p[0]) < 1.0 and abs(pos[1] - p[1]) < 1.0:
+                        if group_id is None or first_group < group_id:
+                            group_id = first_group
 
-        if not added:
-            position_groups.append([{"result": result, "pos": pos}])
+        if group_id is None:
+            group_id = len(position_groups)
+            position_groups.append([])
+        position_groups[group_id].append({"result": result, "pos": pos})
+        cell_groups = grid.setdefault(cell, {})
+        cell_groups[pos] = min(group_id, cell_groups.get(pos, group_id))
     # Assign offsets to items in each group
     for group in position_groups:
         if len(group) == 1:
@@ -69,29 +96,41 @@ Y-axis: Credibility score (0-10)
 Circle markers: Known bias position from AllSides
 Diamond markers: Calculated bias from keyword analysis
 Connecting lines: Connecting known to calculated (shows difference)
+
+It scales to thousands of sites: all connecting lines are one trace, above
+WEBGL_THRESHOLD sites the traces are drawn with WebGL, and with hover_labels
+(the default above LABEL_THRESHOLD sites) site names only show up on hover
+instead of as one annotation per site.
 """
-def create_bias_chart(results):
+def create_bias_chart(results, hover_labels=None):
     fig = go.Figure()
+    if hover_labels is None:
+        hover_labels = len(results) > LABEL_THRESHOLD
+    scatter = go.Scattergl if len(results) > WEBGL_THRESHOLD else go.Scatter
 
     #  Sort results by known bias for better visual organization
     sorted_results = sorted(results, key=lambda x: x["known_bias"])
-
-    # Calculate label positions to avoid overlap
-    label_positions = adjust_label_pos(sorted_results)
+    hover_texts = [create_hover_text(r) for r in sorted_results]
 
     # Add connecting lines first (so they appear behind markers)
+    # One trace for all of them, None between two lines keeps them apart
+    line_x = []
+    line_y = []
     for result in sorted_results:
-        fig.add_trace(go.Scatter(
-            x=[result["known_bias"], result["calculated_bias"]],
-            y=[result["reliability"], result["reliability"]],
-            mode="lines",
-            line=dict(
-                color="rgba(128, 128, 128, 0.25)",
-                width=1.5,
-            ),
-            hoverinfo="skip",
-            showlegend=False
-        ))
+        line_x += [result["known_bias"], result["calculated_bias"], None]
+        line_y += [result["reliability"], result["reliability"], None]
+
+    fig.add_trace(scatter(
+        x=line_x,
+        y=line_y,
+        mode="lines",
+        line=dict(
+            color="rgba(128, 128, 128, 0.25)",
+            width=1.5,
+        ),
+        hoverinfo="skip",
+        showlegend=False
+    ))
 
     # Add known bias markers (circles)
     known_x = [r["known_bias"] for r in sorted_results]
@@ -99,7 +138,7 @@ def create_bias_chart(results):
     known_colors = [get_color(r["known_bias"]) for r in sorted_results]
     known_sizes = [max(18, 15 + r["total_keywords"] / 10) for r in sorted_results]
 
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=known_x,  # Pos on bias scale
         y=known_y, # Pos on credibility scale
         mode="markers", # Display as marker
@@ -111,7 +150,7 @@ def create_bias_chart(results):
             opacity=0.85
         ),
         text=[r["name"] for r in sorted_results], # Makes label the website name
-        hovertext=[create_hover_text(r) for r in sorted_results], # Add hover info
+        hovertext=hover_texts, # Add hover info
         hoverinfo="text",
         name="Known Bias",
         showlegend=True
@@ -122,9 +161,19 @@ def create_bias_chart(results):
     calc_y = [r["reliability"] for r in sorted_results]
     calc_colors = [get_color(r["calculated_bias"]) for r in sorted_results]
 
-    fig.add_trace(go.Scatter(
+    # Confidence intervals as horizontal error bars, sites without one get none
+    error_x = None
+    if any(r.get("bias_ci") is not None for r in sorted_results):
+        cis = [r.get("bias_ci") or (x, x) for r, x in zip(sorted_results, calc_x)]
+        error_x = dict(type="data", symmetric=False,
+                       array=[max(high - x, 0) for (_, high), x in zip(cis, calc_x)],
+                       arrayminus=[max(x - low, 0) for (low, _), x in zip(cis, calc_x)],
+                       color="rgba(0,0,0,0.35)", thickness=1.5, width=4)
+
+    fig.add_trace(scatter(
         x=calc_x,
         y=calc_y,
+        error_x=error_x,
         mode="markers",
         marker=dict(
             size=14,
@@ -133,35 +182,12 @@ def create_bias_chart(results):
             symbol="diamond",
             opacity=0.85
         ),
-        hovertext=[create_hover_text(r) for r in sorted_results],
+        hovertext=hover_texts,
         hoverinfo="text",
         name="Calculated Bias",
         showlegend=True
     ))
 
-    # Add text labels with arrows to avoid overlap
-    for result in sorted_results:
-        x_offset, y_offset = label_positions[result["name"]]
-
-        fig.add_annotation(
-            x=result["known_bias"],
-            y=result["reliability"],
-            ax=result["known_bias"] + x_offset,
-            ay=result["reliability"] + y_offset,
-            text=result["name"],
-            showarrow=True,
-            arrowhead=2,
-            arrowsize=0.8,
-            arrowwidth=1,
-            arrowcolor="rgba(100,100,100,0.4)",
-            font=dict(size=9, color="rgba(0,0,0,0.85)", family="Arial"),
-            bgcolor="rgba(255,255,255,0.9)",
-            bordercolor="rgba(0,0,0,0.15)",
-            borderwidth=1,
-            borderpad=3,
-            opacity=0.95
-        )
-
     # Add vertical reference lines
     fig.add_vline(x=0, line_dash="dash", line_color="rgba(0,0,0,0.3)", line_width=1.5)
 
@@ -245,12 +271,197 @@ def create_bias_chart(results):
         yanchor="bottom"
     )
 
+    # Add text labels with arrows to avoid overlap
+    labels = []
+    if not hover_labels:
+        # Calculate label positions to avoid overlap
+        label_positions = adjust_label_pos(sorted_results)
+        for result in sorted_results:
+            x_offset, y_offset = label_positions[result["name"]]
+
+            labels.append(dict(
+                x=result["known_bias"],
+                y=result["reliability"],
+                ax=result["known_bias"] + x_offset,
+                ay=result["reliability"] + y_offset,
+                text=result["name"],
+                showarrow=True,
+                arrowhead=2,
+                arrowsize=0.8,
+                arrowwidth=1,
+                arrowcolor="rgba(100,100,100,0.4)",
+                font=dict(size=9, color="rgba(0,0,0,0.85)", family="Arial"),
+                bgcolor="rgba(255,255,255,0.9)",
+                bordercolor="rgba(0,0,0,0.15)",
+                borderwidth=1,
+                borderpad=3,
+                opacity=0.95
+            ))
+    """
+    Added in one go once every other annotation and shape is on the chart, plotly
+    checks the whole annotation list again every time something is added to it so
+    adding labels one by one (or before the rest) gets slow with a lot of sites.
+    They still go first in the list so they're drawn under the other annotations.
+    """
+    fig.layout.annotations = labels + list(fig.layout.annotations)
+
+    return fig
+
+"""
+Trend chart of calculated bias over time, one line per domain
+series is {domain: points} from history.trends, which reads the rollups, so
+the chart has one point per hour/day/week whatever the number of runs. The
+hover shows how many runs a point is the mean of and their lowest and highest bias.
+"""
+def create_trend_chart(series, period):
+    fig = go.Figure()
+    points_total = sum(len(points) for points in series.values())
+    scatter = go.Scattergl if points_total > WEBGL_THRESHOLD else go.Scatter
+
+    for domain, points in sorted(series.items()):
+        if not points:
+            continue
+        dates = [datetime.fromtimestamp(point["start"], timezone.utc) for point in points]
+        fig.add_trace(scatter(
+            x=dates,
+            y=[point["calculated_bias"] for point in points],
+            mode="lines+markers" if len(points) <= 200 else "lines",
+            name=domain,
+            text=[f"<b>{domain}</b><br>{date:%Y-%m-%d %H:%M} UTC<br>Runs: {point['runs']}<br>"
+                  f"Calculated Bias: {point['calculated_bias']:.2f}<br>"
+                  f"Range: {point['min_bias']:.2f} to {point['max_bias']:.2f}<br>"
+                  f"Known Bias: {point['known_bias']:.1f}<br>"
+                  f"Keywords per run: {point['total_keywords']:.0f}"
+                  for date, point in zip(dates, points)],
+            hoverinfo="text",
+        ))
+
+    fig.update_layout(
+        title={
+            "text": f"Calculated Bias Over Time<br><sub>Mean of every run in each {period}</sub>",
+            "x": 0.5,
+            "xanchor": "center",
+            "font": {"size": 20, "color": "#2c3e50", "family": "Arial"}
+        },
+        xaxis=dict(
+            title="Date (UTC)",
+            showgrid=True,
+            gridcolor="rgba(0,0,0,0.08)"
+        ),
+        yaxis=dict(
+            title="Calculated Bias Score",
+            range=[-5.5, 5.5],
+            tickmode="linear",
+            tick0=-5,
+            dtick=1,
+            showgrid=True,
+            gridcolor="rgba(0,0,0,0.08)",
+            zeroline=True,
+            zerolinecolor="rgba(0,0,0,0.3)",
+            zerolinewidth=2
+        ),
+        plot_bgcolor="white",
+        paper_bgcolor="#fafafa",
+        height=700,
+        width=1300,
+        hovermode="closest"
+    )
     return fig
 
 # Display chart in browser
 def display_chart(fig):
     fig.show()
 
-def save_chart(fig, filename="political_bias_chart.html"):
-    fig.write_html(filename)
-    print(f"Chart saved at {filename}")
\ No newline at end of file
+"""
+How save_chart writes the chart
+full: one HTML file with all of plotly.js in it (~3.5MB), opens anywhere
+shared: small HTML file that loads plotly-<version>.min.js from its own folder,
+        the script is written there once and every chart saved to that folder
+        uses it, the version in the name keeps a plotly upgrade from leaving
+        new charts with an old script (or old charts with a new one)
+cdn: small HTML file that loads plotly.js from the plotly CDN
+json: only the figure as JSON plus chart_viewer.html and plotly-<version>.min.js
+      in the same folder, open chart_viewer.html?chart=<file> through a web server
+      (python -m http.server) since browsers don't let pages fetch local files
+"""
+CHART_MODES = ("full", "shared", "cdn", "json")
+PLOTLY_JS = f"plotly-{plotly.__version__}.min.js"
+VIEWER_PAGE = "chart_viewer.html"
+
+# Reusable page for json mode, loads the chart named in ?chart= and unzips .gz files itself
+VIEWER_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Media Bias Analysis</title>
+<script src=\"""" + PLOTLY_JS + """\"></script>
+</head>
+<body style="margin:0">
+<div id="chart"></div>
+<script>
+const name = new URLSearchParams(location.search).get("chart") || "political_bias_chart.json";
+async function showChart() {
+    const response = await fetch(name);
+    let body = response.body;
+    if (name.endsWith(".gz")) {
+        body = body.pipeThrough(new DecompressionStream("gzip"));
+    }
+    const fig = await new Response(body).json();
+    Plotly.newPlot("chart", fig.data, fig.layout);
+}
+showChart();
+</script>
+</body>
+</html>
+"""
+
+# Writes a file next to the chart for the charts in that folder to share, unless it's already there as is
+def _write_shared(folder, name, text):
+    path = os.path.join(folder, name)
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == text:
+                return
+    except (OSError, UnicodeDecodeError):
+        pass
+    # Write to a temp file first so a chart never loads half a script
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+"""
+Saves the chart in one of CHART_MODES, with compress=True the file is gzipped
+and gets a .gz suffix. Returns the path written and its size in bytes, the size
+is also printed and added to the chart_bytes_total metric.
+"""
+def save_chart(fig, filename="political_bias_chart.html", mode="full", compress=False):
+    if mode not in CHART_MODES:
+        raise ValueError(f"Unknown chart mode {mode}, use one of {', '.join(CHART_MODES)}")
+    folder = os.path.dirname(filename) or "."
+    os.makedirs(folder, exist_ok=True)
+
+    if mode == "json":
+        filename = os.path.splitext(filename)[0] + ".json"
+        text = fig.to_json()
+        _write_shared(folder, PLOTLY_JS, get_plotlyjs())
+        _write_shared(folder, VIEWER_PAGE, VIEWER_HTML)
+    else:
+        # A path ending in .js makes plotly load the script from there
+        include_plotlyjs = {"full": True, "shared": PLOTLY_JS, "cdn": "cdn"}[mode]
+        text = fig.to_html(include_plotlyjs=include_plotlyjs)
+        if mode == "shared":
+            _write_shared(folder, PLOTLY_JS, get_plotlyjs())
+
+    if compress:
+        filename += ".gz"
+        with gzip.open(filename, "wt", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    size = os.path.getsize(filename)
+    metrics.inc("chart_bytes_total", size, mode=mode)
+    print(f"Chart saved at {filename} ({size / 1024:.0f} KB)")
+    return {'path': filename, 'bytes': size}
\ No newline at end of file
@@ -0,0 +1,302 @@
+import gzip
+import io
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+import zlib
+from urllib.parse import urljoin
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+"""
+WARC archives of a run (python main.py --warc DIR) and offline replay (--replay FILE)
+
+With --warc every response the scraper reads (robots.txt, feeds, sitemaps,
+homepages and articles) is written to DIR/poliscraper-<time>.warc.gz as a WARC/1.0
+response record. Bodies are stored decoded (what iter_content gave us), so
+Content-Encoding and Transfer-Encoding are left out of the stored headers. An
+article that came back 304 from the article cache has no body to store, its
+saved text goes in a conversion record instead.
+
+Every record is its own gzip member, like any .warc.gz, and next to the archive
+an .idx file lists each record's offset, length, type, status and url, one
+record per line, written as soon as the record is. Replay maps the archive with
+mmap and only decompresses the members it's asked for, so opening a big archive
+to look at one site doesn't read the whole thing. An archive without its .idx
+(copied without it, or written by another tool) gets it rebuilt with one pass.
+
+Replay answers scraper.fetch from the archive instead of the network, urls that
+aren't in it get a 404, so the same discovery, extraction, dedup and analysis
+code runs on what was downloaded back then.
+"""
+_lock = threading.Lock()
+_writer = None      # {'file', 'index'} while recording
+_archive_path = None
+_replay = None      # {'path', 'file', 'map', 'responses', 'texts', 'websites'} while replaying
+_stats = {'records': 0, 'bytes': 0, 'replayed': 0, 'missing': 0}
+
+# Url of the record that lists the run's websites
+RUN_URL = "urn:poliscraper:run"
+SOFTWARE = "PoliScraper"
+
+def is_recording():
+    return _writer is not None
+
+def is_replaying():
+    return _replay is not None
+
+def _warc_date():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+# Compresses one record and appends it to the archive and the index, must hold _lock
+def _write_record(warc_type, url, content_type, block, status="-", extra=()):
+    headers = [
+        ("WARC-Type", warc_type),
+        ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+        ("WARC-Date", _warc_date()),
+    ]
+    if url is not None:
+        headers.append(("WARC-Target-URI", url))
+    headers += list(extra)
+    headers += [("Content-Type", content_type), ("Content-Length", str(len(block)))]
+    head = "WARC/1.0\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+    member = gzip.compress(head.encode("utf-8") + block + b"\r\n\r\n")
+
+    archive = _writer['file']
+    offset = archive.tell()
+    archive.write(member)
+    archive.flush()
+    # The index line goes after the record so it never points at half a record
+    _writer['index'].write(f"{offset}\t{len(member)}\t{warc_type}\t{status}\t{url or '-'}\n")
+    _writer['index'].flush()
+    _stats['records'] += 1
+    _stats['bytes'] += len(member)
+
+"""
+Starts a new archive in directory, websites is the list of sites the run will
+scrape, saved so replay knows what to scrape. Returns the archive's path.
+"""
+def start_recording(directory, websites):
+    global _writer, _archive_path
+    os.makedirs(directory, exist_ok=True)
+    name = time.strftime("poliscraper-%Y%m%d-%H%M%S", time.gmtime())
+    path = os.path.join(directory, name + ".warc.gz")
+    # Two runs in the same second get their own file
+    suffix = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{name}-{suffix}.warc.gz")
+        suffix += 1
+
+    with _lock:
+        _writer = {'file': open(path, "wb"), 'index': open(path + ".idx", "w", encoding="utf-8")}
+        _archive_path = path
+        info = f"software: {SOFTWARE}\r\nformat: WARC File Format 1.0\r\n".encode("utf-8")
+        _write_record("warcinfo", None, "application/warc-fields", info)
+        run = json.dumps({'websites': list(websites), 'started': time.time()}).encode("utf-8")
+        _write_record("metadata", RUN_URL, "application/json", run)
+    return path
+
+def stop_recording():
+    global _writer
+    with _lock:
+        if _writer is None:
+            return
+        _writer['file'].close()
+        _writer['index'].close()
+        _writer = None
+
+# Status line and headers the way they'd have come over the wire, for a body we store decoded
+def _http_head(response, body):
+    version = {10: "1.0", 11: "1.1"}.get(getattr(response.raw, "version", 11), "1.1")
+    lines = [f"HTTP/{version} {response.status_code} {response.reason or ''}".rstrip()]
+    for name, value in response.headers.items():
+        if name.lower() not in ("content-encoding", "transfer-encoding", "content-length"):
+            lines.append(f"{name}: {value}")
+    lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", errors="replace")
+
+"""
+Saves a response and the body we read from it, truncated means we stopped reading early
+Redirects it went through are saved too, so replay can follow them from the url we asked for.
+"""
+def record_response(response, body, truncated=False):
+    if _writer is None:
+        return
+    records = [(hop, hop.content, []) for hop in response.history]
+    records.append((response, body, [("WARC-Truncated", "length")] if truncated else []))
+    with _lock:
+        if _writer is None:
+            return
+        for hop, hop_body, extra in records:
+            _write_record("response", hop.url, "application/http; msgtype=response",
+                          _http_head(hop, hop_body) + hop_body, status=hop.status_code, extra=extra)
+
+# Saves the text of an article we didn't download because it hadn't changed
+def record_text(url, text):
+    if _writer is None:
+        return
+    with _lock:
+        if _writer is not None:
+            _write_record("conversion", _normalize(url), "text/plain; charset=utf-8", text.encode("utf-8"))
+
+# Splits a decompressed record into (WARC headers, block)
+def _parse_record(data):
+    head, _, rest = data.partition(b"\r\n\r\n")
+    headers = {}
+    for line in head.decode("utf-8", errors="replace").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", len(rest)))
+    return headers, rest[:length]
+
+"""
+Builds the index of an archive that doesn't have one, by walking its gzip members
+Returns lines like the ones _write_record writes.
+"""
+def build_index(path):
+    lines = []
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            parts = []
+            start = offset
+            while not decompressor.eof:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    break
+                parts.append(decompressor.decompress(chunk))
+                offset += len(chunk)
+            if not decompressor.eof:
+                # End of the file, or a record cut off by a crash
+                break
+            # Whatever was read past this member belongs to the next one
+            offset -= len(decompressor.unused_data)
+            f.seek(offset)
+            headers, block = _parse_record(b"".join(parts))
+            status = "-"
+            if headers.get("warc-type") == "response":
+                status = block.split(b"\r\n", 1)[0].split(b" ")[1].decode("ascii")
+            lines.append(f"{start}\t{offset - start}\t{headers.get('warc-type')}\t{status}\t"
+                         f"{headers.get('warc-target-uri', '-')}\n")
+    return lines
+
+# Reads the record at offset from the mapped archive, only that gzip member is decompressed
+def _read_record(offset, length):
+    return _parse_record(gzip.decompress(_replay['map'][offset:offset + length]))
+
+"""
+Opens an archive for replay, from now on fetch() is answered from it
+Returns the websites the recorded run scraped.
+"""
+def start_replay(path):
+    global _replay
+    try:
+        with open(path + ".idx", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        lines = build_index(path)
+
+    # A url fetched more than once (robots.txt after it expired) replays the last answer
+    responses = {}
+    texts = {}
+    run = None
+    for line in lines:
+        offset, length, warc_type, _, url = line.rstrip("\n").split("\t", 4)
+        if warc_type == "response":
+            responses[url] = (int(offset), int(length))
+        elif warc_type == "conversion":
+            texts[url] = (int(offset), int(length))
+        elif warc_type == "metadata" and url == RUN_URL:
+            run = (int(offset), int(length))
+
+    archive = open(path, "rb")
+    with _lock:
+        _replay = {'path': path, 'file': archive, 'map': mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ),
+                   'responses': responses, 'texts': texts, 'websites': []}
+        if run is not None:
+            _replay['websites'] = json.loads(_read_record(*run)[1])['websites']
+    return list(_replay['websites'])
+
+def stop_replay():
+    global _replay
+    with _lock:
+        if _replay is None:
+            return
+        _replay['map'].close()
+        _replay['file'].close()
+        _replay = None
+
+# Same form requests gives a url (http://host becomes http://host/), which is what the records have
+def _normalize(url):
+    prepared = requests.PreparedRequest()
+    prepared.prepare_url(url, None)
+    return prepared.url
+
+"""
+The archived response for a url as a requests.Response, a 404 if it isn't in the archive
+Redirects are followed like requests would, the hops end up in response.history.
+"""
+def replay_response(url):
+    history = []
+    url = _normalize(url)
+    while True:
+        response = _replay_one(url)
+        if not response.is_redirect or len(history) >= requests.models.DEFAULT_REDIRECT_LIMIT:
+            break
+        history.append(response)
+        url = _normalize(urljoin(url, response.headers["Location"]))
+    response.history = history
+    return response
+
+# One archived response without following redirects
+def _replay_one(url):
+    response = requests.Response()
+    response.url = url
+    with _lock:
+        location = _replay['responses'].get(url)
+        if location is None:
+            _stats['missing'] += 1
+        else:
+            _stats['replayed'] += 1
+            _, block = _read_record(*location)
+
+    if location is None:
+        response.status_code = 404
+        response.reason = "Not Found"
+        response.raw = io.BytesIO(b"")
+        return response
+
+    head, _, body = block.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = lines[0].split(" ", 2)
+    response.status_code = int(status[1])
+    response.reason = status[2] if len(status) > 2 else ""
+    headers = CaseInsensitiveDict()
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip()] = value.strip()
+    response.headers = headers
+    response.encoding = requests.utils.get_encoding_from_headers(headers)
+    response.raw = io.BytesIO(body)
+    return response
+
+# Saved text of an article that was a 304 when it was recorded, None if there isn't any
+def replay_text(url):
+    with _lock:
+        location = _replay['texts'].get(_normalize(url))
+        if location is None:
+            return None
+        _stats['replayed'] += 1
+        return _read_record(*location)[1].decode("utf-8")
+
+# Records written and replayed since the program started, path is the last archive started
+def warc_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['path'] = _archive_path
+    return stats
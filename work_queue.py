@@ -0,0 +1,264 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+
+import http_cache
+from config import MAX_CHARS, QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS
+from pipeline import process_article
+from scraper import can_scrape, fetch_article, fetch_article_links, get_bias_cred
+
+"""
+Shared work queue for crawling with many worker processes (python main.py --queue crawl.db)
+
+The queue is a SQLite file, so it needs no extra services. Workers on the same
+machine, or on other machines that can see the same file, all pull jobs from it.
+site jobs: check robots.txt, fetch the homepage and add an article job per link
+article jobs: fetch the article, parse it and count its keywords
+
+A worker leases a job for QUEUE_LEASE_SECONDS. If it crashes or hangs the lease
+runs out and another worker picks the job up again, after QUEUE_MAX_ATTEMPTS
+tries the job is marked failed. Finishing a job only works while you still hold
+its lease, so a job that timed out and got picked up again can't end up with
+two results. Jobs are unique per (site, url) so a link can't be queued twice.
+
+The file uses SQLite's normal rollback journal instead of WAL, WAL needs shared
+memory that doesn't work when the file is on a network share.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    payload TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    UNIQUE (site, url)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, lease_expires);
+"""
+
+# Opens (and creates if needed) the queue file
+def open_queue(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # isolation_level=None so we control transactions, timeout waits out other workers' locks
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.executescript(SCHEMA)
+    return conn
+
+# A name that's unique across machines for lease ownership
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# Adds a job, does nothing if the same (site, url) is already queued, returns whether it was added
+def enqueue(conn, kind, site, url, position=0, payload=None):
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO jobs (kind, site, url, position, payload, updated) VALUES (?, ?, ?, ?, ?, ?)",
+        (kind, site, url, position, json.dumps(payload) if payload is not None else None, time.time()))
+    return cursor.rowcount == 1
+
+# Queues a website, bias_info goes with it so workers don't need the ratings
+def enqueue_site(conn, website, bias_info):
+    return enqueue(conn, 'site', website, website, payload={'bias_info': bias_info})
+
+"""
+Leases the next job for owner, returns a job dict or None if nothing can be leased right now
+Jobs whose lease ran out count as pending again. BEGIN IMMEDIATE takes the write lock
+before we look, so two workers can't lease the same job.
+"""
+def lease(conn, owner, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Jobs that timed out too many times are given up on
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired too many times', updated = ? "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, max_attempts))
+
+        # Site jobs first so article jobs get queued as early as possible
+        row = conn.execute(
+            "SELECT id, kind, site, url, position, payload, attempts FROM jobs "
+            "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+            "ORDER BY kind = 'article', id LIMIT 1", (now,)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+
+        job_id, kind, site, url, position, payload, attempts = row
+        conn.execute(
+            "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+            "attempts = attempts + 1, updated = ? WHERE id = ?",
+            (owner, now + lease_seconds, now, job_id))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    return {
+        'id': job_id, 'kind': kind, 'site': site, 'url': url, 'position': position,
+        'payload': json.loads(payload) if payload else None, 'attempts': attempts + 1,
+    }
+
+# Saves a jobs result, returns False if owner lost the lease in the meantime
+def complete(conn, job, owner, result):
+    cursor = conn.execute(
+        "UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+        "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+        (json.dumps(result), time.time(), job['id'], owner))
+    return cursor.rowcount == 1
+
+# Hands a job back for a retry, or marks it failed once it's used up its attempts
+def fail(conn, job, owner, error, max_attempts=QUEUE_MAX_ATTEMPTS):
+    status = 'failed' if job['attempts'] >= max_attempts else 'pending'
+    conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+        "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+        (status, str(error), time.time(), job['id'], owner))
+
+# Number of jobs in each status
+def queue_counts(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+"""
+Coordinator side, queues every website that has a bias rating (unrated sites
+would be dropped later anyway) and returns how many were queued
+Raises ValueError if the queue file already has jobs, their done rows would
+end up in this run's results.
+"""
+def seed(path, websites):
+    conn = open_queue(path)
+    queued = 0
+    try:
+        jobs = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        if jobs:
+            raise ValueError(f"{path} already has {jobs} jobs from another crawl, use a new queue file")
+        for website in websites:
+            bias_info = get_bias_cred(website)
+            if bias_info is None:
+                print(f"Warning for {website}: No bias rating found")
+                continue
+            if enqueue_site(conn, website, bias_info):
+                queued += 1
+    finally:
+        conn.close()
+    return queued
+
+# Whether every job is done or failed
+def is_drained(conn):
+    counts = queue_counts(conn)
+    return not counts.get('pending') and not counts.get('leased')
+
+# Site job: check robots.txt, find the articles and queue them
+def _run_site_job(conn, job):
+    if not can_scrape(job['url']):
+        return {'skipped': 'robots.txt disallows scraping'}
+
+    article_links, downloaded = fetch_article_links(job['url'])
+    for position, article_url in enumerate(article_links):
+        enqueue(conn, 'article', job['site'], article_url, position=position)
+    return {'bias_info': job['payload']['bias_info'], 'links': len(article_links),
+            'bytes_downloaded': downloaded}
+
+# Article job: fetch, parse and count, the result is the same record pipeline mode makes
+def _run_article_job(job):
+    page = fetch_article(job['url'])
+    record = process_article(job['url'], page, MAX_CHARS * 10)
+    if page['content'] is None:
+        http_cache.mark_hit(job['url'])
+    else:
+        http_cache.note_store(job['url'], record['written'])
+    del record['written']
+    record['bytes_downloaded'] = page['downloaded']
+    return record
+
+"""
+Worker loop, leases and runs jobs until the queue is drained
+poll: seconds to wait when every remaining job is leased by someone else
+Returns how many jobs this worker finished.
+"""
+def run_worker(path, owner=None, poll=1.0, lease_seconds=QUEUE_LEASE_SECONDS):
+    owner = owner or worker_name()
+    conn = open_queue(path)
+    finished = 0
+    try:
+        while True:
+            job = lease(conn, owner, lease_seconds=lease_seconds)
+            if job is None:
+                if is_drained(conn):
+                    break
+                time.sleep(poll)
+                continue
+
+            print(f"[{owner}] {job['kind']} job {job['url']} (attempt {job['attempts']})")
+            try:
+                if job['kind'] == 'site':
+                    result = _run_site_job(conn, job)
+                else:
+                    result = _run_article_job(job)
+            except Exception as e:
+                print(f"[{owner}] Error in {job['kind']} job {job['url']}: {e}")
+                fail(conn, job, owner, e)
+                continue
+
+            if complete(conn, job, owner, result):
+                finished += 1
+            else:
+                print(f"[{owner}] Lost the lease on {job['url']}, result dropped")
+    finally:
+        conn.close()
+    return finished
+
+"""
+Merges the finished jobs into the scraped_data shape analyze_all_sites takes,
+every site gets its 'articles' records in homepage link order, cut off at the
+same MAX_CHARS * 10 budget scrape_multi_article_records uses
+"""
+def collect_results(path):
+    conn = open_queue(path)
+    try:
+        sites = conn.execute(
+            "SELECT site, result FROM jobs WHERE kind = 'site' AND status = 'done' ORDER BY id").fetchall()
+        articles = conn.execute(
+            "SELECT site, result FROM jobs WHERE kind = 'article' AND status = 'done' "
+            "ORDER BY site, position").fetchall()
+    finally:
+        conn.close()
+
+    records_by_site = {}
+    for site, result in articles:
+        records_by_site.setdefault(site, []).append(json.loads(result))
+
+    budget = MAX_CHARS * 10
+    scraped_data = {}
+    for site, result in sites:
+        result = json.loads(result)
+        if 'bias_info' not in result:
+            continue
+
+        records = []
+        collected = 0
+        downloaded = result['bytes_downloaded']
+        for record in records_by_site.get(site, []):
+            downloaded += record.pop('bytes_downloaded', 0)
+            if record['chars'] and collected < budget:
+                records.append(record)
+                collected += record['chars'] + 1
+
+        if records:
+            scraped_data[site] = {
+                'articles': records,
+                'bias_info': result['bias_info'],
+                'stats': {'bytes_downloaded': downloaded,
+                          'bytes_used': sum(record['text_bytes'] for record in records)},
+            }
+    return scraped_data